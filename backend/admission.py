@@ -0,0 +1,204 @@
+import asyncio
+import heapq
+import itertools
+import math
+from datetime import date as Date
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from tgvmax_engine.metrics import ADMISSION_REQUESTS
+from config import (
+    ADMISSION_CHEAP_COST, ADMISSION_CLIENT_BURST, ADMISSION_CLIENT_CONCURRENCY, ADMISSION_CLIENT_RATE,
+    ADMISSION_EXPENSIVE_SLOTS, ADMISSION_QUEUE_TIMEOUT, ADMISSION_SLOTS, ADMISSION_TRUSTED_PROXIES, DEFAULT_RANGE_DAYS,
+    MAX_EXPORT_DAYS, MAX_RANGE_DAYS,
+)
+
+def _int(params: Dict[str, List[str]], name: str, default: int) -> int:
+    try:
+        return int(params[name][0])
+    except (KeyError, ValueError):
+        return default
+
+def _export_days(params: Dict[str, List[str]]) -> int:
+    try:
+        start = Date.fromisoformat(params["start_date"][0])
+        end = Date.fromisoformat(params["end_date"][0]) if "end_date" in params else start
+    except (KeyError, ValueError):
+        return 1
+    return min(max((end - start).days + 1, 1), MAX_EXPORT_DAYS)
+
+def estimate_cost(path: str, query_string: bytes) -> int:
+    """Coût estimé d'une requête : jours × gares recherchés (1 pour les requêtes légères)."""
+    params = parse_qs(query_string.decode("latin-1"))
+    days, stations = 1, 1
+    if path == "/api/trains/range":
+        days = min(max(_int(params, "days", DEFAULT_RANGE_DAYS), 1), MAX_RANGE_DAYS)
+    elif path == "/api/trains/round-trip":
+        days = 2
+    elif path == "/api/export":
+        days = _export_days(params)
+    elif path == "/api/trains/meetup":
+        # Allers et retours de chaque ville, pour chaque jour
+        days = 2 * min(max(_int(params, "days", 1), 1), MAX_RANGE_DAYS)
+        stations = max(1, len([o for o in params.get("origins", [""])[0].split(",") if o.strip()]))
+    return days * stations
+
+def client_id(scope: Scope, trusted_proxies: int = ADMISSION_TRUSTED_PROXIES) -> str:
+    """Client à l'origine de la requête.
+
+    Derrière `trusted_proxies` proxys, c'est l'entrée de X-Forwarded-For ajoutée par le premier
+    d'entre eux (la N-ième en partant de la droite) : les entrées plus à gauche viennent du client
+    et ne sont pas fiables. Sans proxy de confiance, l'adresse de connexion.
+    """
+    if trusted_proxies > 0:
+        hops = [value.decode("latin-1") for name, value in scope.get("headers", []) if name == b"x-forwarded-for"]
+        addresses = [a.strip() for a in ",".join(hops).split(",") if a.strip()]
+        if addresses:
+            return addresses[-min(trusted_proxies, len(addresses))]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+class _ClientLimits:
+    """Par client : requêtes en cours et seau à jetons exprimé en unités de coût."""
+
+    def __init__(self, rate: float, burst: float, concurrency: int):
+        self.rate, self.burst, self.concurrency = rate, burst, concurrency
+        self._clients: Dict[str, List[float]] = {}  # client -> [jetons, dernier remplissage, requêtes en cours]
+
+    def admit(self, client: str, cost: int) -> Tuple[Optional[str], float]:
+        """(None, 0) si la requête est admise, sinon (motif, attente conseillée en secondes)."""
+        now = monotonic()
+        state = self._clients.get(client)
+        if state is None:
+            if len(self._clients) > 10000:
+                self._forget(now)
+            state = self._clients[client] = [self.burst, now, 0]
+        if state[2] >= self.concurrency:
+            return "concurrency", 1.0
+        tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+        # Une requête plus chère que le seau entier reste admissible, seau plein
+        cost = min(cost, self.burst)
+        if tokens < cost:
+            state[0], state[1] = tokens, now
+            return "rate", (cost - tokens) / self.rate
+        state[0], state[1] = tokens - cost, now
+        state[2] += 1
+        return None, 0.0
+
+    def done(self, client: str) -> None:
+        self._clients[client][2] -= 1
+
+    def _forget(self, now: float) -> None:
+        """Oublie les clients inactifs dont le seau est de nouveau plein."""
+        full = self.burst / self.rate
+        for client, (_, updated, in_flight) in list(self._clients.items()):
+            if not in_flight and now - updated > full:
+                del self._clients[client]
+
+class _PriorityGate:
+    """Places d'exécution partagées : la file sert les requêtes les moins chères d'abord.
+
+    Les requêtes coûteuses n'occupent jamais plus de `expensive` places, pour que les
+    recherches d'une journée gardent de quoi passer.
+    """
+
+    def __init__(self, slots: int, expensive: int, cheap_cost: int):
+        self.free, self.expensive_free, self.cheap_cost = slots, expensive, cheap_cost
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+
+    def _take(self, cost: int) -> bool:
+        expensive = cost > self.cheap_cost
+        if self.free <= 0 or (expensive and self.expensive_free <= 0):
+            return False
+        self.free -= 1
+        self.expensive_free -= expensive
+        return True
+
+    async def acquire(self, cost: int, timeout: float) -> bool:
+        future = asyncio.get_running_loop().create_future()
+        waiter = (cost, next(self._order), future)
+        heapq.heappush(self._waiters, waiter)
+        # Place libre : servie aussitôt, sauf si une attente moins chère (ou plus ancienne) passe avant
+        self._wake()
+        try:
+            await asyncio.wait_for(future, timeout)
+        except BaseException as error:
+            if future.done() and not future.cancelled():
+                self.release(cost)  # place attribuée au moment de l'abandon : rendue aux suivantes
+            else:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+            if isinstance(error, asyncio.TimeoutError):
+                return False
+            raise
+        return True
+
+    def release(self, cost: int) -> None:
+        self.free += 1
+        self.expensive_free += cost > self.cheap_cost
+        self._wake()
+
+    def _wake(self) -> None:
+        # Les moins chères d'abord ; une requête coûteuse sans place coûteuse bloque les suivantes, plus chères encore
+        while self._waiters:
+            cost, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)  # abandonnée
+                continue
+            if not self._take(cost):
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+class AdmissionMiddleware:
+    """Contrôle d'admission des endpoints /api : limites par client puis file à priorité par coût.
+
+    Au-delà des limites, ou après ADMISSION_QUEUE_TIMEOUT secondes d'attente, la requête reçoit
+    429 avec Retry-After. Les limites s'appliquent par processus (worker).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.enabled = ADMISSION_SLOTS > 0
+        self.limits = _ClientLimits(ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST, ADMISSION_CLIENT_CONCURRENCY)
+        self.gate = _PriorityGate(ADMISSION_SLOTS, ADMISSION_EXPENSIVE_SLOTS, ADMISSION_CHEAP_COST)
+        self.trusted_proxies = ADMISSION_TRUSTED_PROXIES
+
+    def identify(self, scope: Scope) -> str:
+        """Clé des limites par client (remplacée par le test de charge pour simuler des clients distincts)."""
+        return client_id(scope, self.trusted_proxies)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.enabled or scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+        cost = estimate_cost(scope["path"], scope.get("query_string", b""))
+        client = self.identify(scope)
+        reason, retry_after = self.limits.admit(client, cost)
+        if reason is not None:
+            ADMISSION_REQUESTS.inc(f"rejected_{reason}")
+            detail = ("Trop de requêtes en cours pour ce client" if reason == "concurrency"
+                      else f"Quota de requêtes dépassé (coût estimé {cost})")
+            await self._reject(detail, retry_after, scope, receive, send)
+            return
+        try:
+            if not await self.gate.acquire(cost, ADMISSION_QUEUE_TIMEOUT):
+                ADMISSION_REQUESTS.inc("rejected_queue")
+                await self._reject("Serveur saturé, réessayer plus tard", ADMISSION_QUEUE_TIMEOUT, scope, receive, send)
+                return
+            ADMISSION_REQUESTS.inc("cheap" if cost <= ADMISSION_CHEAP_COST else "expensive")
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.gate.release(cost)
+        finally:
+            self.limits.done(client)
+
+    @staticmethod
+    async def _reject(detail: str, retry_after: float, scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse({"detail": detail}, status_code=429,
+                                headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+        await response(scope, receive, send)
@@ -1,10 +1,188 @@
-from fastapi import FastAPI
+"""Point d'entrée serverless (Vercel) optimisé pour le démarrage à froid.
+
+Les routes /api/trains/* sont servies depuis un instantané compact en lecture seule
+(tgvmax_engine.compact), mappé en mémoire depuis /tmp ou livré avec le déploiement :
+ni pandas ni appel SNCF au démarrage. Une date absente de l'instantané bascule sur le
+moteur complet, importé seulement à ce moment-là.
+"""
+import os
+import sys
+from datetime import date as Date, datetime, timedelta
+from time import time as timestamp
+from typing import Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.middleware.cors import CORSMiddleware
 from mangum import Mangum
 
+# Le moteur est importé comme depuis backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tgvmax_engine.compact import CompactSnapshot, find_snapshot
+from tgvmax_engine.config import CACHE_TTL, COMPACT_SNAPSHOT_PATH
+from config import MAX_RANGE_DAYS
+
+BUNDLED_SNAPSHOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tgvmax.snap")
+
 app = FastAPI()
 
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+_snapshot: Optional[CompactSnapshot] = None
+_snapshot_loaded = False
+
+def get_snapshot() -> Optional[CompactSnapshot]:
+    """Instantané compact ouvert une seule fois par instance (/tmp d'abord, puis celui du déploiement)."""
+    global _snapshot, _snapshot_loaded
+    if not _snapshot_loaded:
+        _snapshot = find_snapshot([COMPACT_SNAPSHOT_PATH, BUNDLED_SNAPSHOT])
+        _snapshot_loaded = True
+    return _snapshot
+
+def day_trips(day: Date, origin: Optional[str], destination: Optional[str],
+              start: datetime, end: datetime, sources: set) -> List[Dict]:
+    """Trajets d'une journée : instantané compact si la date y figure, moteur complet sinon."""
+    start_minute = start.hour * 60 + start.minute
+    end_minute = end.hour * 60 + end.minute
+    snapshot = get_snapshot()
+    if snapshot is not None and snapshot.covers(day):
+        sources.add("snapshot")
+        return snapshot.trips(day, origin, destination, start_minute, end_minute)
+    sources.add("live")
+    # Import tardif : pandas et le client SNCF ne sont chargés qu'en cas de besoin
+    from tgvmax_engine import (
+        UpstreamUnavailable, filter_stations, filter_trains_by_time, format_single_trips, get_day_frame,
+    )
+    try:
+        trains_df = get_day_frame(day)
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+    trains_df = filter_stations(trains_df, origin, destination)
+    trains_df = filter_trains_by_time(trains_df, start.time(), end.time())
+    return format_single_trips(trains_df) if not trains_df.empty else []
+
+def set_source_headers(response: Response, sources: set) -> None:
+    """Indique la provenance des données et autorise la mise en cache (CDN Vercel).
+
+    max-age décompte l'âge de l'instantané : le CDN ne garde pas la réponse au-delà de
+    CACHE_TTL après la construction des données.
+    """
+    snapshot = get_snapshot()
+    response.headers["X-Data-Source"] = ",".join(sorted(sources))
+    if sources == {"snapshot"}:
+        response.headers["X-Data-Version"] = snapshot.version
+    max_age = CACHE_TTL
+    if "snapshot" in sources:
+        max_age = max(0, int(CACHE_TTL - (timestamp() - snapshot.built_at)))
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+
 @app.get("/")
 def root():
-    return {"message": "Hello from FastAPI on Vercel!"}
+    snapshot = get_snapshot()
+    return {
+        "message": "Hello from FastAPI on Vercel!",
+        "snapshot": {"version": snapshot.version, "dates": snapshot.dates()} if snapshot else None,
+    }
+
+@app.get("/api/trains/single")
+def get_single_trips(
+    response: Response,
+    date: str = Query(..., description="Date au format YYYY-MM-DD"),
+    origin: str = Query(..., description="Gare de départ"),
+    destination: Optional[str] = Query(None, description="Gare de destination"),
+    start_time: str = Query("00:00", description="Heure de début (HH:MM)"),
+    end_time: str = Query("23:59", description="Heure de fin (HH:MM)")
+):
+    try:
+        depart_date = datetime.strptime(date, "%Y-%m-%d").date()
+        start_t = datetime.strptime(start_time, "%H:%M")
+        end_t = datetime.strptime(end_time, "%H:%M")
+        sources = set()
+        trips = day_trips(depart_date, origin, destination, start_t, end_t, sources)
+        set_source_headers(response, sources)
+        if not trips:
+            return {"message": "Aucun trajet trouvé pour les critères spécifiés", "trips": []}
+        return {"message": f"Trajets trouvés pour {origin} le {date}", "count": len(trips), "trips": trips}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche: {str(e)}")
+
+@app.get("/api/trains/round-trip")
+def get_round_trips(
+    response: Response,
+    depart_date: str = Query(..., description="Date de départ (YYYY-MM-DD)"),
+    return_date: str = Query(..., description="Date de retour (YYYY-MM-DD)"),
+    origin: str = Query(..., description="Gare de départ"),
+    destination: Optional[str] = Query(None, description="Gare de destination"),
+    depart_start_time: str = Query("00:00", description="Heure de début départ (HH:MM)"),
+    depart_end_time: str = Query("23:59", description="Heure de fin départ (HH:MM)"),
+    return_start_time: str = Query("00:00", description="Heure de début retour (HH:MM)"),
+    return_end_time: str = Query("23:59", description="Heure de fin retour (HH:MM)")
+):
+    try:
+        depart_dt = datetime.strptime(depart_date, "%Y-%m-%d").date()
+        return_dt = datetime.strptime(return_date, "%Y-%m-%d").date()
+        sources = set()
+        depart_trips = day_trips(depart_dt, origin, destination,
+                                 datetime.strptime(depart_start_time, "%H:%M"),
+                                 datetime.strptime(depart_end_time, "%H:%M"), sources)
+        return_trips = day_trips(return_dt, destination, origin,
+                                 datetime.strptime(return_start_time, "%H:%M"),
+                                 datetime.strptime(return_end_time, "%H:%M"), sources)
+        set_source_headers(response, sources)
+        return {
+            "message": f"Trajets aller-retour trouvés pour {origin}",
+            "depart_date": depart_date,
+            "return_date": return_date,
+            "depart_count": len(depart_trips),
+            "return_count": len(return_trips),
+            "trips": {
+                "depart": depart_trips,
+                "return": return_trips
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche: {str(e)}")
+
+@app.get("/api/trains/range")
+def get_date_range_trips(
+    response: Response,
+    start_date: str = Query(..., description="Date de début (YYYY-MM-DD)"),
+    days: int = Query(7, description="Nombre de jours à rechercher"),
+    origin: str = Query(..., description="Gare de départ"),
+    destination: Optional[str] = Query(None, description="Gare de destination"),
+    start_time: str = Query("00:00", description="Heure de début (HH:MM)"),
+    end_time: str = Query("23:59", description="Heure de fin (HH:MM)")
+):
+    try:
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d").date()
+        start_t = datetime.strptime(start_time, "%H:%M")
+        end_t = datetime.strptime(end_time, "%H:%M")
+        days = min(days, MAX_RANGE_DAYS)
+        sources = set()
+        all_trips = []
+        for i in range(days):
+            current_date = start_dt + timedelta(days=i)
+            all_trips.extend(day_trips(current_date, origin, destination, start_t, end_t, sources))
+        set_source_headers(response, sources)
+        return {
+            "message": f"Trajets trouvés pour {origin} sur {days} jours",
+            "start_date": start_date,
+            "days": days,
+            "count": len(all_trips),
+            "trips": all_trips
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche: {str(e)}")
 
-handler = Mangum(app) 
\ No newline at end of file
+handler = Mangum(app)
@@ -0,0 +1 @@
+"""Outils de benchmark de l'API TGV Max (stand-in SNCF, tests de charge)."""
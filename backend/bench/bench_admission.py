@@ -0,0 +1,119 @@
+"""Contrôle d'admission : latence des requêtes d'une journée pendant un afflux de recherches sur 30 jours.
+
+L'application simulée occupe un thread du pool (4 threads) pendant `coût × UNIT` secondes, comme
+les endpoints synchrones de l'API : sans admission, les recherches d'une journée attendent derrière
+les recherches coûteuses.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import pytest
+from admission import AdmissionMiddleware, _ClientLimits, _PriorityGate, client_id, estimate_cost
+from bench.load_test import percentile
+
+UNIT = 0.002  # secondes par unité de coût
+THREADS = 4
+FLOOD = 24    # recherches de 30 jours simultanées
+SINGLES = 40
+
+def make_app():
+    pool = ThreadPoolExecutor(THREADS)
+
+    async def app(scope, receive, send):
+        cost = estimate_cost(scope["path"], scope["query_string"])
+        await asyncio.get_running_loop().run_in_executor(pool, time.sleep, cost * UNIT)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+def admission(app, slots=THREADS, expensive=THREADS // 2, rate=1000.0, burst=1000.0, concurrency=100):
+    middleware = AdmissionMiddleware(app)
+    middleware.enabled = True
+    middleware.gate = _PriorityGate(slots, expensive, 2)
+    middleware.limits = _ClientLimits(rate, burst, concurrency)
+    middleware.trusted_proxies = 1  # derrière un proxy : X-Forwarded-For désigne le client
+    return middleware
+
+async def mixed_load(app):
+    """Latences (ms) des requêtes d'une journée lancées pendant l'afflux, chaque requête venant d'un client distinct."""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api") as client:
+        async def get(path, params, who):
+            began = time.perf_counter()
+            response = await client.get(path, params=params, headers={"X-Forwarded-For": who})
+            return response.status_code, (time.perf_counter() - began) * 1000
+
+        flood = [asyncio.create_task(get("/api/trains/range", {"days": 30}, f"10.0.0.{i}")) for i in range(FLOOD)]
+        await asyncio.sleep(0.01)
+        singles = []
+        for i in range(SINGLES):
+            singles.append(asyncio.create_task(get("/api/trains/single", {}, f"10.1.0.{i}")))
+            await asyncio.sleep(UNIT)
+        results = await asyncio.gather(*singles)
+        await asyncio.gather(*flood)
+    assert all(status == 200 for status, _ in results)
+    return [elapsed for _, elapsed in results]
+
+@pytest.mark.parametrize("gated", [False, True], ids=["sans_admission", "admission"])
+def test_single_p99_under_flood(benchmark, gated):
+    app = make_app()
+    latencies = asyncio.run(mixed_load(admission(app) if gated else app))
+    benchmark.extra_info["p99_ms"] = round(percentile(latencies, 0.99), 2)
+    benchmark.pedantic(lambda: None, rounds=1)
+    # Le pool entier occupé par les recherches coûteuses : au moins FLOOD × 30 × UNIT / THREADS d'attente
+    assert (percentile(latencies, 0.99) < 30 * UNIT * 1000 * 2) == gated
+
+def test_rejections():
+    async def run():
+        app = admission(make_app(), rate=10.0, burst=60.0, concurrency=1)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api") as client:
+            headers = {"X-Forwarded-For": "203.0.113.7"}
+            # Coût 30 : deux recherches vident le seau de 60
+            statuses = [(await client.get("/api/trains/range", params={"days": 30}, headers=headers)) for _ in range(3)]
+            busy = await asyncio.gather(*(client.get("/api/trains/single", headers={"X-Forwarded-For": "203.0.113.8"})
+                                          for _ in range(3)))
+            other = await client.get("/api/trains/single", headers={"X-Forwarded-For": "203.0.113.9"})
+            health = await client.get("/health", headers=headers)
+        return statuses, busy, other, health
+
+    statuses, busy, other, health = asyncio.run(run())
+    assert [r.status_code for r in statuses] == [200, 200, 429]
+    assert int(statuses[2].headers["Retry-After"]) == 3  # 30 jetons à 10 par seconde
+    assert sorted(r.status_code for r in busy) == [200, 429, 429]
+    assert all(int(r.headers["Retry-After"]) >= 1 for r in busy if r.status_code == 429)
+    assert other.status_code == 200 and health.status_code == 200
+
+def test_cost():
+    assert estimate_cost("/api/trains/single", b"date=2025-07-01") == 1
+    assert estimate_cost("/api/trains/range", b"days=30") == 30
+    assert estimate_cost("/api/trains/range", b"days=400") == 30
+    assert estimate_cost("/api/trains/range", b"days=abc") == 7
+    assert estimate_cost("/api/trains/meetup", b"origins=PARIS,LYON,LILLE&days=2") == 12
+
+def test_cheap_not_queued_behind_expensive():
+    async def run():
+        gate = _PriorityGate(4, 1, 2)
+        assert await gate.acquire(30, 1.0)
+        # Place coûteuse occupée : la deuxième recherche coûteuse attend
+        queued = asyncio.create_task(gate.acquire(30, 0.2))
+        await asyncio.sleep(0.01)
+        began = time.perf_counter()
+        admitted = await gate.acquire(1, 1.0)
+        waited = time.perf_counter() - began
+        expired = await queued
+        return admitted, waited, expired, len(gate._waiters), gate.free
+
+    admitted, waited, expired, waiters, free = asyncio.run(run())
+    assert admitted and waited < 0.05
+    # L'attente expirée ne reste pas dans la file
+    assert expired is False and waiters == 0 and free == 2
+
+def test_client_id():
+    scope = {"client": ("198.51.100.1", 5000), "headers": [(b"x-forwarded-for", b"1.2.3.4, 203.0.113.5")]}
+    # Sans proxy de confiance, l'en-tête (écrit par le client) est ignoré
+    assert client_id(scope, 0) == "198.51.100.1"
+    # Un proxy : l'adresse qu'il a ajoutée, pas celle choisie par le client
+    assert client_id(scope, 1) == "203.0.113.5"
+    assert client_id(scope, 2) == "1.2.3.4"
+    assert client_id(scope, 5) == "1.2.3.4"
+    assert client_id({"client": ("198.51.100.1", 5000), "headers": []}, 1) == "198.51.100.1"
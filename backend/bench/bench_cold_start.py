@@ -0,0 +1,70 @@
+"""Démarrage à froid du point d'entrée serverless (api/index.py) comparé à l'API complète (main.py)."""
+import json
+import os
+import subprocess
+import sys
+import pytest
+from bench.conftest import START, timetable
+from tgvmax_engine.compact import build_snapshot
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import de l'application puis première requête, dans un interpréteur neuf
+COLD_START = """
+import json, resource, sys, time
+sys.path.insert(0, {backend!r})
+t0 = time.perf_counter()
+{load}
+imported = time.perf_counter() - t0
+{request}
+print(json.dumps({{
+    "import_s": imported,
+    "total_s": time.perf_counter() - t0,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "pandas": "pandas" in sys.modules,
+}}))
+"""
+
+SERVERLESS_LOAD = """
+import importlib.util
+spec = importlib.util.spec_from_file_location("index", {path!r})
+index = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(index)
+"""
+
+# Appel direct de la route (sans client HTTP) : ouverture de l'instantané comprise
+SERVERLESS_REQUEST = """
+from fastapi import Response
+body = index.get_single_trips(Response(), date={date!r}, origin="PARIS", destination=None,
+                              start_time="06:00", end_time="23:00")
+assert body["count"] > 0
+"""
+
+def run_cold_start(load: str, request: str = "", env: dict = None) -> dict:
+    script = COLD_START.format(backend=BACKEND, load=load, request=request)
+    out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                         env=dict(os.environ, **(env or {})))
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+@pytest.fixture(scope="module")
+def compact_snapshot(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("compact") / "tgvmax.snap")
+    build_snapshot(timetable(7), path)
+    return path
+
+def report(benchmark, result: dict) -> None:
+    for key, value in result.items():
+        benchmark.extra_info[key] = round(value, 4) if isinstance(value, float) else value
+
+def test_serverless_cold_start(benchmark, compact_snapshot):
+    load = SERVERLESS_LOAD.format(path=os.path.join(BACKEND, "api", "index.py"))
+    request = SERVERLESS_REQUEST.format(date=START.isoformat())
+    result = benchmark.pedantic(run_cold_start, args=(load, request, {"TGVMAX_COMPACT_SNAPSHOT": compact_snapshot}),
+                                rounds=3, iterations=1)
+    report(benchmark, result)
+    assert not result["pandas"]
+
+def test_full_api_import(benchmark):
+    """Référence : import de l'API complète (pandas, moteur, middlewares), sans requête SNCF."""
+    result = benchmark.pedantic(run_cold_start, args=("import main",), rounds=3, iterations=1)
+    report(benchmark, result)
@@ -0,0 +1,32 @@
+"""Tableau des départs : dichotomie dans l'index trié comparée à un parcours complet des trajets."""
+from datetime import datetime, timedelta
+import pytest
+from tgvmax_engine.departures import day_board, next_departures
+from bench.conftest import START
+
+CASES = {
+    "station_evening": dict(station="PARIS", hour=21, destination=None),
+    "city_morning": dict(station="lyon", hour=6, destination=None),
+    "od_pair": dict(station="MARSEILLE", hour=12, destination="PARIS"),
+}
+
+def brute_force(records, station, after, limit, destination):
+    """Référence : tri de tous les départs correspondants, sans index."""
+    key = (after.date().isoformat(), after.strftime("%H:%M"))
+    rows = [
+        r for r in records
+        if station.upper() in r["origine"] and (not destination or destination.upper() in r["destination"])
+        and (r["date"], r["heure_depart"]) >= key
+    ]
+    return sorted(rows, key=lambda r: (r["date"], r["heure_depart"]))[:limit]
+
+@pytest.mark.parametrize("case", list(CASES))
+def test_next_departures(stage, cached_upstream, case):
+    params = CASES[case]
+    after = datetime.combine(START, datetime.min.time()).replace(hour=params["hour"])
+    until = START + timedelta(days=len({r["date"] for r in cached_upstream}) - 1)
+    for day in range((until - START).days + 1):
+        day_board(START + timedelta(days=day))  # index construit hors mesure
+    result = stage(next_departures, lambda: (params["station"], after, 20, params["destination"], until), rounds=50)
+    expected = brute_force(cached_upstream, params["station"], after, 20, params["destination"])
+    assert [(r["date"], r["heure_depart"]) for r in result] == [(r["date"], r["heure_depart"]) for r in expected]
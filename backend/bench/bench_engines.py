@@ -0,0 +1,45 @@
+"""Moteurs de requête pandas / Arrow / Polars : temps, pic mémoire et résultats identiques.
+
+Chaque benchmark vérifie que le moteur renvoie exactement les trajets du moteur pandas.
+"""
+from datetime import time, timedelta
+import pytest
+from tgvmax_engine.engines import ENGINES, DayQuery, PandasEngine, _ENGINE_CLASSES, _available
+from bench.conftest import START
+
+WORKLOADS = {
+    # Toutes les gares sur toute la période : le pire cas pour pandas
+    "all_stations": dict(origin=None, destination=None, start=time(6, 0), end=time(22, 0)),
+    "origin": dict(origin="PARIS", destination=None, start=time(0, 0), end=time(23, 59)),
+    "od_pair": dict(origin="lyon", destination="par", start=time(7, 0), end=time(12, 0)),
+    "stations_only": dict(origin="MARSEILLE", destination=None, start=None, end=None),
+    # Créneau qui passe minuit
+    "overnight": dict(origin="PARIS", destination=None, start=time(20, 0), end=time(7, 0)),
+}
+
+def queries(records, workload):
+    days = len({r["date"] for r in records})
+    return [DayQuery(START + timedelta(days=i), **WORKLOADS[workload]) for i in range(days)]
+
+@pytest.fixture(params=ENGINES)
+def engine(request, cached_upstream, tmp_path, monkeypatch):
+    if not _available(request.param):
+        pytest.skip(f"moteur {request.param} non installé")
+    if request.param == "compact":
+        # Fichier partagé publié comme par le rafraîchisseur, relu par le moteur
+        from tgvmax_engine import shared
+        from tgvmax_engine.compact import build_snapshot
+        path = str(tmp_path / "tgvmax.snap")
+        build_snapshot(cached_upstream, path)
+        monkeypatch.setattr(shared, "SHARED_DATASET_PATH", path)
+        monkeypatch.setattr(shared, "_identity", None)
+        monkeypatch.setattr(shared, "_checked_at", float("-inf"))
+    return _ENGINE_CLASSES[request.param]()
+
+@pytest.mark.parametrize("workload", list(WORKLOADS))
+def test_search(stage, engine, cached_upstream, workload):
+    batch = queries(cached_upstream, workload)
+    expected = PandasEngine().search(batch)
+    engine.search(batch)  # construction des tables colonnes hors mesure
+    result = stage(engine.search, lambda: (batch,))
+    assert result == expected
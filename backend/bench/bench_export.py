@@ -0,0 +1,81 @@
+"""Export en flux (CSV, Parquet) : mêmes trajets que le moteur, pic mémoire indépendant de la période."""
+import csv
+import io
+import tracemalloc
+from datetime import timedelta
+import pytest
+from tgvmax_engine import memo
+from tgvmax_engine.engines import DayQuery, PandasEngine
+from tgvmax_engine.export import EXPORT_COLUMNS, export_trips
+from tgvmax_engine.pool import run_results
+from bench.conftest import START
+
+# Métadonnées d'un row group Parquet gardées par le writer (statistiques des 12 colonnes), mesurées à 2-2,5 Ko
+ROW_GROUP_METADATA = 4096
+
+def consume(fmt, days, origin=None):
+    """Taille de l'export, morceaux jetés au fur et à mesure (comme un client HTTP)."""
+    return sum(len(chunk) for chunk in export_trips(fmt, START, days, origin))
+
+def export_peak(fmt, days):
+    tracemalloc.start()
+    consume(fmt, days)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def full_list(days):
+    """Référence : tous les trajets de la période assemblés en mémoire, comme une réponse JSON."""
+    return [dict(t) for day in PandasEngine().search([DayQuery(START + timedelta(days=i)) for i in range(days)]) for t in day]
+
+@pytest.fixture
+def warm(cached_upstream):
+    """Journées mémoïsées hors mesure : seul le coût propre de l'export est mesuré."""
+    days = len({r["date"] for r in cached_upstream})
+    memo.clear()
+    run_results([DayQuery(START + timedelta(days=i)) for i in range(days)])
+    yield days
+    memo.clear()
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_export(stage, warm, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    size = stage(consume, lambda: (fmt, warm))
+    assert size > 0
+
+def test_full_list(stage, warm):
+    stage(full_list, lambda: (warm,))
+
+def csv_rows(days):
+    return list(csv.DictReader(io.StringIO(b"".join(export_trips("csv", START, days)).decode("utf-8"))))
+
+def test_rows_match_engine(warm):
+    expected = full_list(warm)
+    rows = csv_rows(warm)
+    assert len(rows) == len(expected)
+    for row, trip in zip(rows, expected):
+        assert all(row[name] == str(trip[name]) for name in ("date", "origine", "destination", "heure_depart"))
+
+def test_parquet_matches_csv(warm):
+    pq = pytest.importorskip("pyarrow.parquet")
+    rows = csv_rows(warm)
+    table = pq.read_table(io.BytesIO(b"".join(export_trips("parquet", START, warm))))
+    assert table.column_names == list(EXPORT_COLUMNS)
+    assert table.num_rows == len(rows)
+    assert table.column("heure_depart").to_pylist() == [row["heure_depart"] for row in rows]
+    assert [str(m) if m is not None else "" for m in table.column("duree_minutes").to_pylist()] == \
+        [row["duree_minutes"] for row in rows]
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_constant_memory(warm, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    if warm < 7:
+        pytest.skip("période trop courte pour comparer")
+    consume(fmt, 1)  # hors mesure : import de pyarrow au premier export
+    one_day = export_peak(fmt, 1)
+    # Une journée ou toute la période : même pic, à la taille d'une journée près. En Parquet, le
+    # writer garde jusqu'à la fermeture les métadonnées de chaque row group (une par journée).
+    allowance = ROW_GROUP_METADATA * (warm - 1) if fmt == "parquet" else 0
+    assert export_peak(fmt, warm) < 2 * one_day + allowance
@@ -0,0 +1,105 @@
+"""Planificateur de fraîcheur : source choisie (cache, instantané, API SNCF) et coût selon max_staleness."""
+from concurrent.futures import ThreadPoolExecutor
+from time import time as timestamp
+import pytest
+from fastapi.testclient import TestClient
+from tgvmax_engine import store, upstream
+from tgvmax_engine.config import CACHE_TTL
+from bench.conftest import START, timetable
+from bench.fake_sncf import FakeSNCF
+
+KEY = tuple(sorted(store._day_params(START).items()))
+AGED = 2 * CACHE_TTL  # plus vieux que CACHE_TTL : une requête par défaut revalide
+
+# max_staleness -> (source attendue, appels SNCF, données en mémoire)
+CASES = {
+    "browse_memory": (3 * CACHE_TTL, "memory", 0, True),
+    "browse_snapshot": (3 * CACHE_TTL, "snapshot", 0, False),
+    "default_revalidate": (None, "upstream", 1, True),
+    "book_now": (0, "upstream", 1, True),
+}
+
+@pytest.fixture(scope="module")
+def fake_sncf():
+    fake = FakeSNCF(timetable(1), latency_ms=20).start()
+    yield fake
+    fake.stop()
+
+@pytest.fixture
+def planner(fake_sncf, tmp_path, monkeypatch):
+    """Données SNCF récupérées il y a AGED secondes, en mémoire et dans l'instantané disque."""
+    monkeypatch.setattr(upstream, "_client", upstream.UpstreamClient(fake_sncf.url))
+    monkeypatch.setattr(store, "SNAPSHOT_DIR", str(tmp_path))
+    store.clear_cache()
+    entry = store._fetch_records(store._day_params(START))
+
+    def age(in_memory: bool):
+        store.clear_cache()
+        aged = {k: v for k, v in entry.items() if k != "source"}
+        aged["fetched_at"] = timestamp() - AGED
+        store._write_snapshot(KEY, aged)
+        if in_memory:
+            store._upstream_cache[KEY] = aged
+        fake_sncf.reset_calls()
+    yield age
+    store.clear_cache()
+
+def plan(max_staleness):
+    with store.freshness(max_staleness):
+        return store.get_dataset_info(START)
+
+@pytest.mark.parametrize("case", list(CASES))
+def test_plan(stage, planner, fake_sncf, case):
+    max_staleness, source, calls, in_memory = CASES[case]
+    planner(in_memory)
+    info = plan(max_staleness)
+    assert info.source == source and fake_sncf.reset_calls() == calls
+    fresh = source == "upstream"
+    assert (timestamp() - info.fetched_at < CACHE_TTL) == fresh
+
+    def setup():
+        planner(in_memory)
+        return (max_staleness,)
+    stage(plan, setup)
+
+def test_api_headers(planner, fake_sncf):
+    from main import app
+    client = TestClient(app)
+    params = {"date": START.isoformat(), "origin": "PARIS"}
+    planner(True)
+    browse = client.get("/api/trains/single", params={**params, "max_staleness": 3 * CACHE_TTL})
+    assert browse.headers["X-Data-Source"] == "memory" and int(browse.headers["X-Data-Age"]) >= AGED - 1
+    assert fake_sncf.reset_calls() == 0
+    live = client.get("/api/trains/single", params={**params, "max_staleness": 0})
+    assert live.headers["X-Data-Source"] == "upstream" and int(live.headers["X-Data-Age"]) <= 1
+    assert fake_sncf.reset_calls() == 1
+    assert client.get("/api/trains/single", params={**params, "max_staleness": -1}).status_code == 422
+
+def test_min_staleness(planner, fake_sncf):
+    """max_staleness=0 ramené à MIN_STALENESS : deux réservations de suite, un seul appel SNCF."""
+    planner(True)
+    assert plan(0).source == "upstream"
+    assert plan(0).source == "memory"
+    assert fake_sncf.reset_calls() == 1
+
+def test_concurrent_refresh(planner, fake_sncf):
+    """Revalidations imposées simultanément : une seule récupération, réutilisée par les autres."""
+    planner(False)
+    with ThreadPoolExecutor(8) as pool:
+        sources = list(pool.map(plan, [0] * 8))
+    assert fake_sncf.reset_calls() == 1
+    assert sorted(info.source for info in sources) == ["memory"] * 7 + ["upstream"]
+
+def test_compressed_etag(planner):
+    """Réponse compressée : ETag faible, toujours reconnu par If-None-Match."""
+    from main import app
+    client = TestClient(app)
+    # Toute gare contenant un E : réponse assez volumineuse pour être compressée
+    params = {"date": START.isoformat(), "origin": "E", "max_staleness": 3 * CACHE_TTL}
+    planner(True)
+    plain = client.get("/api/trains/single", params=params, headers={"Accept-Encoding": "identity"})
+    packed = client.get("/api/trains/single", params=params, headers={"Accept-Encoding": "gzip"})
+    assert packed.headers["Content-Encoding"] == "gzip" and "Content-Encoding" not in plain.headers
+    assert packed.headers["ETag"] == f"W/{plain.headers['ETag']}"
+    again = client.get("/api/trains/single", params=params, headers={"If-None-Match": packed.headers["ETag"]})
+    assert again.status_code == 304
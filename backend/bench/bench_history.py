@@ -0,0 +1,64 @@
+"""Historique des disponibilités : « état au temps T » par l'index (point de reprise) comparé à un rejeu complet."""
+import random
+import threading
+from datetime import datetime, timedelta
+import pytest
+from tgvmax_engine import history
+from bench.conftest import START, timetable
+
+OBSERVATIONS = 48  # une observation par heure pendant deux jours
+
+@pytest.fixture(scope="module")
+def recorded(tmp_path_factory):
+    """Historique de OBSERVATIONS versions successives, quelques disponibilités changeant à chaque fois."""
+    directory = str(tmp_path_factory.mktemp("history"))
+    records = [dict(r) for r in timetable(1)]
+    rng = random.Random(0)
+    patch = pytest.MonkeyPatch()
+    patch.setattr(history, "HISTORY_DIR", directory)
+    patch.setattr(history, "HISTORY_CHECKPOINT_EVERY", 12)
+    patch.setattr(history, "PRUNE_INTERVAL", float("inf"))  # dates synthétiques : pas de rétention
+    history._states.clear()
+    observed = []
+    start = datetime.combine(START - timedelta(days=2), datetime.min.time()).timestamp()
+    for i in range(OBSERVATIONS):
+        for record in rng.sample(records, max(1, len(records) // 50)):
+            record["od_happy_card"] = "NON" if record["od_happy_card"] == "OUI" else "OUI"
+        history.record_observation([dict(r) for r in records], start + i * 3600)
+        observed.append((start + i * 3600, [dict(r) for r in records]))
+    yield observed
+    patch.undo()
+    history._states.clear()
+
+def full_replay(at: float):
+    """Référence : rejeu de toutes les observations jusqu'à `at`."""
+    state = {}
+    for entry in history._read_index(START.isoformat()):
+        if entry.at <= at:
+            state = history._apply(state, history._read_member(START.isoformat(), entry))
+    return history._sorted_trips(state.values())
+
+@pytest.mark.parametrize("moment", ["early", "late"])
+def test_as_of(stage, recorded, moment):
+    at, records = recorded[3] if moment == "early" else recorded[-2]
+    result = stage(history.availability_as_of, lambda: (START, at + 1))
+    assert result == history._sorted_trips(records) == full_replay(at + 1)
+
+def test_full_replay(stage, recorded):
+    at, _ = recorded[-2]
+    stage(full_replay, lambda: (at + 1,))
+
+def test_background_write(tmp_path, monkeypatch):
+    """record_history rend la main avant l'écriture ; flush attend qu'elle soit faite."""
+    monkeypatch.setattr(history, "HISTORY_DIR", str(tmp_path))
+    release, written = threading.Event(), []
+    def slow(records, fetched_at):
+        release.wait(5)
+        written.append(fetched_at)
+    monkeypatch.setattr(history, "record_observation", slow)
+    history.record_history([], 1.0)
+    history.record_history([], 2.0)
+    assert written == []
+    release.set()
+    history.flush()
+    assert written == [1.0, 2.0]
@@ -0,0 +1,64 @@
+"""Micro-benchmarks du pipeline de mise en forme des données (temps et pic mémoire par étape).
+
+Usage (depuis backend/) : pytest bench/ --benchmark-autosave
+Comparaison entre commits : pytest bench/ --benchmark-compare
+"""
+import os
+import sys
+from datetime import time
+import pandas as pd
+import pytest
+from tgvmax_engine import store
+from tgvmax_engine import get_day_frame, filter_stations, filter_trains_by_time, format_single_trips
+from tgvmax_engine.index import index_frame
+from bench.conftest import START
+
+@pytest.fixture
+def day_frame(records):
+    return pd.DataFrame(records)
+
+def test_get_day_frame(stage, cached_upstream):
+    def uncached_day():
+        # Chaque tour reconstruit la journée (sans le cache de DataFrames)
+        store._frames.clear()
+        return (START,)
+    stage(get_day_frame, uncached_day)
+
+def test_station_filter(stage, day_frame):
+    def station_filter(df):
+        df = df[df["origine"].str.contains("PARIS", na=False)]
+        return df[df["destination"].str.contains("LYON", na=False)]
+    stage(station_filter, lambda: (day_frame,))
+
+def test_indexed_station_filter(stage, day_frame):
+    indexed = index_frame(day_frame.copy())
+    stage(filter_stations, lambda: (indexed, "PARIS", "LYON"))
+
+def test_filter_trains_by_time(stage, day_frame):
+    stage(filter_trains_by_time, lambda: (day_frame.copy(), time(6, 0), time(23, 0)))
+
+def test_format_single_trips(stage, day_frame):
+    stage(format_single_trips, lambda: (day_frame,))
+
+@pytest.fixture(scope="module")
+def streamlit_app():
+    """Fonctions de durée de tgvmax_app (ignorées si l'app Streamlit n'est pas importable)."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    try:
+        import tgvmax_app
+    except Exception as e:
+        pytest.skip(f"tgvmax_app non importable : {e}")
+    return tgvmax_app
+
+@pytest.fixture
+def durations(records):
+    return pd.Series([f"{(i * 7) % 6}h{(i * 13) % 60:02d}" for i in range(len(records))])
+
+def test_convert_duration_to_minutes(stage, streamlit_app, durations):
+    stage(lambda s: s.map(streamlit_app.convert_duration_to_minutes), lambda: (durations,))
+
+def test_convert_duration_to_timedelta(stage, streamlit_app, durations):
+    stage(lambda s: s.map(streamlit_app.convert_duration_to_timedelta), lambda: (durations,))
+
+def test_calculate_average_duration(stage, streamlit_app, durations):
+    stage(streamlit_app.calculate_average_duration, lambda: (durations,))
@@ -0,0 +1,49 @@
+"""Point de rencontre à 5 villes sur une semaine : jointure vectorielle comparée à un balayage Python."""
+from datetime import timedelta
+from tgvmax_engine.compact import _minutes
+from tgvmax_engine.engines import DayQuery, PandasEngine
+from tgvmax_engine.meetup import find_meetups
+from bench.conftest import START
+
+ORIGINS = ["PARIS", "LYON", "LILLE", "BORDEAUX", "STRASBOURG"]
+DAYS = 7
+
+def arrival(trip) -> int:
+    departure = _minutes(trip["heure_depart"])
+    return departure + (_minutes(trip["heure_arrivee"]) - departure) % (24 * 60)
+
+def reference(day, origins):
+    """Écart minimal par destination commune : chaque arrivée prise comme première, les autres villes au plus tôt après."""
+    arrivals = {}
+    for origin, trips in zip(origins, PandasEngine().search([DayQuery(day, origin) for origin in origins])):
+        for trip in trips:
+            arrivals.setdefault(trip["destination"], {}).setdefault(origin, []).append(arrival(trip))
+    spreads = {}
+    for destination, by_origin in arrivals.items():
+        if len(by_origin) < len(origins):
+            continue
+        best = None
+        for first in (a for times in by_origin.values() for a in times):
+            later = [min((a for a in times if a >= first), default=None) for times in by_origin.values()]
+            if None not in later:
+                best = min(best if best is not None else max(later) - first, max(later) - first)
+        spreads[destination] = best
+    return spreads
+
+def test_meetup(stage, memo_cleared):
+    days = len({r["date"] for r in memo_cleared})
+    dates = [START + timedelta(days=i) for i in range(min(days, DAYS))]
+    find_meetups(ORIGINS, dates, limit=1000)  # journées mémoïsées hors mesure
+    result = stage(find_meetups, lambda: (ORIGINS, dates, None, None, None, 0, 3, 1000))
+    for day, found in zip(dates, result):
+        assert {m["destination"]: m["spread_minutes"] for m in found["meetups"]} == reference(day, ORIGINS)
+        for meetup in found["meetups"]:
+            for origin, trip in meetup["arrivals"].items():
+                assert origin in trip["origine"].upper() and trip["destination"] == meetup["destination"]
+            for origin, options in meetup["returns"].items():
+                assert all(t["origine"] == meetup["destination"] and origin in t["destination"].upper()
+                           and t["heure_depart"] >= meetup["meeting_time"] for t in options["trips"])
+
+def test_reference(stage, memo_cleared):
+    """Référence : balayage Python de toutes les arrivées, une journée."""
+    stage(reference, lambda: (START, ORIGINS))
@@ -0,0 +1,51 @@
+"""Plages de dates glissantes : journées mémoïsées par (date, gares) comparées au calcul complet."""
+from datetime import time, timedelta
+import pytest
+from tgvmax_engine.engines import DayQuery, PandasEngine
+from tgvmax_engine.metrics import RESULT_CACHE_REQUESTS
+from tgvmax_engine.pool import run_page, run_searches
+from bench.conftest import START
+
+WINDOW = 3  # jours par recherche
+
+def sliding(records, shift: int):
+    days = len({r["date"] for r in records})
+    return [DayQuery(START + timedelta(days=(shift + i) % days), "PARIS", None, time(6, 0), time(22, 0)) for i in range(WINDOW)]
+
+def test_sliding_range(stage, memo_cleared):
+    """Chaque recherche décale la plage d'un jour : une seule journée nouvelle à calculer."""
+    shifts = iter(range(10 ** 6))
+    run_searches(sliding(memo_cleared, 0))
+    hits = RESULT_CACHE_REQUESTS.value("hit")
+    stage(run_searches, lambda: (sliding(memo_cleared, next(shifts) + 1),))
+    assert RESULT_CACHE_REQUESTS.value("hit") > hits
+    # Trajets assemblés depuis le cache identiques au calcul complet
+    batch = sliding(memo_cleared, next(shifts))
+    assert run_searches(batch) == PandasEngine().search(batch)
+
+def test_uncached_range(stage, memo_cleared):
+    """Référence : la même plage recalculée entièrement à chaque fois."""
+    stage(PandasEngine().search, lambda: (sliding(memo_cleared, 1),))
+
+@pytest.mark.parametrize("limit", [20, None])
+def test_first_page(stage, memo_cleared, limit):
+    """Première page d'une plage : le coût ne dépend que de `limit`, le total vient des comptages."""
+    batch = sliding(memo_cleared, 0)
+    expected = PandasEngine().search(batch)
+    total, rows = stage(run_page, lambda: (batch, 0, limit))
+    assert total == sum(len(day) for day in expected)
+    assert [t for _, t in rows] == [t for day in expected for t in day][:limit]
+
+@pytest.mark.parametrize("sort", ["duree", "-depart"])
+def test_top_k(stage, memo_cleared, sort):
+    """Top 20 trié sur les colonnes entières (tas borné), comparé au tri complet des trajets."""
+    batch = sliding(memo_cleared, 0)
+    trips = [t for day in PandasEngine().search(batch) for t in day]
+    total, rows = stage(run_page, lambda: (batch, 0, None, 240, sort, 20))
+    assert len(rows) == total == min(20, sum(1 for t in trips if duration(t) <= 240))
+    keys = [(duration(t) if sort == "duree" else 0, t["date"], t["heure_depart"]) for _, t in rows]
+    assert keys == sorted(keys, reverse=sort.startswith("-"))
+
+def duration(trip) -> int:
+    dep, arr = trip["heure_depart"], trip["heure_arrivee"]
+    return (int(arr[:2]) * 60 + int(arr[3:5]) - int(dep[:2]) * 60 - int(dep[3:5])) % (24 * 60)
@@ -0,0 +1,65 @@
+"""Pool de recherche : segments construits par le thread de publication, pas par la requête."""
+import threading
+from datetime import timedelta
+from time import sleep, time as timestamp
+import pytest
+from tgvmax_engine import memo, pool, store
+from tgvmax_engine.engines import DayQuery, PandasEngine
+from bench.conftest import START, timetable
+
+DAYS = 7
+KEY = tuple(sorted(store._day_params(START).items()))
+QUERIES = [DayQuery(START + timedelta(days=i), "PARIS", None, None, None) for i in range(DAYS)]
+
+@pytest.fixture
+def versions(monkeypatch):
+    """Installe une nouvelle version des données (DataFrames déjà construits) à chaque appel."""
+    monkeypatch.setattr(pool, "POOL_WORKERS", 2)
+    records = timetable(DAYS)
+
+    def load(version: str):
+        store.clear_cache()
+        memo.clear()
+        store._upstream_cache[KEY] = {
+            "records": records, "version": version, "etag": None,
+            "last_modified": None, "fetched_at": timestamp(), "stale": False,
+        }
+        for query in QUERIES:
+            store.get_day_frame(query.date)
+    yield load
+    pool.shutdown()
+    store.clear_cache()
+    memo.clear()
+
+def published(version: str, timeout: float = 30) -> bool:
+    """Attend que toutes les journées soient publiées pour `version`."""
+    days = {query.date.isoformat() for query in QUERIES}
+    deadline = timestamp() + timeout
+    while timestamp() < deadline:
+        with pool._segments_lock:
+            if days <= {day for day, v in pool._segments if v == version}:
+                return True
+        sleep(0.01)
+    return False
+
+def test_publish_off_request(versions, monkeypatch):
+    """Journées encodées par le thread de publication, pas par le thread de la requête."""
+    threads = []
+    publish = pool._publish
+    def tracked(day, key):
+        threads.append(threading.current_thread().name)
+        return publish(day, key)
+    monkeypatch.setattr(pool, "_publish", tracked)
+    versions("a")
+    assert pool.run_searches(QUERIES) == PandasEngine().search(QUERIES)
+    assert threads == ["tgvmax-pool-publisher"] * DAYS
+
+def test_ahead_of_time(versions):
+    """Après une nouvelle version, une seule journée demandée suffit à republier les autres."""
+    versions("a")
+    pool.run_searches(QUERIES)
+    versions("b")
+    pool.run_searches(QUERIES[:1])
+    assert published("b")
+    memo.clear()
+    assert pool.run_searches(QUERIES) == PandasEngine().search(QUERIES)
@@ -0,0 +1,57 @@
+"""Aller-retours appariés : fusion triée vectorisée par destination comparée à l'appariement quadratique."""
+from datetime import timedelta
+import pytest
+from tgvmax_engine.compact import _minutes, minute_windows
+from tgvmax_engine.engines import DayQuery, PandasEngine
+from tgvmax_engine.pool import run_results
+from tgvmax_engine.roundtrip import pair_round_trips
+from bench.conftest import START
+
+RETURN = START + timedelta(days=1)
+CASES = {
+    "all_destinations": dict(destination=None, min_stay=0, latest_return=None),
+    "day_trip": dict(destination=None, min_stay=120, latest_return=22 * 60),
+    "one_destination": dict(destination="LYON", min_stay=60, latest_return=None),
+}
+
+def queries(destination):
+    return [DayQuery(START, "PARIS", destination), DayQuery(RETURN, destination, "PARIS")]
+
+def brute_force(destination, min_stay, latest_return, per_destination=5):
+    """Référence : tous les couples (aller, retour) énumérés, notés et triés un à un."""
+    outbound, inbound = PandasEngine().search(queries(destination))
+    groups = {}
+    for a in outbound:
+        a_dep = _minutes(a["heure_depart"])
+        a_arr = a_dep + (_minutes(a["heure_arrivee"]) - a_dep) % (24 * 60)
+        for r in inbound:
+            if r["origine"] != a["destination"]:
+                continue
+            r_dep = 24 * 60 + _minutes(r["heure_depart"])
+            r_arr = r_dep + (_minutes(r["heure_arrivee"]) - _minutes(r["heure_depart"])) % (24 * 60)
+            if r_dep - a_arr < min_stay or (latest_return is not None and r_arr > 24 * 60 + latest_return):
+                continue
+            stay, travel = r_dep - a_arr, (a_arr - a_dep) + (r_arr - r_dep)
+            groups.setdefault(a["destination"], []).append(stay - travel)
+    return {station: (len(scores), sorted(scores, reverse=True)[:per_destination]) for station, scores in groups.items()}
+
+@pytest.mark.parametrize("case", list(CASES))
+def test_pairing(stage, memo_cleared, case):
+    params = CASES[case]
+    batch = queries(params["destination"])
+    outbound, inbound = run_results(batch)
+    windows = [minute_windows(*q.minutes()) for q in batch]
+    groups = stage(pair_round_trips, lambda: (outbound, inbound, *windows, 1, params["min_stay"], params["latest_return"]))
+    expected = brute_force(**params)
+    assert {g["destination"]: (g["count"], [i["score"] for i in g["itineraries"]]) for g in groups} == expected
+    scores = [g["itineraries"][0]["score"] for g in groups]
+    assert scores == sorted(scores, reverse=True)
+    for group in groups:
+        for itinerary in group["itineraries"]:
+            aller, retour = group["aller"][itinerary["aller"]], group["retour"][itinerary["retour"]]
+            assert aller["destination"] == retour["origine"] == group["destination"]
+            assert itinerary["sejour_minutes"] >= params["min_stay"]
+
+def test_brute_force(stage, memo_cleared):
+    """Référence : appariement quadratique sur les trajets sérialisés."""
+    stage(brute_force, lambda: tuple(CASES["all_destinations"].values()))
@@ -0,0 +1,115 @@
+"""Jeu de données partagé entre workers : publication, attachement et mémoire privée par worker.
+
+La mémoire privée (Private_Dirty de /proc/self/smaps_rollup) d'un worker attaché au fichier
+compact partagé est comparée à celle d'un worker qui garde sa propre copie des enregistrements.
+"""
+import json
+import os
+import time
+from multiprocessing import get_context
+import pytest
+from tgvmax_engine import shared, store
+from tgvmax_engine.compact import NO_TIME, CompactSnapshot
+from tgvmax_engine.engines import DayQuery, PandasEngine, get_engine
+from bench.conftest import START, timetable
+
+DAYS = 30
+
+def _private_kb() -> int:
+    with open("/proc/self/smaps_rollup") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("Private_Dirty:"))
+
+def _worker(mode: str, path: str, days: int) -> int:
+    """Mémoire privée (ko) retenue par un worker après chargement et une requête par jour."""
+    import gc
+    from datetime import timedelta
+    gc.collect()
+    before = _private_kb()
+    if mode == "shared":
+        data = CompactSnapshot.open(path)
+        for i in range(days):
+            data.trips(START + timedelta(days=i), "PARIS", None, 0, NO_TIME)
+    else:
+        with open(path, encoding="utf-8") as f:
+            records = json.load(f)
+        data = {}
+        for record in records:
+            data.setdefault(record["date"], []).append(record)
+    gc.collect()
+    return _private_kb() - before
+
+@pytest.fixture
+def published(tmp_path, monkeypatch):
+    """Enregistrements de DAYS jours publiés par shared.publish() dans un fichier partagé temporaire."""
+    records = timetable(DAYS)
+    path = str(tmp_path / "tgvmax.snap")
+    monkeypatch.setattr(shared, "SHARED_DATASET_PATH", path)
+    monkeypatch.setattr(shared, "_current", None)
+    monkeypatch.setattr(shared, "_identity", None)
+    monkeypatch.setattr(shared, "SHARED_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(shared, "_published_version", None)
+    store.clear_cache()
+    key = tuple(sorted(store._day_params(START).items()))
+    store._upstream_cache[key] = {
+        "records": records, "version": f"bench-{len(records)}", "etag": None,
+        "last_modified": None, "fetched_at": time.time(), "stale": False,
+    }
+    yield path, records
+    store.clear_cache()
+
+def test_publish(stage, published):
+    path, _ = published
+    def reset():
+        shared._published_version = None
+        return ()
+    assert stage(shared.publish, reset, rounds=3)
+    # Même version : la revalidation ne réécrit pas le fichier
+    assert not shared.publish()
+    assert CompactSnapshot.open(path).version == shared.shared_dataset().version
+
+def test_attach(stage, published):
+    path, _ = published
+    shared.publish()
+    stage(lambda: CompactSnapshot.open(path).trips(START, "PARIS", None, 0, NO_TIME))
+
+def test_compact_engine(stage, published):
+    """Le moteur compact lit le fichier publié et renvoie les trajets du moteur pandas sur les données du processus."""
+    from datetime import timedelta
+    batch = [DayQuery(START + timedelta(days=i), origin="PARIS") for i in range(DAYS)]
+    expected = PandasEngine().search(batch)
+    shared.publish()
+    result = stage(get_engine("compact").search, lambda: (batch,))
+    assert result == expected
+    assert store.get_dataset_info(START).version == shared.shared_dataset().version
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="mesure mémoire Linux uniquement")
+@pytest.mark.parametrize("workers", [1, 4])
+def test_worker_private_memory(benchmark, published, tmp_path, workers):
+    path, records = published
+    shared.publish()
+    raw = str(tmp_path / "records.json")
+    with open(raw, "w", encoding="utf-8") as f:
+        json.dump(records, f)
+    with get_context("spawn").Pool(workers) as pool:
+        attached = pool.starmap(_worker, [("shared", path, DAYS)] * workers)
+        private = pool.starmap(_worker, [("private", raw, DAYS)] * workers)
+    benchmark.extra_info["shared_private_kb"] = max(attached)
+    benchmark.extra_info["copy_private_kb"] = max(private)
+    benchmark.pedantic(lambda: None, rounds=1)
+    # Le fichier mappé ne coûte que l'en-tête (dictionnaires de valeurs) à chaque worker
+    assert max(attached) * 3 < min(private)
+
+def test_refresher_lifespan(published):
+    """Rafraîchisseur lancé au démarrage de l'app, arrêté à sa fermeture en rendant le verrou d'élection."""
+    from fastapi.testclient import TestClient
+    from main import app
+    path, _ = published
+    with TestClient(app):
+        deadline = time.time() + 10
+        while not os.path.exists(path) and time.time() < deadline:
+            time.sleep(0.01)
+        assert shared._refresher.is_alive() and os.path.exists(path)
+    assert shared._refresher is None
+    leader = shared._try_lead()
+    assert leader is not None
+    os.close(leader)
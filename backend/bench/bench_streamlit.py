@@ -0,0 +1,113 @@
+"""Démarrage à froid et coût d'un rerun de l'app Streamlit (tgvmax_app.py)."""
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import timedelta
+import pytest
+
+pytest.importorskip("streamlit.testing.v1")
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "tgvmax_app.py")
+# Dépendances qui ne doivent être chargées que si une carte est affichée
+MAP_MODULES = ("folium", "geopy", "streamlit_folium")
+
+COLD_START = f"""
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({APP_PATH!r}, default_timeout=60).run()
+print(json.dumps({{
+    "seconds": time.perf_counter() - t0,
+    "exceptions": len(at.exception),
+    "map_modules": [m for m in {MAP_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+def cold_start() -> dict:
+    """Premier rendu de l'app dans un interpréteur neuf (imports compris)."""
+    out = subprocess.run([sys.executable, "-c", COLD_START], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def test_cold_start(benchmark):
+    result = benchmark.pedantic(cold_start, rounds=3, iterations=1)
+    benchmark.extra_info["map_modules"] = result["map_modules"]
+    assert result["exceptions"] == 0
+    assert result["map_modules"] == []
+
+@pytest.fixture(scope="module")
+def app():
+    at = AppTest.from_file(APP_PATH, default_timeout=60).run()
+    assert not at.exception
+    return at
+
+def test_rerun(stage, app):
+    """Rerun sans recherche (changement de widget) : imports et CSS déjà en cache."""
+    stage(app.run, rounds=10)
+    assert not app.exception
+    assert not any(m in sys.modules for m in MAP_MODULES)
+
+@pytest.fixture
+def searched(monkeypatch):
+    """App après une recherche « Aller simple » sur la date proposée par défaut (données synthétiques
+    d'une journée placées dans le cache SNCF) ; chaque appel au moteur (find_trains) est compté."""
+    import tgvmax_engine
+    from tgvmax_engine import store
+    from config import MIN_DATE
+    from bench.conftest import timetable
+    day = MIN_DATE + timedelta(days=1)
+    trips = [dict(r, date=day.isoformat()) for r in timetable(1)]
+    store.clear_cache()
+    store._upstream_cache[tuple(sorted(store._day_params(day).items()))] = {
+        "records": trips, "version": "bench", "etag": None, "last_modified": None,
+        "fetched_at": time.time(), "stale": False,
+    }
+    calls = []
+    find_trains = tgvmax_engine.find_trains
+    monkeypatch.setattr(tgvmax_engine, "find_trains", lambda *a, **k: calls.append(a) or find_trains(*a, **k))
+    at = AppTest.from_file(APP_PATH, default_timeout=60).run()
+    at.sidebar.text_input[0].set_value(trips[0]["origine"])
+    at.sidebar.button[0].click().run()
+    assert not at.exception and len(calls) == 1 and at.multiselect
+    calls.clear()
+    yield at, calls
+    store.clear_cache()
+
+def test_refine_rerun(stage, searched):
+    """Durée maximale, tri et destinations changés après la recherche : affinage local, sans appel au moteur."""
+    at, calls = searched
+    settings = iter([(hours, sort) for hours in (2, 4, 12) for sort in ("Durée", "Destination", "Heure de départ")] * 4)
+
+    def refine():
+        hours, sort = next(settings)
+        at.sidebar.slider[-2].set_value(hours)
+        at.sidebar.selectbox[0].set_value(sort).run()
+    stage(refine, rounds=10)
+    at.sidebar.slider[-2].set_value(12)
+    at.multiselect[0].set_value(at.multiselect[0].options[:2]).run()
+    assert not at.exception and not calls
+    assert set(at.dataframe[0].value["destination"]) <= set(at.multiselect[0].options[:2])
+
+def test_refine_matches_engine(cached_upstream):
+    """Tri et durée maximale appliqués localement : mêmes trajets, même ordre que le moteur."""
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    import tgvmax_app
+    from tgvmax_engine import find_trains
+    from bench.conftest import START
+    df, orders = tgvmax_app.compact_frame(find_trains(START)), {}
+    for sort in ("depart", "-depart", "duree", "-duree", "destination", "-destination"):
+        for max_duration in (None, 120):
+            expected = [(t["train_no"], t["heure_depart"]) for t in find_trains(START, max_duration=max_duration, sort=sort)]
+            refined = tgvmax_app.refine_trips(df, orders, max_duration, sort)
+            assert list(zip(refined["train_no"].astype(str), refined["heure_depart"])) == expected
+
+def test_export_matches_api(cached_upstream):
+    """Export produit depuis les résultats en session : mêmes octets que l'export en flux de /api/export."""
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    import tgvmax_app
+    from tgvmax_engine import export_frame, export_trips, find_trains
+    from bench.conftest import START
+    df = tgvmax_app.refine_trips(tgvmax_app.compact_frame(find_trains(START)), {}, 120)
+    assert b"".join(export_frame("csv", df)) == b"".join(export_trips("csv", START, 1, max_duration=120))
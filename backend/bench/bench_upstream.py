@@ -0,0 +1,47 @@
+"""Disjoncteur du client SNCF : un essai demi-ouvert interrompu ne le bloque pas."""
+import time
+import pytest
+import requests
+from tgvmax_engine.upstream import CircuitBreaker, TokenBucket, UpstreamClient, UpstreamUnavailable
+from bench.conftest import timetable
+from bench.fake_sncf import FakeSNCF
+
+RESET = 0.05
+
+@pytest.fixture(scope="module")
+def fake_sncf():
+    fake = FakeSNCF(timetable(1)).start()
+    yield fake
+    fake.stop()
+
+@pytest.fixture
+def half_open(fake_sncf):
+    """Client dont le disjoncteur vient de passer demi-ouvert."""
+    client = UpstreamClient(fake_sncf.url)
+    client.breaker = CircuitBreaker(threshold=1, reset_timeout=RESET)
+    client.breaker.record_failure()
+    time.sleep(RESET)
+    assert client.breaker.state == "half_open"
+    return client
+
+def test_trial_aborted_by_quota(half_open):
+    bucket = half_open.bucket
+    half_open.bucket = TokenBucket(0.001, 0, path=None)  # aucun jeton avant la fin du budget
+    with pytest.raises(UpstreamUnavailable):
+        half_open.get({"limit": 1})
+    # Essai interrompu sans verdict : le suivant passe et referme le disjoncteur
+    half_open.bucket = bucket
+    assert half_open.get({"limit": 1}).status_code == 200
+    assert half_open.breaker.state == "closed"
+
+def test_trial_unexpected_error(half_open, monkeypatch):
+    def broken(*args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError("réponse tronquée")
+    monkeypatch.setattr(half_open.session, "get", broken)
+    with pytest.raises(UpstreamUnavailable):
+        half_open.get({"limit": 1})
+    # Échec enregistré : disjoncteur rouvert, nouvel essai après reset_timeout
+    assert half_open.breaker.state == "open"
+    time.sleep(RESET)
+    monkeypatch.undo()
+    assert half_open.get({"limit": 1}).status_code == 200
@@ -0,0 +1,61 @@
+import os
+import sys
+import tracemalloc
+from datetime import date
+import pytest
+
+# Les modules de l'API sont importés comme depuis backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.synthetic import generate_records
+
+# Volume d'une journée nationale (surchargeable pour des runs rapides)
+TRAINS_PER_DAY = int(os.getenv("BENCH_TRAINS_PER_DAY", 8000))
+SCALES = {"1d": 1, "7d": 7, "30d": 30}
+START = date(2025, 7, 1)
+
+_datasets = {}
+
+def timetable(days: int):
+    """Horaires synthétiques de `days` jours, générés une seule fois par session."""
+    if days not in _datasets:
+        _datasets[days] = generate_records(START, days=days, trains_per_day=TRAINS_PER_DAY)
+    return _datasets[days]
+
+@pytest.fixture(params=list(SCALES), ids=list(SCALES))
+def records(request):
+    return timetable(SCALES[request.param])
+
+@pytest.fixture
+def stage(benchmark):
+    """Mesure le temps (pytest-benchmark) et le pic mémoire (tracemalloc) d'une étape."""
+    def run(func, make_args=lambda: (), rounds=5):
+        args = make_args()
+        tracemalloc.start()
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        benchmark.extra_info["peak_memory_mb"] = round(peak / 2 ** 20, 2)
+        return benchmark.pedantic(func, setup=lambda: (make_args(), {}), rounds=rounds, iterations=1)
+    return run
+
+@pytest.fixture
+def cached_upstream(records):
+    """Place les enregistrements dans le cache SNCF pour mesurer le traitement seul."""
+    from tgvmax_engine import store
+    key = tuple(sorted(store._day_params(START).items()))
+    store.clear_cache()
+    store._upstream_cache[key] = {
+        "records": records, "version": f"bench-{len(records)}", "etag": None,
+        "last_modified": None, "fetched_at": float("inf"), "stale": False,
+    }
+    yield records
+    store.clear_cache()
+
+@pytest.fixture
+def memo_cleared(cached_upstream):
+    """Comme cached_upstream, avec le cache des résultats par journée (tgvmax_engine.memo) vidé avant et après."""
+    from tgvmax_engine import memo
+    memo.clear()
+    yield cached_upstream
+    memo.clear()
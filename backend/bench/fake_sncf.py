@@ -0,0 +1,123 @@
+"""Stand-in local de l'API SNCF tgvmax, servi à partir d'un fixture enregistré ou synthétique.
+
+Usage : python -m bench.fake_sncf --fixture bench/fixtures/tgvmax.json --latency-ms 80 --page-size 100
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+from bench.synthetic import generate_records
+
+WHERE_DATE = re.compile(r"date\s*=\s*(?:date)?'(\d{4}-\d{2}-\d{2})'")
+
+class FakeSNCF:
+    """Serveur HTTP imitant l'endpoint /records de l'API SNCF (limit, offset, where sur la date)."""
+
+    def __init__(self, records: List[Dict], latency_ms: float = 0.0, page_size: int = 100,
+                 error_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.records = records
+        self.latency_ms = latency_ms
+        self.page_size = page_size
+        self.error_rate = error_rate  # part des réponses 503/429 pour simuler une API dégradée
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/explore/v2.1/catalog/datasets/tgvmax/records"
+
+    def start(self) -> "FakeSNCF":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_calls(self) -> int:
+        with self._lock:
+            calls, self.calls = self.calls, 0
+        return calls
+
+    def page(self, query: Dict[str, List[str]]) -> Dict:
+        """Construit une page de résultats comme l'API Opendatasoft v2.1."""
+        records = self.records
+        where = query.get("where", [""])[0]
+        match = WHERE_DATE.search(where)
+        if match:
+            records = [r for r in records if r["date"] == match.group(1)]
+        limit = min(int(query.get("limit", [10])[0]), self.page_size)
+        offset = int(query.get("offset", [0])[0])
+        return {"total_count": len(records), "results": records[offset:offset + limit]}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path == "/__stats":
+                    return self._send(200, json.dumps({"calls": fake.calls}).encode())
+                with fake._lock:
+                    fake.calls += 1
+                if fake.latency_ms:
+                    time.sleep(fake.latency_ms / 1000)
+                if fake.error_rate and random.random() < fake.error_rate:
+                    return self._send(random.choice([429, 503]), b'{"error": "degraded"}')
+                body = json.dumps(fake.page(parse_qs(parsed.query)), ensure_ascii=False).encode("utf-8")
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, b"", etag)
+                self._send(200, body, etag)
+
+            def _send(self, status: int, body: bytes, etag: Optional[str] = None):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def load_records(fixture: Optional[str], days: int, trains_per_day: int) -> List[Dict]:
+    """Charge un fixture enregistré, ou génère des horaires synthétiques."""
+    if fixture:
+        with open(fixture, encoding="utf-8") as f:
+            data = json.load(f)
+        return data.get("results", data) if isinstance(data, dict) else data
+    return generate_records(days=days, trains_per_day=trains_per_day)
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in local de l'API SNCF tgvmax")
+    parser.add_argument("--fixture", help="Fichier JSON enregistré (sinon données synthétiques)")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--trains-per-day", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    fake = FakeSNCF(load_records(args.fixture, args.days, args.trains_per_day),
+                    latency_ms=args.latency_ms, page_size=args.page_size,
+                    error_rate=args.error_rate, port=args.port)
+    print(f"Fake SNCF sur {fake.url} ({len(fake.records)} enregistrements)")
+    fake._server.serve_forever()
+
+if __name__ == "__main__":
+    main()
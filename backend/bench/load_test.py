@@ -0,0 +1,239 @@
+"""Test de charge des endpoints de l'API contre un stand-in SNCF local.
+
+Usage (depuis backend/) :
+    python -m bench.load_test --concurrency 8 --requests 200 --latency-ms 80
+    python -m bench.load_test --compare bench/results/<baseline>.json
+    python -m bench.load_test --endpoints single --flood 16   # pendant un afflux de recherches sur 30 jours
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+import requests
+from bench.fake_sncf import FakeSNCF, load_records
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+def scenarios(start: date) -> Dict[str, tuple]:
+    """Requêtes exercées par le test de charge."""
+    day = start.isoformat()
+    return {
+        "single": ("/api/trains/single", {"date": day, "origin": "PARIS"}),
+        "round-trip": ("/api/trains/round-trip", {
+            "depart_date": day, "return_date": (start + timedelta(days=2)).isoformat(), "origin": "PARIS"
+        }),
+        "range": ("/api/trains/range", {"start_date": day, "days": 7, "origin": "PARIS"}),
+        "stations": ("/api/stations", {}),
+    }
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentile par interpolation linéaire."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_backend(port: int):
+    """Démarre l'API dans un thread (uvicorn) et attend qu'elle soit prête."""
+    import uvicorn
+    from admission import AdmissionMiddleware
+    from main import app
+    # Tous les clients viennent de 127.0.0.1 : chacun est identifié par son en-tête de test
+    AdmissionMiddleware.identify = bench_client
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def client_address(n: int) -> dict:
+    """En-tête d'un utilisateur distinct : les limites par client du contrôle d'admission ne s'appliquent pas."""
+    return {"X-Bench-Client": f"bench-{n}"}
+
+def bench_client(self, scope) -> str:
+    """Clé des limites par client pendant le test de charge : l'en-tête X-Bench-Client."""
+    for name, value in scope.get("headers", []):
+        if name == b"x-bench-client":
+            return value.decode("latin-1")
+    return "bench"
+
+def drive(base_url: str, path: str, params: dict, total: int, concurrency: int) -> Dict:
+    """Envoie `total` requêtes avec `concurrency` connexions, chacune d'un utilisateur distinct, et mesure les latences."""
+    local = threading.local()
+    errors = []
+
+    def one(n):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        began = time.perf_counter()
+        response = session.get(base_url + path, params=params, headers=client_address(n), timeout=120)
+        elapsed = (time.perf_counter() - began) * 1000
+        if response.status_code >= 400:
+            errors.append(response.status_code)
+        return elapsed
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(total)))
+    wall = time.perf_counter() - began
+    return {
+        "requests": total,
+        "errors": len(errors),
+        "req_per_s": round(total / wall, 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+class Flood:
+    """Recherches sur 30 jours en boucle depuis `threads` clients, chacun à une origine différente (cache froid)."""
+
+    def __init__(self, base_url: str, start: date, origins: List[str], threads: int):
+        self.stop = threading.Event()
+        self.statuses: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, args=(base_url, start, origins, n), daemon=True)
+                         for n in range(threads)]
+
+    def _run(self, base_url: str, start: date, origins: List[str], n: int):
+        session = requests.Session()
+        headers = {"X-Bench-Client": f"flood-{n}"}
+        k = n
+        while not self.stop.is_set():
+            params = {"start_date": start.isoformat(), "days": 30, "origin": origins[k % len(origins)]}
+            response = session.get(base_url + "/api/trains/range", params=params, headers=headers, timeout=120)
+            with self._lock:
+                self.statuses[response.status_code] = self.statuses.get(response.status_code, 0) + 1
+            if response.status_code == 429:
+                self.stop.wait(float(response.headers.get("Retry-After", 1)))
+            k += len(self._threads)
+
+    def __enter__(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        for thread in self._threads:
+            thread.join()
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> bool:
+    """Affiche l'écart avec un résultat de référence ; False si une régression dépasse la tolérance."""
+    ok = True
+    for name, stats in current["endpoints"].items():
+        ref = baseline["endpoints"].get(name)
+        if not ref:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            delta = (stats[metric] - ref[metric]) / ref[metric] if ref[metric] else 0.0
+            flag = "  <-- régression" if delta > tolerance else ""
+            ok = ok and not flag
+            print(f"{name:12s} {metric:7s} {ref[metric]:9.2f} -> {stats[metric]:9.2f} ({delta:+.1%}){flag}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de l'API TGV Max")
+    parser.add_argument("--endpoints", default="single,round-trip,range,stations")
+    parser.add_argument("--requests", type=int, default=100, help="Requêtes par endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--fixture", help="Fixture SNCF enregistré (sinon synthétique)")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--trains-per-day", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Latence simulée de l'API SNCF")
+    parser.add_argument("--page-size", type=int, default=100, help="Taille de page maximale de l'API SNCF")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Part de réponses 429/503 de l'API SNCF")
+    parser.add_argument("--cache-ttl", type=int, help="Surcharge CACHE_TTL (0 = sans cache)")
+    parser.add_argument("--flood", type=int, default=0, help="Clients lançant en boucle des recherches sur 30 jours")
+    parser.add_argument("--out", help="Fichier de résultats JSON")
+    parser.add_argument("--compare", help="Résultat de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    # Les avertissements pandas par requête fausseraient les mesures
+    warnings.simplefilter("ignore")
+    records = load_records(args.fixture, args.days, args.trains_per_day)
+    fake = FakeSNCF(records, latency_ms=args.latency_ms, page_size=args.page_size,
+                    error_rate=args.error_rate).start()
+    # La configuration est lue à l'import : l'environnement doit être prêt avant
+    os.environ["SNCF_API_URL"] = fake.url
+    os.environ["TGVMAX_SNAPSHOT_DIR"] = tempfile.mkdtemp(prefix="tgvmax-bench-")
+    if args.cache_ttl is not None:
+        os.environ["CACHE_TTL"] = str(args.cache_ttl)
+    port = _free_port()
+    with contextlib.redirect_stdout(io.StringIO()):
+        server = start_backend(port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    start = date.fromisoformat(min(r["date"] for r in records))
+    results = {}
+    for name in args.endpoints.split(","):
+        path, params = scenarios(start)[name]
+        fake.reset_calls()
+        origins = sorted({r["origine"] for r in records})
+        with contextlib.redirect_stdout(io.StringIO()), Flood(base_url, start, origins, args.flood) as flood:
+            if args.flood:
+                time.sleep(1)  # afflux établi avant la mesure
+            stats = drive(base_url, path, params, args.requests, args.concurrency)
+        if args.flood:
+            stats["flood_statuses"] = {str(k): v for k, v in sorted(flood.statuses.items())}
+        stats["upstream_calls_per_request"] = round(fake.reset_calls() / args.requests, 3)
+        results[name] = stats
+        print(f"{name:12s} {stats['req_per_s']:8.1f} req/s  p50 {stats['p50_ms']:8.2f} ms  "
+              f"p95 {stats['p95_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  "
+              f"upstream/req {stats['upstream_calls_per_request']}")
+        if args.flood:
+            print(f"{'':12s} afflux : {stats['flood_statuses']}")
+    server.should_exit = True
+    fake.stop()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "records": len(records),
+        "endpoints": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"load-{report['commit'] or 'local'}-{int(time.time())}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Résultats écrits dans {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            if not compare(report, json.load(f), args.tolerance):
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
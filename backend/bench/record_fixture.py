@@ -0,0 +1,39 @@
+"""Enregistre un fixture à partir de l'API SNCF réelle.
+
+Usage : python -m bench.record_fixture --days 3 --out bench/fixtures/tgvmax.json
+"""
+import argparse
+import json
+import os
+from datetime import date, timedelta
+import requests
+from config import SNCF_API_URL
+
+def record(days: int, page_size: int = 100, max_per_day: int = 2000):
+    records = []
+    for i in range(days):
+        current = (date.today() + timedelta(days=i)).isoformat()
+        for offset in range(0, max_per_day, page_size):
+            response = requests.get(SNCF_API_URL, params={
+                "where": f"date = '{current}'", "limit": page_size, "offset": offset
+            }, timeout=30)
+            response.raise_for_status()
+            page = response.json().get("results", [])
+            records.extend(page)
+            if len(page) < page_size:
+                break
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description="Enregistre un fixture SNCF tgvmax")
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "fixtures", "tgvmax.json"))
+    args = parser.parse_args()
+    records = record(args.days)
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"results": records}, f, ensure_ascii=False)
+    print(f"{len(records)} enregistrements écrits dans {args.out}")
+
+if __name__ == "__main__":
+    main()
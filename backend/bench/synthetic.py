@@ -0,0 +1,44 @@
+import random
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+# Gares et axes réalistes pour générer des horaires synthétiques
+STATIONS = [
+    ("PARIS (intramuros)", "FRPAR", "SUD EST"), ("LYON (intramuros)", "FRLYS", "SUD EST"),
+    ("MARSEILLE ST CHARLES", "FRMSC", "SUD EST"), ("NICE VILLE", "FRNIC", "SUD EST"),
+    ("MONTPELLIER SAINT ROCH", "FRMPL", "SUD EST"), ("GRENOBLE", "FRGNB", "SUD EST"),
+    ("AVIGNON TGV", "FRAVG", "SUD EST"), ("DIJON VILLE", "FRDIJ", "SUD EST"),
+    ("LILLE (intramuros)", "FRLLE", "NORD"), ("ARRAS", "FRARS", "NORD"),
+    ("BORDEAUX ST JEAN", "FRBOJ", "ATLANTIQUE"), ("NANTES", "FRNTE", "ATLANTIQUE"),
+    ("RENNES", "FRRNS", "ATLANTIQUE"), ("TOURS", "FRTUF", "ATLANTIQUE"),
+    ("LA ROCHELLE VILLE", "FRLRH", "ATLANTIQUE"), ("TOULOUSE MATABIAU", "FRTLS", "ATLANTIQUE"),
+    ("STRASBOURG", "FRSXB", "EST"), ("METZ VILLE", "FRMZM", "EST"),
+    ("NANCY", "FRNCY", "EST"), ("REIMS", "FRRHE", "EST"),
+]
+
+def generate_records(start: Optional[date] = None, days: int = 1, trains_per_day: int = 500,
+                     seed: int = 42) -> List[Dict]:
+    """Génère des enregistrements au format de l'API SNCF tgvmax, triés par date."""
+    rng = random.Random(seed)
+    start = start or date.today()
+    records = []
+    for day in range(days):
+        current = (start + timedelta(days=day)).isoformat()
+        for n in range(trains_per_day):
+            origin, destination = rng.sample(STATIONS, 2)
+            dep = rng.randrange(5 * 60, 22 * 60)
+            arr = min(dep + rng.randrange(45, 6 * 60), 23 * 60 + 59)
+            records.append({
+                "date": current,
+                "train_no": str(6000 + (day * trains_per_day + n) % 4000),
+                "entity": "TGV INOUI",
+                "axe": origin[2],
+                "origine_iata": origin[1],
+                "destination_iata": destination[1],
+                "origine": origin[0],
+                "destination": destination[0],
+                "heure_depart": f"{dep // 60:02d}:{dep % 60:02d}",
+                "heure_arrivee": f"{arr // 60:02d}:{arr % 60:02d}",
+                "od_happy_card": rng.choice(["OUI", "OUI", "NON"]),
+            })
+    return records
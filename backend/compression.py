@@ -0,0 +1,126 @@
+import zlib
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import COMPRESSION_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:  # brotli est optionnel : on se rabat sur gzip
+    brotli = None
+
+# Formats déjà compressés : recompresser ne ferait que coûter du CPU
+INCOMPRESSIBLE_TYPES = ("application/vnd.apache.parquet",)
+
+def select_encoding(accept_encoding: str) -> Optional[str]:
+    """Choisit l'encodage à utiliser selon l'en-tête Accept-Encoding (br > gzip)."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+class _Compressor:
+    """Compresseur incrémental gzip ou brotli."""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._impl = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._flush = self._impl.flush
+            self._finish = self._impl.finish
+            self.compress = self._impl.process
+        else:
+            # wbits=31 : en-tête et somme de contrôle gzip
+            self._impl = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._flush = lambda: self._impl.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._impl.flush
+            self.compress = self._impl.compress
+
+    def chunk(self, data: bytes) -> bytes:
+        return self.compress(data) + self._flush()
+
+    def final(self, data: bytes) -> bytes:
+        return self.compress(data) + self._finish()
+
+class CompressionMiddleware:
+    """Middleware ASGI compressant les réponses (brotli ou gzip) au-delà d'un seuil de taille."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingResponder(send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+class _CompressingResponder:
+    def __init__(self, send: Send, encoding: str, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            # Déjà encodée, déjà compressée ou sans corps : on ne touche à rien
+            self.passthrough = ("content-encoding" in headers or message["status"] in (204, 304)
+                                or headers.get("content-type", "").startswith(INCOMPRESSIBLE_TYPES))
+            if self.passthrough:
+                await self._send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body and len(body) < self.minimum_size:
+                # Réponse trop petite : la compression ne vaut pas son coût
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+            self.compressor = _Compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # Corps réencodé : l'ETag fort décrit les octets non compressés, il devient faible (RFC 9110)
+                headers["ETag"] = f"W/{etag}"
+            if more_body:
+                # Réponse en streaming : la taille finale n'est pas connue
+                del headers["Content-Length"]
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": self.compressor.chunk(body), "more_body": True})
+                return
+            compressed = self.compressor.final(body)
+            headers["Content-Length"] = str(len(compressed))
+            await self._send(self.start_message)
+            await self._send({"type": "http.response.body", "body": compressed})
+            return
+
+        data = self.compressor.chunk(body) if more_body else self.compressor.final(body)
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -1,5 +1,7 @@
 import os
 from datetime import datetime, timedelta, time
+# Paramètres du moteur de données (API SNCF, cache, client), partagés avec l'app Streamlit
+from tgvmax_engine.config import SNCF_API_URL, API_LIMIT, CACHE_TTL
 
 # Paramètres par défaut
 MIN_DATE = datetime.now().date()
@@ -9,7 +11,33 @@ DEFAULT_END_TIME = time(23, 0)
 DEFAULT_ORIGIN = "PARIS"
 MAX_RANGE_DAYS = 30
 DEFAULT_RANGE_DAYS = 7
+# Jours d'un export (/api/export) : tout l'horizon de réservation
+MAX_EXPORT_DAYS = (MAX_DATE - MIN_DATE).days + 1
+# Itinéraires aller-retour renvoyés au plus par destination
+MAX_PAIRS_PER_DESTINATION = 50
+# Villes de départ d'une recherche de point de rencontre
+MAX_MEETUP_ORIGINS = 8
+# Journées d'une plage de dates récupérées en parallèle par l'app Streamlit
+RANGE_PREFETCH_WORKERS = int(os.getenv("RANGE_PREFETCH_WORKERS", 8))
 
-# API SNCF
-SNCF_API_URL = os.getenv("SNCF_API_URL", "https://ressources.data.sncf.com/api/explore/v2.1/catalog/datasets/tgvmax/records")
-API_LIMIT = int(os.getenv("API_LIMIT", 100)) 
\ No newline at end of file
+# Contrôle d'admission (par worker) : places d'exécution, dont au plus ADMISSION_EXPENSIVE_SLOTS pour les
+# requêtes de coût (jours × gares) supérieur à ADMISSION_CHEAP_COST ; ADMISSION_SLOTS=0 le désactive
+ADMISSION_SLOTS = int(os.getenv("ADMISSION_SLOTS", 16))
+ADMISSION_EXPENSIVE_SLOTS = int(os.getenv("ADMISSION_EXPENSIVE_SLOTS", 4))
+ADMISSION_CHEAP_COST = int(os.getenv("ADMISSION_CHEAP_COST", 2))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 5))  # secondes d'attente avant 429
+# Par client : requêtes simultanées et quota en unités de coût (par seconde, rafale)
+ADMISSION_CLIENT_CONCURRENCY = int(os.getenv("ADMISSION_CLIENT_CONCURRENCY", 4))
+ADMISSION_CLIENT_RATE = float(os.getenv("ADMISSION_CLIENT_RATE", 10))
+ADMISSION_CLIENT_BURST = float(os.getenv("ADMISSION_CLIENT_BURST", 60))
+# Proxys de confiance devant l'API : l'adresse du client est la N-ième entrée de X-Forwarded-For
+# en partant de la droite (celle ajoutée par le proxy) ; 0 : adresse de connexion, en-tête ignoré
+ADMISSION_TRUSTED_PROXIES = int(os.getenv("ADMISSION_TRUSTED_PROXIES", 0))
+
+# Cache HTTP
+CACHE_STALE_WHILE_REVALIDATE = int(os.getenv("CACHE_STALE_WHILE_REVALIDATE", 300))
+
+# Compression des réponses (taille minimale en octets)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
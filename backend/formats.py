@@ -0,0 +1,114 @@
+import io
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from metrics import stage
+
+JSON = "application/json"
+COLUMNAR = "application/vnd.tgvmax.columnar+json"
+ARROW = "application/vnd.apache.arrow.stream"
+
+# Colonnes à forte répétition encodées par dictionnaire (gares, dates...)
+DICTIONARY_COLUMNS = (
+    "origine", "destination", "origine_iata", "destination_iata",
+    "date", "axe", "entity", "od_happy_card", "leg",
+)
+
+def _arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def negotiate_format(request: Request) -> str:
+    """Choisit le format de sortie selon l'en-tête Accept (JSON par défaut)."""
+    header = request.headers.get("accept", "")
+    candidates = []
+    for position, part in enumerate(header.split(",")):
+        media_type, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type.strip().lower()))
+    if not candidates:
+        return JSON
+    for _, _, media_type in sorted(candidates):
+        if media_type == ARROW and _arrow_available():
+            return ARROW
+        if media_type == COLUMNAR:
+            return COLUMNAR
+        if media_type in (JSON, "application/*", "*/*"):
+            return JSON
+    raise HTTPException(status_code=406, detail=f"Formats supportés : {JSON}, {COLUMNAR}, {ARROW}")
+
+def _columns(trips: List[Dict]) -> List[str]:
+    columns: Dict[str, None] = {}
+    for trip in trips:
+        columns.update(dict.fromkeys(trip))
+    return list(columns)
+
+def encode_columnar(trips: List[Dict]) -> Dict[str, Any]:
+    """Encode une liste de trajets en colonnes, les gares étant encodées par dictionnaire."""
+    columns = {}
+    for name in _columns(trips):
+        values = [trip.get(name) for trip in trips]
+        if name in DICTIONARY_COLUMNS:
+            dictionary: Dict[Any, int] = {}
+            codes = [dictionary.setdefault(value, len(dictionary)) for value in values]
+            columns[name] = {"dictionary": list(dictionary), "codes": codes}
+        else:
+            columns[name] = values
+    return {"length": len(trips), "columns": columns}
+
+def _trip_rows(trips: List[Dict]) -> List[Dict]:
+    """Aplatit les trajets ; un aller-retour (groupes par destination) donne deux lignes par itinéraire."""
+    if not trips or "itineraries" not in trips[0]:
+        return trips
+    rows = []
+    for group in trips:
+        for number, itinerary in enumerate(group["itineraries"]):
+            extra = {k: itinerary[k] for k in ("sejour_minutes", "trajet_minutes", "score")}
+            for leg in ("aller", "retour"):
+                rows.append(dict(group[leg][itinerary[leg]], leg=leg, itinerary=number, **extra))
+    return rows
+
+def encode_arrow(trips: List[Dict], metadata: Dict[str, Any]) -> bytes:
+    """Sérialise les trajets au format Arrow IPC (stream)."""
+    import pyarrow as pa
+    rows = _trip_rows(trips)
+    table = pa.Table.from_pylist(rows) if rows else pa.table({})
+    for name in DICTIONARY_COLUMNS:
+        index = table.schema.get_field_index(name)
+        if index >= 0 and pa.types.is_string(table.schema.field(index).type):
+            table = table.set_column(index, name, table.column(name).dictionary_encode())
+    table = table.replace_schema_metadata({k: str(v) for k, v in metadata.items()})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def render(fmt: str, payload: Dict[str, Any], response: Optional[Response] = None) -> Response:
+    """Construit la réponse dans le format négocié."""
+    with stage("serialize"):
+        return _render(fmt, payload, response)
+
+def _render(fmt: str, payload: Dict[str, Any], response: Optional[Response]) -> Response:
+    payload = jsonable_encoder(payload)
+    headers = dict(response.headers) if response is not None else {}
+    headers.pop("content-length", None)
+    if fmt == JSON:
+        return JSONResponse(payload, headers=headers)
+    trips = payload.get("trips", [])
+    if fmt == COLUMNAR:
+        payload["trips"] = encode_columnar(_trip_rows(trips))
+        return JSONResponse(payload, media_type=COLUMNAR, headers=headers)
+    metadata = {k: v for k, v in payload.items() if k != "trips"}
+    return Response(encode_arrow(trips, metadata), media_type=ARROW, headers=headers)
@@ -0,0 +1,55 @@
+import hashlib
+from time import time as timestamp
+from typing import Dict, List, Optional
+from fastapi import Request, Response
+from tgvmax_engine import DatasetInfo
+from config import CACHE_TTL, CACHE_STALE_WHILE_REVALIDATE
+
+def compute_etag(endpoint: str, params: Dict[str, Optional[str]], datasets: List[DatasetInfo]) -> str:
+    """Calcule l'ETag d'une réponse à partir de la requête normalisée et des versions de données."""
+    digest = hashlib.sha1(endpoint.encode("utf-8"))
+    for key in sorted(params):
+        if params[key] is not None:
+            digest.update(f"|{key}={params[key]}".encode("utf-8"))
+    for dataset in datasets:
+        digest.update(f"|{dataset.version}".encode("utf-8"))
+    return f'"{digest.hexdigest()[:20]}"'
+
+def data_age(datasets: List[DatasetInfo]) -> float:
+    """Âge (secondes) des plus anciennes données SNCF utilisées."""
+    fetched = [d.fetched_at for d in datasets]
+    return max(0.0, timestamp() - min(fetched)) if fetched else 0.0
+
+def cache_control(datasets: List[DatasetInfo]) -> str:
+    """En-tête Cache-Control aligné sur le prochain rafraîchissement des données."""
+    max_age = max(0, int(CACHE_TTL - data_age(datasets)))
+    return f"public, max-age={max_age}, stale-while-revalidate={CACHE_STALE_WHILE_REVALIDATE}"
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Indique si l'en-tête If-None-Match du client correspond à l'ETag courant."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    # Comparaison faible (RFC 9110) : on ignore le préfixe W/
+    return "*" in candidates or etag in (c[2:] if c.startswith("W/") else c for c in candidates)
+
+def set_cache_headers(response: Response, etag: str, datasets: List[DatasetInfo]) -> None:
+    """Ajoute ETag, Cache-Control, âge et provenance des données à une réponse."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control(datasets)
+    response.headers["Vary"] = "Accept"
+    if datasets:
+        # Pas d'en-tête Age : max-age en tient déjà compte
+        response.headers["X-Data-Age"] = str(int(data_age(datasets)))
+        response.headers["X-Data-Source"] = ",".join(sorted({d.source for d in datasets}))
+    if any(d.stale for d in datasets):
+        # API SNCF indisponible : dernières données connues
+        response.headers["Warning"] = '110 - "Response is Stale"'
+        response.headers["X-Data-Stale"] = "true"
+
+def not_modified(etag: str, datasets: List[DatasetInfo]) -> Response:
+    """Réponse 304 sans corps."""
+    response = Response(status_code=304)
+    set_cache_headers(response, etag, datasets)
+    return response
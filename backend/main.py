@@ -1,12 +1,49 @@
-from fastapi import FastAPI, HTTPException, Query
+import contextvars
+import logging
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from datetime import datetime, time, timedelta
-from typing import Optional
-from api_utils import get_tgvmax_trains, filter_trains_by_time, format_single_trips
-from config import MAX_RANGE_DAYS
+from typing import Iterator, Optional
+from tgvmax_engine import (
+    EXPORT_FORMATS, SORT_KEYS, DayQuery, SearchTimeout, UpstreamUnavailable, availability_as_of, availability_calendar,
+    availability_changes, cached_page, export_trips, find_meetups, freshness, get_day_frame, get_dataset_info, get_engine,
+    next_departures, pair_round_trips, run_page, run_results, start_refresher, stop_refresher,
+)
+from tgvmax_engine.compact import minute_windows
+from tgvmax_engine.logs import get_logger
+from config import MAX_EXPORT_DAYS, MAX_MEETUP_ORIGINS, MAX_PAIRS_PER_DESTINATION, MAX_RANGE_DAYS, MIN_DATE, MAX_DATE
+from http_cache import compute_etag, etag_matches, set_cache_headers, not_modified
+from admission import AdmissionMiddleware
+from compression import CompressionMiddleware
+from formats import _arrow_available, negotiate_format, render
+from pagination import MAX_PAGE_SIZE, decode_cursor, page_fields
+from metrics import MetricsMiddleware, render_prometheus
+
+logger = get_logger("tgvmax.api")
+
+# Tri des trajets : critère de SORT_KEYS, précédé de "-" pour l'ordre décroissant
+SORT_PATTERN = f"^-?({'|'.join(SORT_KEYS)})$"
+
+async def plan_freshness(
+    max_staleness: Optional[int] = Query(None, ge=0, description="Âge maximal des données SNCF accepté (secondes, CACHE_TTL par défaut ; 0 : données en direct)")
+):
+    # Exécutée dans la tâche de la requête : la fraîcheur exigée suit l'endpoint dans le pool de threads
+    with freshness(max_staleness):
+        yield
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Dans chaque worker (après le fork) : un seul d'entre eux sera élu rafraîchisseur
+    start_refresher()
+    yield
+    stop_refresher()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(plan_freshness)])
 
+# Contrôle d'admission (coût, limites par client, file à priorité) : sous CORS, pour que les 429 restent lisibles
+app.add_middleware(AdmissionMiddleware)
 # Configuration CORS pour permettre les requêtes depuis le frontend
 app.add_middleware(
     CORSMiddleware,
@@ -15,6 +52,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compression gzip/brotli des réponses volumineuses
+app.add_middleware(CompressionMiddleware)
+# Durée des requêtes et des étapes (Server-Timing, /metrics)
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 def root():
@@ -22,44 +63,67 @@ def root():
 
 @app.get("/api/trains/single")
 def get_single_trips(
+    request: Request,
+    response: Response,
     date: str = Query(..., description="Date au format YYYY-MM-DD"),
     origin: str = Query(..., description="Gare de départ"),
     destination: Optional[str] = Query(None, description="Gare de destination"),
     start_time: str = Query("00:00", description="Heure de début (HH:MM)"),
-    end_time: str = Query("23:59", description="Heure de fin (HH:MM)")
+    end_time: str = Query("23:59", description="Heure de fin (HH:MM)"),
+    max_duration: Optional[int] = Query(None, ge=1, description="Durée maximale du trajet (minutes)"),
+    sort: Optional[str] = Query(None, pattern=SORT_PATTERN, description="Tri : depart, duree ou destination (-duree : décroissant)"),
+    top: Optional[int] = Query(None, ge=1, description="Ne garder que les N premiers trajets (selon le tri)"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Nombre de trajets par page (tous par défaut)"),
+    cursor: Optional[str] = Query(None, description="Curseur de la page suivante (next_cursor)")
 ):
+    fmt = negotiate_format(request)
     try:
         depart_date = datetime.strptime(date, "%Y-%m-%d").date()
         start_t = datetime.strptime(start_time, "%H:%M").time()
         end_t = datetime.strptime(end_time, "%H:%M").time()
-        trains_df = get_tgvmax_trains(depart_date)
-        # Log détaillé pour debug
-        print(f"[API] Date demandée: {date}")
-        print(f"[API] Nombre de trains reçus: {len(trains_df)}")
-        if not trains_df.empty:
-            print(f"[API] Colonnes disponibles: {trains_df.columns.tolist()}")
-            print(f"[API] Dates trouvées: {trains_df['date'].unique().tolist()}")
-            print(f"[API] Premiers trains reçus:")
+        datasets = [get_dataset_info(depart_date)]
+        params = {
+            "date": date, "origin": origin.upper(), "destination": destination.upper() if destination else None,
+            "start_time": start_time, "end_time": end_time,
+            "max_duration": max_duration and str(max_duration), "sort": sort, "top": top and str(top)
+        }
+        etag = compute_etag(request.url.path, {**params, "format": fmt, "limit": limit and str(limit), "cursor": cursor}, datasets)
+        if etag_matches(request, etag):
+            return not_modified(etag, datasets)
+        offset = decode_cursor(cursor, request.url.path, params, datasets)
+        set_cache_headers(response, etag, datasets)
+        trains_df = get_day_frame(depart_date)
+        # Log détaillé pour debug (ignoré hors niveau DEBUG)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Date demandée: %s, %d trains reçus", date, len(trains_df))
             for i, row in trains_df.head(3).iterrows():
-                print(f"  - Train {i}: {row.get('origine', 'N/A')} -> {row.get('destination', 'N/A')} le {row.get('date', 'N/A')} à {row.get('heure_depart', 'N/A')}")
-        else:
-            print("[API] Aucun train reçu")
-        if trains_df.empty:
-            return {"message": "Aucun trajet trouvé pour cette date", "trips": []}
-        if origin:
-            trains_df = trains_df[trains_df['origine'].str.contains(origin.upper(), na=False)]
-        if destination:
-            trains_df = trains_df[trains_df['destination'].str.contains(destination.upper(), na=False)]
-        trains_df = filter_trains_by_time(trains_df, start_t, end_t)
+                logger.debug("Train %s: %s -> %s le %s à %s", i, row.get('origine', 'N/A'), row.get('destination', 'N/A'),
+                             row.get('date', 'N/A'), row.get('heure_depart', 'N/A'))
         if trains_df.empty:
-            return {"message": "Aucun trajet trouvé pour les critères spécifiés", "trips": []}
-        trips = format_single_trips(trains_df)
-        return {"message": f"Trajets trouvés pour {origin} le {date}", "count": len(trips), "trips": trips}
+            return render(fmt, {"message": "Aucun trajet trouvé pour cette date", "trips": []}, response)
+        # Journée mémoïsée par gares, partagée avec les allers-retours et les plages de dates
+        total, rows = cached_page([DayQuery(depart_date, origin, destination, start_t, end_t)], get_engine().search,
+                                  offset, limit, max_duration, sort, top)
+        trips = [trip for _, trip in rows]
+        if not total:
+            return render(fmt, {"message": "Aucun trajet trouvé pour les critères spécifiés", "trips": []}, response)
+        return render(fmt, {
+            "message": f"Trajets trouvés pour {origin} le {date}",
+            "count": len(trips),
+            **page_fields(total, offset, len(trips), limit, request.url.path, params, datasets),
+            "trips": trips
+        }, response)
+    except HTTPException:
+        raise
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche: {str(e)}")
 
 @app.get("/api/trains/round-trip")
 def get_round_trips(
+    request: Request,
+    response: Response,
     depart_date: str = Query(..., description="Date de départ (YYYY-MM-DD)"),
     return_date: str = Query(..., description="Date de retour (YYYY-MM-DD)"),
     origin: str = Query(..., description="Gare de départ"),
@@ -67,8 +131,15 @@ def get_round_trips(
     depart_start_time: str = Query("00:00", description="Heure de début départ (HH:MM)"),
     depart_end_time: str = Query("23:59", description="Heure de fin départ (HH:MM)"),
     return_start_time: str = Query("00:00", description="Heure de début retour (HH:MM)"),
-    return_end_time: str = Query("23:59", description="Heure de fin retour (HH:MM)")
+    return_end_time: str = Query("23:59", description="Heure de fin retour (HH:MM)"),
+    max_duration: Optional[int] = Query(None, ge=1, description="Durée maximale de chaque trajet (minutes)"),
+    min_stay: int = Query(0, ge=0, description="Temps minimal sur place entre l'arrivée de l'aller et le départ du retour (minutes)"),
+    latest_return: Optional[str] = Query(None, description="Heure d'arrivée maximale du retour (HH:MM)"),
+    per_destination: int = Query(5, ge=1, le=MAX_PAIRS_PER_DESTINATION, description="Nombre d'itinéraires par destination"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Nombre de destinations par page (toutes par défaut)"),
+    cursor: Optional[str] = Query(None, description="Curseur de la page suivante (next_cursor)")
 ):
+    fmt = negotiate_format(request)
     try:
         depart_dt = datetime.strptime(depart_date, "%Y-%m-%d").date()
         return_dt = datetime.strptime(return_date, "%Y-%m-%d").date()
@@ -76,80 +147,352 @@ def get_round_trips(
         depart_end = datetime.strptime(depart_end_time, "%H:%M").time()
         return_start = datetime.strptime(return_start_time, "%H:%M").time()
         return_end = datetime.strptime(return_end_time, "%H:%M").time()
-        depart_trains = get_tgvmax_trains(depart_dt)
-        return_trains = get_tgvmax_trains(return_dt)
-        if depart_trains.empty and return_trains.empty:
-            return {"message": "Aucun trajet trouvé pour ces dates", "trips": {"depart": [], "return": []}}
-        if not depart_trains.empty:
-            depart_trains = depart_trains[depart_trains['origine'].str.contains(origin.upper(), na=False)]
-            if destination:
-                depart_trains = depart_trains[depart_trains['destination'].str.contains(destination.upper(), na=False)]
-            depart_trains = filter_trains_by_time(depart_trains, depart_start, depart_end)
-        if not return_trains.empty:
-            if destination:
-                return_trains = return_trains[return_trains['origine'].str.contains(destination.upper(), na=False)]
-            return_trains = return_trains[return_trains['destination'].str.contains(origin.upper(), na=False)]
-            return_trains = filter_trains_by_time(return_trains, return_start, return_end)
-        depart_trips = format_single_trips(depart_trains) if not depart_trains.empty else []
-        return_trips = format_single_trips(return_trains) if not return_trains.empty else []
-        return {
+        latest = datetime.strptime(latest_return, "%H:%M").time() if latest_return else None
+        if return_dt < depart_dt:
+            raise HTTPException(status_code=400, detail="La date de retour précède la date de départ")
+        datasets = [get_dataset_info(depart_dt), get_dataset_info(return_dt)]
+        params = {
+            "depart_date": depart_date, "return_date": return_date,
+            "origin": origin.upper(), "destination": destination.upper() if destination else None,
+            "depart_start_time": depart_start_time, "depart_end_time": depart_end_time,
+            "return_start_time": return_start_time, "return_end_time": return_end_time,
+            "max_duration": max_duration and str(max_duration), "min_stay": str(min_stay),
+            "latest_return": latest_return, "per_destination": str(per_destination)
+        }
+        etag = compute_etag(request.url.path, {**params, "format": fmt, "limit": limit and str(limit), "cursor": cursor}, datasets)
+        if etag_matches(request, etag):
+            return not_modified(etag, datasets)
+        offset = decode_cursor(cursor, request.url.path, params, datasets)
+        set_cache_headers(response, etag, datasets)
+        queries = [
+            DayQuery(depart_dt, origin, destination, depart_start, depart_end),
+            # Retours de toutes les gares vers l'origine : appariés ensuite à la gare d'arrivée de chaque aller
+            DayQuery(return_dt, destination, origin, return_start, return_end),
+        ]
+        # Recherche lourde : exécutée dans le pool de processus s'il est activé
+        outbound, inbound = run_results(queries)
+        groups = pair_round_trips(
+            outbound, inbound, minute_windows(*queries[0].minutes()), minute_windows(*queries[1].minutes()),
+            (return_dt - depart_dt).days, min_stay, latest and latest.hour * 60 + latest.minute,
+            max_duration, per_destination,
+        )
+        if not groups:
+            return render(fmt, {"message": "Aucun aller-retour trouvé pour ces dates", "trips": []}, response)
+        # Pagination par destination, dans l'ordre du meilleur itinéraire
+        page = groups[offset:offset + limit] if limit is not None else groups[offset:]
+        return render(fmt, {
             "message": f"Trajets aller-retour trouvés pour {origin}",
             "depart_date": depart_date,
             "return_date": return_date,
-            "depart_count": len(depart_trips),
-            "return_count": len(return_trips),
-            "trips": {
-                "depart": depart_trips,
-                "return": return_trips
-            }
-        }
+            "count": len(page),
+            "itineraries_count": sum(g["count"] for g in page),
+            **page_fields(len(groups), offset, len(page), limit, request.url.path, params, datasets),
+            "trips": page
+        }, response)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Paramètre invalide: {str(e)}")
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+    except SearchTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche: {str(e)}")
 
 @app.get("/api/trains/range")
 def get_date_range_trips(
+    request: Request,
+    response: Response,
     start_date: str = Query(..., description="Date de début (YYYY-MM-DD)"),
     days: int = Query(7, description="Nombre de jours à rechercher"),
     origin: str = Query(..., description="Gare de départ"),
     destination: Optional[str] = Query(None, description="Gare de destination"),
     start_time: str = Query("00:00", description="Heure de début (HH:MM)"),
-    end_time: str = Query("23:59", description="Heure de fin (HH:MM)")
+    end_time: str = Query("23:59", description="Heure de fin (HH:MM)"),
+    max_duration: Optional[int] = Query(None, ge=1, description="Durée maximale du trajet (minutes)"),
+    sort: Optional[str] = Query(None, pattern=SORT_PATTERN, description="Tri : depart, duree ou destination (-duree : décroissant)"),
+    top: Optional[int] = Query(None, ge=1, description="Ne garder que les N premiers trajets (selon le tri)"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Nombre de trajets par page (tous par défaut)"),
+    cursor: Optional[str] = Query(None, description="Curseur de la page suivante (next_cursor)")
 ):
+    fmt = negotiate_format(request)
     try:
         start_dt = datetime.strptime(start_date, "%Y-%m-%d").date()
         start_t = datetime.strptime(start_time, "%H:%M").time()
         end_t = datetime.strptime(end_time, "%H:%M").time()
         if days > MAX_RANGE_DAYS:
             days = MAX_RANGE_DAYS
+        datasets = [get_dataset_info(start_dt + timedelta(days=i)) for i in range(days)]
+        params = {
+            "start_date": start_date, "days": str(days),
+            "origin": origin.upper(), "destination": destination.upper() if destination else None,
+            "start_time": start_time, "end_time": end_time,
+            "max_duration": max_duration and str(max_duration), "sort": sort, "top": top and str(top)
+        }
+        etag = compute_etag(request.url.path, {**params, "format": fmt, "limit": limit and str(limit), "cursor": cursor}, datasets)
+        if etag_matches(request, etag):
+            return not_modified(etag, datasets)
+        offset = decode_cursor(cursor, request.url.path, params, datasets)
+        set_cache_headers(response, etag, datasets)
         all_trips = []
-        for i in range(days):
-            current_date = start_dt + timedelta(days=i)
-            trains_df = get_tgvmax_trains(current_date)
-            if not trains_df.empty:
-                trains_df = trains_df[trains_df['origine'].str.contains(origin.upper(), na=False)]
-                if destination:
-                    trains_df = trains_df[trains_df['destination'].str.contains(destination.upper(), na=False)]
-                trains_df = filter_trains_by_time(trains_df, start_t, end_t)
-                if not trains_df.empty:
-                    trips = format_single_trips(trains_df)
-                    for trip in trips:
-                        trip['date'] = current_date.strftime("%Y-%m-%d")
-                    all_trips.extend(trips)
-        return {
+        dates = [start_dt + timedelta(days=i) for i in range(days)]
+        # Recherche lourde : une tâche par jour, dans le pool de processus s'il est activé
+        # Seuls les trajets de la page sont parcourus ; le total vient des comptages par journée
+        total, rows = run_page([DayQuery(d, origin, destination, start_t, end_t) for d in dates],
+                               offset, limit, max_duration, sort, top)
+        for day, trip in rows:
+            trip['date'] = dates[day].strftime("%Y-%m-%d")
+            all_trips.append(trip)
+        return render(fmt, {
             "message": f"Trajets trouvés pour {origin} sur {days} jours",
             "start_date": start_date,
             "days": days,
             "count": len(all_trips),
+            **page_fields(total, offset, len(all_trips), limit, request.url.path, params, datasets),
             "trips": all_trips
+        }, response)
+    except HTTPException:
+        raise
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+    except SearchTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche: {str(e)}")
+
+@app.get("/api/trains/meetup")
+def get_meetups(
+    request: Request,
+    response: Response,
+    origins: str = Query(..., description="Villes de départ séparées par des virgules (PARIS,LYON,LILLE)"),
+    date: str = Query(..., description="Date du rendez-vous (YYYY-MM-DD)"),
+    days: int = Query(1, ge=1, description="Nombre de jours à rechercher à partir de `date`"),
+    start_time: str = Query("00:00", description="Heure de début des départs (HH:MM)"),
+    end_time: str = Query("23:59", description="Heure de fin des départs (HH:MM)"),
+    max_duration: Optional[int] = Query(None, ge=1, description="Durée maximale de chaque trajet (minutes)"),
+    stay_days: int = Query(0, ge=0, le=MAX_RANGE_DAYS, description="Retour N jours après le rendez-vous (0 : le jour même)"),
+    returns: int = Query(3, ge=0, le=20, description="Nombre de retours proposés par origine"),
+    limit: int = Query(10, ge=1, le=100, description="Nombre de destinations par date")
+):
+    """Destinations atteignables depuis toutes les villes, avec l'écart entre les arrivées et les retours possibles."""
+    try:
+        cities = list(dict.fromkeys(o.strip().upper() for o in origins.split(",") if o.strip()))
+        if not 2 <= len(cities) <= MAX_MEETUP_ORIGINS:
+            raise HTTPException(status_code=400, detail=f"Indiquer entre 2 et {MAX_MEETUP_ORIGINS} villes de départ")
+        start_dt = datetime.strptime(date, "%Y-%m-%d").date()
+        start_t = datetime.strptime(start_time, "%H:%M").time()
+        end_t = datetime.strptime(end_time, "%H:%M").time()
+        days = min(days, MAX_RANGE_DAYS)
+        dates = [start_dt + timedelta(days=i) for i in range(days)]
+        datasets = [get_dataset_info(d) for d in dates]
+        etag = compute_etag(request.url.path, {
+            "origins": ",".join(cities), "date": date, "days": str(days), "start_time": start_time,
+            "end_time": end_time, "max_duration": max_duration and str(max_duration), "stay_days": str(stay_days),
+            "returns": str(returns), "limit": str(limit)
+        }, datasets)
+        if etag_matches(request, etag):
+            return not_modified(etag, datasets)
+        set_cache_headers(response, etag, datasets)
+        # Recherche lourde (villes x jours) : exécutée dans le pool de processus s'il est activé
+        by_date = find_meetups(cities, dates, start_t, end_t, max_duration, stay_days, returns, limit)
+        return {
+            "message": f"Destinations communes à {', '.join(cities)}",
+            "origins": cities,
+            "date": date,
+            "days": days,
+            "count": sum(d["count"] for d in by_date),
+            "dates": by_date
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Paramètre invalide: {str(e)}")
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+    except SearchTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche: {str(e)}")
+
+def _run_in(context: contextvars.Context, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Itère `chunks` dans `context` (chaque morceau peut être produit par un thread différent)."""
+    while True:
+        try:
+            yield context.run(next, chunks)
+        except StopIteration:
+            return
+
+@app.get("/api/export")
+def export(
+    request: Request,
+    start_date: str = Query(..., description="Date de début (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Date de fin incluse (YYYY-MM-DD), start_date par défaut"),
+    origin: Optional[str] = Query(None, description="Gare de départ (toutes par défaut)"),
+    destination: Optional[str] = Query(None, description="Gare de destination (toutes par défaut)"),
+    start_time: str = Query("00:00", description="Heure de début (HH:MM)"),
+    end_time: str = Query("23:59", description="Heure de fin (HH:MM)"),
+    max_duration: Optional[int] = Query(None, ge=1, description="Durée maximale du trajet (minutes)"),
+    format: str = Query("csv", pattern=f"^({'|'.join(EXPORT_FORMATS)})$", description="csv ou parquet")
+):
+    """Export en flux des trajets d'une période (CSV ou Parquet), produit journée par journée."""
+    try:
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end_dt = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else start_dt
+        start_t = datetime.strptime(start_time, "%H:%M").time()
+        end_t = datetime.strptime(end_time, "%H:%M").time()
+        days = (end_dt - start_dt).days + 1
+        if not 1 <= days <= MAX_EXPORT_DAYS:
+            raise HTTPException(status_code=400, detail=f"La période doit couvrir entre 1 et {MAX_EXPORT_DAYS} jours")
+        if format == "parquet" and not _arrow_available():
+            raise HTTPException(status_code=406, detail="Export Parquet indisponible (pyarrow non installé)")
+        # Données chargées avant le premier octet : une indisponibilité SNCF donne encore une erreur HTTP
+        datasets = [get_dataset_info(start_dt + timedelta(days=i)) for i in range(days)]
+        etag = compute_etag(request.url.path, {
+            "start_date": start_date, "end_date": end_dt.isoformat(),
+            "origin": origin.upper() if origin else None, "destination": destination.upper() if destination else None,
+            "start_time": start_time, "end_time": end_time, "max_duration": max_duration and str(max_duration),
+            "format": format
+        }, datasets)
+        if etag_matches(request, etag):
+            return not_modified(etag, datasets)
+        # Le flux est consommé après le retour de l'endpoint : il garde le contexte de la requête (fraîcheur)
+        context = contextvars.copy_context()
+        chunks = export_trips(format, start_dt, days, origin, destination, start_t, end_t, max_duration)
+        response = StreamingResponse(_run_in(context, chunks), media_type=EXPORT_FORMATS[format])
+        set_cache_headers(response, etag, datasets)
+        response.headers["Content-Disposition"] = f'attachment; filename="tgvmax_{start_dt}_{end_dt}.{format}"'
+        return response
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Paramètre invalide: {str(e)}")
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de l'export: {str(e)}")
+
+@app.get("/api/departures")
+def get_departures(
+    request: Request,
+    response: Response,
+    station: str = Query(..., description="Gare ou ville de départ"),
+    after: Optional[str] = Query(None, description="Date et heure de début (YYYY-MM-DDTHH:MM), maintenant par défaut"),
+    limit: int = Query(10, ge=1, le=100, description="Nombre de départs"),
+    destination: Optional[str] = Query(None, description="Gare de destination")
+):
+    """Tableau des départs : les prochains trains après `after`, en continuant sur les jours suivants."""
+    try:
+        after_dt = datetime.strptime(after, "%Y-%m-%dT%H:%M") if after else datetime.now().replace(second=0, microsecond=0)
+        # Horizon glissant de réservation (voir /api/calendar)
+        until = datetime.now().date() + (MAX_DATE - MIN_DATE)
+        datasets = [get_dataset_info(after_dt.date())]
+        etag = compute_etag(request.url.path, {
+            "station": station.upper(), "after": after_dt.strftime("%Y-%m-%dT%H:%M"), "limit": str(limit),
+            "destination": destination.upper() if destination else None
+        }, datasets)
+        if etag_matches(request, etag):
+            return not_modified(etag, datasets)
+        set_cache_headers(response, etag, datasets)
+        departures = next_departures(station, after_dt, limit=limit, destination=destination, until=until)
+        return {
+            "station": station,
+            "after": after_dt.strftime("%Y-%m-%dT%H:%M"),
+            "count": len(departures),
+            "departures": departures
         }
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Paramètre invalide: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche: {str(e)}")
 
+@app.get("/api/history")
+def get_history(
+    date: str = Query(..., description="Date de voyage (YYYY-MM-DD)"),
+    origin: Optional[str] = Query(None, description="Gare de départ"),
+    destination: Optional[str] = Query(None, description="Gare de destination"),
+    as_of: Optional[str] = Query(None, description="Instant d'observation (YYYY-MM-DDTHH:MM), maintenant par défaut")
+):
+    """Trains annoncés pour une date de voyage tels que connus à l'instant `as_of` (historique local)."""
+    try:
+        travel = datetime.strptime(date, "%Y-%m-%d").date()
+        as_of_dt = datetime.strptime(as_of, "%Y-%m-%dT%H:%M") if as_of else datetime.now()
+        trips = availability_as_of(travel, as_of_dt.timestamp(), origin, destination)
+        return {"date": date, "as_of": as_of_dt.isoformat(timespec="minutes"), "count": len(trips), "trips": trips}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Paramètre invalide: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la lecture de l'historique: {str(e)}")
+
+@app.get("/api/history/changes")
+def get_history_changes(
+    date: str = Query(..., description="Date de voyage (YYYY-MM-DD)"),
+    origin: Optional[str] = Query(None, description="Gare de départ"),
+    destination: Optional[str] = Query(None, description="Gare de destination"),
+    since: Optional[str] = Query(None, description="Début de la période d'observation (YYYY-MM-DDTHH:MM)"),
+    until: Optional[str] = Query(None, description="Fin de la période d'observation (YYYY-MM-DDTHH:MM)")
+):
+    """Apparitions et disparitions de trains pour une date de voyage, dans l'ordre où elles ont été observées."""
+    try:
+        travel = datetime.strptime(date, "%Y-%m-%d").date()
+        since_ts = datetime.strptime(since, "%Y-%m-%dT%H:%M").timestamp() if since else None
+        until_ts = datetime.strptime(until, "%Y-%m-%dT%H:%M").timestamp() if until else None
+        changes = availability_changes(travel, origin, destination, since_ts, until_ts)
+        return {"date": date, "count": len(changes), "changes": changes}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Paramètre invalide: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la lecture de l'historique: {str(e)}")
+
+@app.get("/api/calendar")
+def get_calendar(
+    request: Request,
+    response: Response,
+    origin: str = Query(..., description="Gare de départ"),
+    destination: Optional[str] = Query(None, description="Gare de destination"),
+    by_destination: bool = Query(False, description="Détail par destination pour chaque date")
+):
+    """Nombre de trains et premiers/derniers départs par date, sur tout l'horizon de réservation."""
+    try:
+        # Horizon glissant : MIN_DATE/MAX_DATE sont figés au démarrage du serveur
+        start_dt = datetime.now().date()
+        end_dt = start_dt + (MAX_DATE - MIN_DATE)
+        dates = [start_dt + timedelta(days=i) for i in range((end_dt - start_dt).days + 1)]
+        datasets = [get_dataset_info(d) for d in dates]
+        etag = compute_etag(request.url.path, {
+            "start": start_dt.isoformat(), "end": end_dt.isoformat(),
+            "origin": origin.upper(), "destination": destination.upper() if destination else None,
+            "by_destination": str(by_destination)
+        }, datasets)
+        if etag_matches(request, etag):
+            return not_modified(etag, datasets)
+        set_cache_headers(response, etag, datasets)
+        days = availability_calendar(origin, destination, start_dt, end_dt, by_destination=by_destination)
+        return {
+            "origin": origin,
+            "destination": destination,
+            "start_date": start_dt.isoformat(),
+            "end_date": end_dt.isoformat(),
+            "total": sum(d["count"] for d in days),
+            "days": days
+        }
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors du calcul du calendrier: {str(e)}")
+
 @app.get("/api/stations")
-def get_stations():
+def get_stations(request: Request, response: Response):
     try:
         recent_date = datetime.now().date()
-        trains_df = get_tgvmax_trains(recent_date)
+        datasets = [get_dataset_info(recent_date)]
+        etag = compute_etag(request.url.path, {"date": recent_date.isoformat()}, datasets)
+        if etag_matches(request, etag):
+            return not_modified(etag, datasets)
+        set_cache_headers(response, etag, datasets)
+        trains_df = get_day_frame(recent_date)
         if trains_df.empty:
             return {"message": "Aucune donnée disponible", "stations": []}
         origins = trains_df['origine'].dropna().unique().tolist()
@@ -161,9 +504,16 @@ def get_stations():
             "count": len(all_stations),
             "stations": all_stations
         }
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des gares: {str(e)}")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Métriques au format Prometheus (par processus)."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
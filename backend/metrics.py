@@ -0,0 +1,44 @@
+import logging
+from time import perf_counter
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from tgvmax_engine.logs import get_logger
+from tgvmax_engine.metrics import REQUEST_DURATION, render_prometheus, stage, track_spans, untrack_spans
+
+logger = get_logger("tgvmax.metrics")
+
+class MetricsMiddleware:
+    """Mesure chaque requête, expose les étapes en Server-Timing et les journalise en DEBUG."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token, spans = track_spans()
+        began = perf_counter()
+        status = {"code": 500}
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if spans:
+                    headers = MutableHeaders(raw=message["headers"])
+                    headers["Server-Timing"] = ", ".join(
+                        f"{name};dur={value * 1000:.1f}" for name, value in spans.items()
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            untrack_spans(token)
+            elapsed = perf_counter() - began
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "other")
+            REQUEST_DURATION.observe(elapsed, handler, str(status["code"]))
+            if logger.isEnabledFor(logging.DEBUG):
+                stages = " ".join(f"{name}_ms={value * 1000:.1f}" for name, value in spans.items())
+                logger.debug(f"path={scope['path']} status={status['code']} total_ms={elapsed * 1000:.1f} {stages}")
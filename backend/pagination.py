@@ -0,0 +1,52 @@
+import base64
+import hashlib
+import json
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from tgvmax_engine import DatasetInfo
+
+# Taille maximale d'une page (paramètre `limit`)
+MAX_PAGE_SIZE = 1000
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+def _query_digest(endpoint: str, params: Dict[str, Optional[str]]) -> str:
+    return _digest(endpoint, *(f"{k}={params[k]}" for k in sorted(params) if params[k] is not None))
+
+def _versions_digest(datasets: List[DatasetInfo]) -> str:
+    return _digest(*(d.version for d in datasets))
+
+def encode_cursor(offset: int, endpoint: str, params: Dict[str, Optional[str]], datasets: List[DatasetInfo]) -> str:
+    """Curseur opaque de la page suivante, lié à la requête et aux versions des données."""
+    payload = {"o": offset, "q": _query_digest(endpoint, params), "v": _versions_digest(datasets)}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str], endpoint: str, params: Dict[str, Optional[str]], datasets: List[DatasetInfo]) -> int:
+    """Position de départ désignée par `cursor` (0 sans curseur).
+
+    400 si le curseur est invalide ou vient d'une autre recherche, 410 si les données ont été
+    rafraîchies depuis : l'ordre des trajets n'est garanti qu'au sein d'une même version.
+    """
+    if not cursor:
+        return 0
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset = int(payload["o"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    if offset < 0 or payload.get("q") != _query_digest(endpoint, params):
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide pour cette recherche")
+    if payload.get("v") != _versions_digest(datasets):
+        raise HTTPException(status_code=410, detail="Les données ont été mises à jour : reprendre la recherche à la première page")
+    return offset
+
+def page_fields(total: int, offset: int, size: int, limit: Optional[int], endpoint: str,
+                params: Dict[str, Optional[str]], datasets: List[DatasetInfo]) -> Dict:
+    """Champs de pagination de la réponse : total, limite et curseur suivant (None en fin de liste)."""
+    end = offset + size
+    return {
+        "total": total,
+        "limit": limit,
+        "next_cursor": encode_cursor(end, endpoint, params, datasets) if limit is not None and end < total else None,
+    }
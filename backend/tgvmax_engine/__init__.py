@@ -0,0 +1,39 @@
+"""Moteur de données TGV Max partagé par l'API FastAPI et l'app Streamlit.
+
+Récupération auprès de l'API SNCF (client résilient), cache mémoire et instantané disque
+partagé entre processus, index des gares et filtres. Les sous-modules sont chargés à la
+demande : `tgvmax_engine.compact` (mode serverless) reste utilisable sans importer pandas.
+"""
+from importlib import import_module
+
+_EXPORTS = {
+    "calculate_duration": "filters", "filter_stations": "filters", "filter_trains_by_time": "filters",
+    "format_single_trips": "filters", "handle_error": "filters", "minutes_of_day": "filters",
+    "trips_frame": "filters",
+    "find_trains": "query",
+    "availability_calendar": "availability",
+    "next_departures": "departures",
+    "availability_as_of": "history", "availability_changes": "history",
+    "DayQuery": "engines", "get_engine": "engines",
+    "SORT_KEYS": "memo", "cached_page": "memo", "cached_search": "memo",
+    "shared_dataset": "shared", "start_refresher": "shared", "stop_refresher": "shared",
+    "pair_round_trips": "roundtrip",
+    "find_meetups": "meetup",
+    "EXPORT_FORMATS": "export", "export_frame": "export", "export_trips": "export",
+    "SearchTimeout": "pool", "run_page": "pool", "run_results": "pool", "run_searches": "pool",
+    "DatasetInfo": "store", "clear_cache": "store", "freshness": "store", "get_dataset_info": "store",
+    "get_day_frame": "store",
+    "UpstreamUnavailable": "upstream",
+}
+
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f"{__name__}.{_EXPORTS[name]}"), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,89 @@
+"""Calendrier des disponibilités : nombre de trains et premiers/derniers départs par date.
+
+Chaque journée est résumée une fois par version des données en agrégats par liaison
+(gare de départ, gare d'arrivée) ; le calendrier d'une recherche se calcule ensuite en une
+passe sur ces agrégats, sans matérialiser les trajets.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date as Date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from tgvmax_engine.compact import NO_TIME, _minutes
+from tgvmax_engine.config import FRAME_CACHE_SIZE
+from tgvmax_engine.metrics import stage
+
+class RouteStats(NamedTuple):
+    """Agrégat d'une liaison sur une journée (minutes depuis minuit, NO_TIME si inconnues)."""
+    count: int
+    earliest: int
+    latest: int
+
+# Agrégats journaliers par (date, version des données)
+_aggregates: "OrderedDict[Tuple[str, str], Dict[Tuple[str, str], RouteStats]]" = OrderedDict()
+_aggregates_lock = threading.Lock()
+
+def _hhmm(minute: int) -> Optional[str]:
+    return None if minute >= NO_TIME else f"{minute // 60:02d}:{minute % 60:02d}"
+
+def _merge(a: Optional[RouteStats], b: RouteStats) -> RouteStats:
+    if a is None:
+        return b
+    latest = max((m for m in (a.latest, b.latest) if m != NO_TIME), default=NO_TIME)
+    return RouteStats(a.count + b.count, min(a.earliest, b.earliest), latest)
+
+def day_aggregates(day: Date) -> Dict[Tuple[str, str], RouteStats]:
+    """Agrégats par liaison d'une journée, calculés une fois par version des données."""
+    from tgvmax_engine.store import get_dataset_info, get_day_records
+    key = (day.isoformat(), get_dataset_info(day).version)
+    with _aggregates_lock:
+        cached = _aggregates.get(key)
+        if cached is not None:
+            _aggregates.move_to_end(key)
+            return cached
+    version, records = get_day_records(day)
+    with stage("calendar_aggregate"):
+        routes: Dict[Tuple[str, str], RouteStats] = {}
+        for record in records:
+            minute = _minutes(record.get("heure_depart"))
+            route = (record.get("origine") or "", record.get("destination") or "")
+            routes[route] = _merge(routes.get(route), RouteStats(1, minute, minute))
+    with _aggregates_lock:
+        _aggregates[(day.isoformat(), version)] = routes
+        while len(_aggregates) > FRAME_CACHE_SIZE:
+            _aggregates.popitem(last=False)
+    return routes
+
+def _stats_dict(stats: Optional[RouteStats]) -> Dict:
+    if stats is None:
+        return {"count": 0, "earliest": None, "latest": None}
+    return {"count": stats.count, "earliest": _hhmm(stats.earliest), "latest": _hhmm(stats.latest)}
+
+def availability_calendar(origin: str, destination: Optional[str], start: Date, end: Date,
+                          by_destination: bool = False) -> List[Dict]:
+    """Disponibilités de `start` à `end` inclus pour une origine (et une destination), par date.
+
+    Les gares suivent la sémantique de filter_stations (recherche partielle, insensible à la casse).
+    """
+    origin_query = origin.upper() if origin else None
+    destination_query = destination.upper() if destination else None
+    days = []
+    current = start
+    while current <= end:
+        total: Optional[RouteStats] = None
+        per_destination: Dict[str, RouteStats] = {}
+        for (route_origin, route_destination), stats in day_aggregates(current).items():
+            if origin_query and origin_query not in route_origin:
+                continue
+            if destination_query and destination_query not in route_destination:
+                continue
+            total = _merge(total, stats)
+            if by_destination:
+                per_destination[route_destination] = _merge(per_destination.get(route_destination), stats)
+        day = dict(date=current.isoformat(), **_stats_dict(total))
+        if by_destination:
+            day["destinations"] = [
+                dict(destination=name, **_stats_dict(stats)) for name, stats in sorted(per_destination.items())
+            ]
+        days.append(day)
+        current += timedelta(days=1)
+    return days
@@ -0,0 +1,254 @@
+"""Instantané compact en lecture seule, interrogeable sans pandas (démarrage à froid serverless).
+
+Format (little-endian) : b"TGVMAXC1", longueur de l'en-tête (uint32), en-tête JSON
+(colonnes, dictionnaires de valeurs, plages de lignes par date), puis une colonne de codes
+par champ et trois colonnes d'index (gare de départ, minute de départ, ordre de l'API). Les lignes d'une
+journée sont triées par (gare de départ, heure de départ) : une gare est une plage contiguë
+et le créneau horaire s'y trouve par dichotomie, directement sur le fichier mappé en mémoire.
+
+Construction : python -m tgvmax_engine.compact --days 30 --out api/data/tgvmax.snap
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date as Date, timedelta
+from time import time as timestamp
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"TGVMAXC1"
+# Heure de départ absente ou invalide : jamais retenue par le filtre horaire
+NO_TIME = 0xFFFF
+
+def _minutes(value) -> int:
+    try:
+        return int(value[:2]) * 60 + int(value[3:5])
+    except (TypeError, ValueError):
+        return NO_TIME
+
+def minute_windows(start: int, end: int) -> List[Tuple[int, int]]:
+    """Plages de minutes d'un créneau ; un créneau qui passe minuit (22:00-02:00) en donne deux."""
+    if start <= end:
+        return [(start, end)]
+    return [(start, 24 * 60 - 1), (0, end)]
+
+def encode_snapshot(records: Iterable[Dict]) -> Tuple[dict, bytes]:
+    """Encode `records` (format de l'API SNCF) en instantané compact : (en-tête, contenu)."""
+    records = list(records)
+    columns: List[str] = []
+    for record in records:
+        for key in record:
+            if key not in columns:
+                columns.append(key)
+    for required in ("date", "origine", "heure_depart"):
+        if required not in columns:
+            columns.append(required)
+
+    dictionaries = {col: {} for col in columns}
+    def code(col, value):
+        return dictionaries[col].setdefault(value, len(dictionaries[col]))
+
+    origins = sorted({record.get("origine") or "" for record in records})
+    origin_rank = {value: rank for rank, value in enumerate(origins)}
+    rows = []
+    for position, record in enumerate(records):
+        rows.append((
+            str(record.get("date")), origin_rank[record.get("origine") or ""],
+            _minutes(record.get("heure_depart")), position,
+            [code(col, record.get(col)) for col in columns],
+        ))
+    rows.sort(key=lambda row: row[:4])
+
+    days: Dict[str, List[int]] = {}
+    for i, row in enumerate(rows):
+        days.setdefault(row[0], [i, i])[1] = i + 1
+    # Rang de chaque ligne dans la réponse de l'API, pour restituer l'ordre d'origine
+    first_position = {day: min(rows[i][3] for i in range(*bounds)) for day, bounds in days.items()}
+
+    data = []
+    layout = {}
+    offset = 0
+    def add(name: str, values: array):
+        nonlocal offset
+        raw = values.tobytes()
+        raw += b"\0" * (-len(raw) % 8)
+        layout[name] = [offset, values.typecode, len(values)]
+        data.append(raw)
+        offset += len(raw)
+
+    for i, col in enumerate(columns):
+        add(col, array("H" if len(dictionaries[col]) <= 0xFFFF else "I", (row[4][i] for row in rows)))
+    add("_origin", array("H" if len(origins) <= 0xFFFF else "I", (row[1] for row in rows)))
+    add("_departure", array("H", (row[2] for row in rows)))
+    add("_order", array("I", (row[3] - first_position[row[0]] for row in rows)))
+
+    version = hashlib.sha1(b"".join(data)).hexdigest()[:16]
+    header = {
+        "version": version,
+        "built_at": timestamp(),
+        "rows": len(rows),
+        "columns": columns,
+        "dictionaries": {col: list(values) for col, values in dictionaries.items()},
+        "origins": origins,
+        "days": days,
+        "layout": layout,
+    }
+    encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    prefix = MAGIC + struct.pack("<I", len(encoded)) + encoded
+    prefix += b"\0" * (-len(prefix) % 8)
+    return header, prefix + b"".join(data)
+
+def build_snapshot(records: Iterable[Dict], path: str) -> dict:
+    """Écrit l'instantané compact de `records` de manière atomique et renvoie son en-tête."""
+    header, content = encode_snapshot(records)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+    return header
+
+class CompactSnapshot:
+    """Instantané compact lu sans copie depuis un tampon (fichier mappé ou mémoire partagée)."""
+
+    def __init__(self, buffer, path: Optional[str] = None):
+        self.path = path
+        self._buffer = buffer
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path or 'tampon'} n'est pas un instantané compact TGV Max")
+        (size,) = struct.unpack_from("<I", view, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(bytes(view[start:start + size]).decode("utf-8"))
+        base = start + size + (-(start + size) % 8)
+        self.version: str = header["version"]
+        self.built_at: float = header["built_at"]
+        self.columns: List[str] = header["columns"]
+        self._values: Dict[str, list] = header["dictionaries"]
+        self._origins: List[str] = header["origins"]
+        self._days: Dict[str, List[int]] = header["days"]
+        self._view = view
+        self._arrays = {
+            name: view[base + offset:base + offset + length * array(typecode).itemsize].cast(typecode)
+            for name, (offset, typecode, length) in header["layout"].items()
+        }
+
+    @classmethod
+    def open(cls, path: str) -> "CompactSnapshot":
+        """Mappe en mémoire le fichier `path` (lecture seule, pages partagées entre processus)."""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), path)
+
+    def covers(self, date: Date) -> bool:
+        """Indique si la date figure dans l'instantané."""
+        return date.isoformat() in self._days
+
+    def dates(self) -> List[str]:
+        return sorted(self._days)
+
+    def stations(self) -> List[str]:
+        """Gares de départ et d'arrivée présentes dans l'instantané."""
+        values = set(self._values.get("origine", [])) | set(self._values.get("destination", []))
+        return sorted(v for v in values if v)
+
+    def _origin_ranges(self, lo: int, hi: int, origin: Optional[str]) -> List[Tuple[int, int]]:
+        if not origin:
+            return [(lo, hi)]
+        query = origin.upper()
+        ranks = self._arrays["_origin"]
+        ranges = []
+        for rank, name in enumerate(self._origins):
+            if query in name:
+                start = bisect_left(ranks, rank, lo, hi)
+                end = bisect_right(ranks, rank, start, hi)
+                if start < end:
+                    ranges.append((start, end))
+        return ranges
+
+    def trips(self, date: Date, origin: Optional[str] = None, destination: Optional[str] = None,
+              start_minute: int = 0, end_minute: int = 24 * 60 - 1) -> List[Dict]:
+        """Trajets d'une date, filtrés comme filter_stations + filter_trains_by_time, dans l'ordre de l'API."""
+        bounds = self._days.get(date.isoformat())
+        if bounds is None:
+            return []
+        departures = self._arrays["_departure"]
+        order = self._arrays["_order"]
+        wanted_destinations = None
+        if destination:
+            query = destination.upper()
+            wanted_destinations = {
+                code for code, name in enumerate(self._values["destination"]) if name and query in name
+            }
+        destination_codes = self._arrays.get("destination")
+
+        windows = minute_windows(start_minute, end_minute)
+        matches = []
+        for lo, hi in self._origin_ranges(bounds[0], bounds[1], origin):
+            for start, end in windows:
+                if origin:
+                    # Plage d'une seule gare : heures de départ triées
+                    first = bisect_left(departures, start, lo, hi)
+                    last = bisect_right(departures, end, first, hi)
+                    candidates = range(first, last)
+                else:
+                    candidates = (i for i in range(lo, hi) if start <= departures[i] <= end)
+                for i in candidates:
+                    if wanted_destinations is None or destination_codes[i] in wanted_destinations:
+                        matches.append(i)
+        matches.sort(key=order.__getitem__)
+        columns = [(col, self._arrays[col], self._values[col]) for col in self.columns]
+        return [{col: values[codes[i]] for col, codes, values in columns} for i in matches]
+
+    def close(self) -> None:
+        """Libère les vues sur le tampon (requis avant de fermer une mémoire partagée)."""
+        for values in self._arrays.values():
+            values.release()
+        self._arrays.clear()
+        self._view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        elif isinstance(self._buffer, memoryview):
+            self._buffer.release()
+
+def find_snapshot(paths: Iterable[str]) -> Optional[CompactSnapshot]:
+    """Ouvre le premier instantané compact lisible parmi `paths`."""
+    for path in paths:
+        if path and os.path.exists(path):
+            try:
+                return CompactSnapshot.open(path)
+            except (OSError, ValueError):
+                continue
+    return None
+
+def _engine_records(days: int, start: Date) -> List[Dict]:
+    """Enregistrements des `days` prochains jours via le moteur (pandas, cache et client SNCF)."""
+    from tgvmax_engine import format_single_trips, get_day_frame
+    records = []
+    for i in range(days):
+        frame = get_day_frame(start + timedelta(days=i))
+        if not frame.empty:
+            records.extend(format_single_trips(frame))
+    return records
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Construit l'instantané compact TGV Max (déploiement serverless)")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--fixture", help="Réponse SNCF enregistrée ({\"results\": [...]}) au lieu de l'API")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api", "data", "tgvmax.snap"))
+    args = parser.parse_args()
+    if args.fixture:
+        with open(args.fixture, encoding="utf-8") as f:
+            records = json.load(f).get("results", [])
+    else:
+        records = _engine_records(args.days, Date.today())
+    header = build_snapshot(records, args.out)
+    print(f"{header['rows']} trajets sur {len(header['days'])} jours écrits dans {args.out} (version {header['version']})")
+
+if __name__ == "__main__":
+    main()
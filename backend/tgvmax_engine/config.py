@@ -0,0 +1,56 @@
+import os
+
+# API SNCF
+SNCF_API_URL = os.getenv("SNCF_API_URL", "https://ressources.data.sncf.com/api/explore/v2.1/catalog/datasets/tgvmax/records")
+API_LIMIT = int(os.getenv("API_LIMIT", 100))
+
+# Cache (cadence de rafraîchissement des données SNCF, en secondes)
+CACHE_TTL = int(os.getenv("CACHE_TTL", 3600))
+# Fraîcheur la plus stricte acceptée d'un appelant (max_staleness, secondes) : borne le nombre
+# de revalidations SNCF qu'un client peut imposer
+MIN_STALENESS = float(os.getenv("MIN_STALENESS", 30))
+# Instantané disque partagé entre processus (API, Streamlit) ; vide pour le désactiver
+SNAPSHOT_DIR = os.getenv("TGVMAX_SNAPSHOT_DIR", "/tmp/tgvmax-snapshot")
+# Instantané compact en lecture seule du mode serverless (api/index.py), prioritaire sur celui
+# livré avec le déploiement (api/data/tgvmax.snap)
+COMPACT_SNAPSHOT_PATH = os.getenv("TGVMAX_COMPACT_SNAPSHOT", "/tmp/tgvmax-compact.snap")
+# Jeu de données compact partagé entre les workers d'une machine (un seul rafraîchisseur élu) ;
+# vide pour que chaque processus garde ses propres données. /dev/shm évite toute écriture disque.
+SHARED_DATASET_PATH = os.getenv("TGVMAX_SHARED_DATASET", "")
+SHARED_CHECK_INTERVAL = float(os.getenv("SHARED_CHECK_INTERVAL", 1))  # secondes entre deux vérifications du fichier
+SHARED_ELECTION_INTERVAL = float(os.getenv("SHARED_ELECTION_INTERVAL", 10))  # secondes entre deux tentatives d'élection
+# Historique des disponibilités (différences entre versions des données) ; vide pour le désactiver
+HISTORY_DIR = os.getenv("TGVMAX_HISTORY_DIR", "/tmp/tgvmax-history")
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", 90))
+HISTORY_CHECKPOINT_EVERY = int(os.getenv("HISTORY_CHECKPOINT_EVERY", 24))  # observations entre deux états complets
+# Nombre de journées gardées en mémoire sous forme de DataFrame
+FRAME_CACHE_SIZE = int(os.getenv("FRAME_CACHE_SIZE", 64))
+
+# Nombre de résultats journaliers (date, origine, destination) mémoïsés, partagés entre requêtes
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 512))
+
+# Lignes au plus par lot d'un export en flux (morceau CSV ou row group Parquet)
+EXPORT_ROW_GROUP_SIZE = int(os.getenv("EXPORT_ROW_GROUP_SIZE", 50000))
+
+# Moteur des filtres : pandas (défaut), arrow (pyarrow), polars ou compact (jeu de données partagé,
+# défaut quand il est activé)
+QUERY_ENGINE = os.getenv("TGVMAX_QUERY_ENGINE", "compact" if SHARED_DATASET_PATH else "pandas")
+# Pool de processus des recherches lourdes (plusieurs jours, aller-retour) ; 0 = exécution sur place
+POOL_WORKERS = int(os.getenv("POOL_WORKERS", 0))
+POOL_JOB_TIMEOUT = float(os.getenv("POOL_JOB_TIMEOUT", 20))  # secondes, au-delà les jours restants sont annulés
+
+# Journalisation (DEBUG active le détail des requêtes, coûteux en production)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Client SNCF : délais, reprises, disjoncteur et quota (partagé entre workers)
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 3.05))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", 10))
+UPSTREAM_DEADLINE = float(os.getenv("UPSTREAM_DEADLINE", 15))  # budget total d'un appel, reprises comprises
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", 3))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", 0.25))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", 4))
+UPSTREAM_BREAKER_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", 5))
+UPSTREAM_BREAKER_RESET = float(os.getenv("UPSTREAM_BREAKER_RESET", 30))
+UPSTREAM_RATE = float(os.getenv("UPSTREAM_RATE", 5))  # requêtes par seconde
+UPSTREAM_BURST = float(os.getenv("UPSTREAM_BURST", 10))
+UPSTREAM_BUCKET_PATH = os.getenv("UPSTREAM_BUCKET_PATH", "/tmp/tgvmax-upstream-bucket")
@@ -0,0 +1,81 @@
+"""Tableau des départs : les N prochains trains TGV Max d'une gare après une date et une heure.
+
+Chaque journée est indexée une fois par version des données : pour chaque gare de départ,
+un tableau des minutes de départ trié et les trajets correspondants. Une requête se résout
+par dichotomie dans les tableaux des gares correspondantes, puis fusion jour après jour.
+"""
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date as Date, datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+from tgvmax_engine.compact import NO_TIME, _minutes
+from tgvmax_engine.config import FRAME_CACHE_SIZE
+from tgvmax_engine.metrics import stage
+
+# Par gare : (minutes de départ triées, trajets dans le même ordre)
+DayBoard = Dict[str, Tuple[array, List[Dict]]]
+
+_boards: "OrderedDict[Tuple[str, str], DayBoard]" = OrderedDict()
+_boards_lock = threading.Lock()
+
+def day_board(day: Date) -> DayBoard:
+    """Index des départs d'une journée par gare, construit une fois par version des données."""
+    from tgvmax_engine.store import get_dataset_info, get_day_records
+    key = (day.isoformat(), get_dataset_info(day).version)
+    with _boards_lock:
+        board = _boards.get(key)
+        if board is not None:
+            _boards.move_to_end(key)
+            return board
+    version, records = get_day_records(day)
+    with stage("departure_index"):
+        by_station: Dict[str, List[Tuple[int, int, Dict]]] = {}
+        for position, record in enumerate(records):
+            minute = _minutes(record.get("heure_depart"))
+            if minute != NO_TIME and record.get("origine"):
+                by_station.setdefault(record["origine"], []).append((minute, position, record))
+        board = {}
+        # Gares insérées par ordre alphabétique : ordre stable pour départager les ex æquo
+        for station in sorted(by_station):
+            rows = by_station[station]
+            rows.sort(key=lambda row: row[:2])
+            board[station] = (array("H", (row[0] for row in rows)), [row[2] for row in rows])
+    with _boards_lock:
+        _boards[(day.isoformat(), version)] = board
+        while len(_boards) > FRAME_CACHE_SIZE:
+            _boards.popitem(last=False)
+    return board
+
+def _stream(rank: int, minutes: array, trips: List[Dict], first: int) -> Iterator[Tuple[int, int, int, Dict]]:
+    for i in range(first, len(trips)):
+        yield minutes[i], rank, i, trips[i]
+
+def _day_departures(board: DayBoard, station: str, destination: Optional[str], after_minute: int) -> Iterator[Dict]:
+    """Départs de la journée à partir de `after_minute`, toutes gares correspondantes fusionnées."""
+    query = station.upper()
+    streams = []
+    for rank, (name, (minutes, trips)) in enumerate(board.items()):
+        if query in name:
+            streams.append(_stream(rank, minutes, trips, bisect_left(minutes, after_minute)))
+    for _, _, _, trip in heapq.merge(*streams):
+        if destination is None or destination in (trip.get("destination") or ""):
+            yield trip
+
+def next_departures(station: str, after: datetime, limit: int = 10, destination: Optional[str] = None,
+                    until: Optional[Date] = None) -> List[Dict]:
+    """Les `limit` prochains départs de `station` (recherche partielle) à partir de `after`, jusqu'à `until` inclus."""
+    destination = destination.upper() if destination else None
+    until = until or after.date()
+    departures: List[Dict] = []
+    day = after.date()
+    after_minute = after.hour * 60 + after.minute
+    while day <= until and len(departures) < limit:
+        board = day_board(day)
+        departures.extend(islice(_day_departures(board, station, destination, after_minute), limit - len(departures)))
+        day += timedelta(days=1)
+        after_minute = 0
+    return [dict(trip) for trip in departures]
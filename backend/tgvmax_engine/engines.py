@@ -0,0 +1,214 @@
+"""Moteurs de requête interchangeables : pandas (défaut), Arrow (pyarrow.dataset), Polars (lazy)
+ou compact (jeu de données partagé entre workers, tgvmax_engine.shared).
+
+Tous renvoient les mêmes trajets, dans le même ordre, que filter_stations + filter_trains_by_time
++ format_single_trips. Arrow et Polars filtrent en une passe multi-thread sur des tables
+colonnes construites une fois par version des données, sans copie intermédiaire du DataFrame ;
+la correspondance est vérifiée par bench/bench_engines.py.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date as Date, time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from tgvmax_engine.compact import NO_TIME, _minutes, minute_windows
+from tgvmax_engine.config import FRAME_CACHE_SIZE, QUERY_ENGINE
+from tgvmax_engine.logs import get_logger
+from tgvmax_engine.metrics import stage
+
+logger = get_logger("tgvmax.engines")
+
+ENGINES = ("pandas", "arrow", "polars", "compact")
+STATIONS = ("origine", "destination")
+
+class DayQuery(NamedTuple):
+    """Recherche sur une journée : gares (recherche partielle) et créneau de départ (None = sans filtre)."""
+    date: Date
+    origin: Optional[str] = None
+    destination: Optional[str] = None
+    start: Optional[time] = None
+    end: Optional[time] = None
+
+    def minutes(self) -> Tuple[int, int]:
+        """Créneau en minutes depuis minuit ; sans créneau, les heures invalides sont conservées."""
+        if self.start is None and self.end is None:
+            return 0, NO_TIME
+        start = self.start or time(0, 0)
+        end = self.end or time(23, 59)
+        return start.hour * 60 + start.minute, end.hour * 60 + end.minute
+
+class PandasEngine:
+    """Filtres pandas d'origine, sur les DataFrames partagés de store.get_day_frame."""
+    name = "pandas"
+
+    def search(self, queries: List[DayQuery]) -> List[List[Dict]]:
+        from tgvmax_engine.filters import filter_stations, filter_trains_by_time, format_single_trips
+        from tgvmax_engine.store import get_day_frame
+        results = []
+        for query in queries:
+            trains_df = get_day_frame(query.date)
+            with stage("filter"):
+                trains_df = filter_stations(trains_df, query.origin, query.destination)
+                if query.start is not None or query.end is not None:
+                    trains_df = filter_trains_by_time(trains_df, query.start or time(0, 0), query.end or time(23, 59))
+            with stage("serialize"):
+                results.append(format_single_trips(trains_df) if not trains_df.empty else [])
+        return results
+
+class ColumnarEngine:
+    """Base des moteurs colonnes : une table Arrow par (date, version), gares encodées par dictionnaire."""
+    name = ""
+
+    def __init__(self):
+        self._tables: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _build(self, records: List[Dict]):
+        import pyarrow as pa
+        columns: List[str] = []
+        for record in records:
+            for key in record:
+                if key not in columns:
+                    columns.append(key)
+        arrays = {}
+        for col in columns:
+            array = pa.array([r.get(col) for r in records])
+            arrays[col] = array.dictionary_encode() if col in STATIONS else array
+        # Minute de départ précalculée : le filtre horaire devient une comparaison d'entiers
+        arrays["_minute"] = pa.array([_minutes(r.get("heure_depart")) for r in records], type=pa.uint16())
+        stations = {col: sorted(set(v for v in arrays[col].dictionary.to_pylist() if v)) for col in STATIONS if col in arrays}
+        return pa.table(arrays), stations
+
+    def day(self, day: Date) -> tuple:
+        """(table, gares) de la journée, construites une fois par version des données."""
+        from tgvmax_engine.store import get_dataset_info, get_day_records
+        key = (day.isoformat(), get_dataset_info(day).version)
+        with self._lock:
+            cached = self._tables.get(key)
+            if cached is not None:
+                self._tables.move_to_end(key)
+                return cached
+        version, records = get_day_records(day)
+        key = (day.isoformat(), version)
+        with stage("columnar_build"):
+            cached = self._convert(*self._build(records))
+        with self._lock:
+            self._tables[key] = cached
+            while len(self._tables) > FRAME_CACHE_SIZE:
+                self._tables.popitem(last=False)
+        return cached
+
+    def _convert(self, table, stations) -> tuple:
+        return table, stations
+
+    @staticmethod
+    def _matching(stations: List[Dict[str, List[str]]], column: str, query: str) -> List[str]:
+        """Noms de gares du dictionnaire correspondant à `query` (même sémantique que station_mask)."""
+        pattern = query.upper()
+        return sorted({name for s in stations for name in s.get(column, []) if pattern in name})
+
+    def search(self, queries: List[DayQuery]) -> List[List[Dict]]:
+        # Les journées partageant les mêmes critères sont filtrées en une seule passe
+        groups: "OrderedDict[tuple, List[int]]" = OrderedDict()
+        for i, query in enumerate(queries):
+            groups.setdefault((query.origin, query.destination, query.minutes()), []).append(i)
+        results: List[List[Dict]] = [[] for _ in queries]
+        for (origin, destination, (start, end)), indexes in groups.items():
+            days = [self.day(queries[i].date) for i in indexes]
+            if not any(self._rows(table) for table, _ in days):
+                continue
+            stations = [s for _, s in days]
+            origins = self._matching(stations, "origine", origin) if origin else None
+            destinations = self._matching(stations, "destination", destination) if destination else None
+            with stage("filter"):
+                rows = self._filter([table for table, _ in days], origins, destinations, start, end)
+            with stage("serialize"):
+                by_date: Dict[str, List[Dict]] = {}
+                for row in rows:
+                    del row["_minute"]
+                    by_date.setdefault(row.get("date"), []).append(row)
+            for i in indexes:
+                results[i] = by_date.get(queries[i].date.isoformat(), [])
+        return results
+
+class ArrowEngine(ColumnarEngine):
+    """Filtre pyarrow.dataset : prédicats poussés dans le scan multi-thread des tables."""
+    name = "arrow"
+
+    @staticmethod
+    def _rows(table) -> int:
+        return table.num_rows
+
+    def _filter(self, tables, origins, destinations, start, end) -> List[Dict]:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        expression = None
+        for low, high in minute_windows(start, end):
+            window = (ds.field("_minute") >= low) & (ds.field("_minute") <= high)
+            expression = window if expression is None else expression | window
+        if origins is not None:
+            expression &= ds.field("origine").isin(pa.array(origins, pa.string()))
+        if destinations is not None:
+            expression &= ds.field("destination").isin(pa.array(destinations, pa.string()))
+        table = pa.concat_tables([t for t in tables if t.num_rows], promote_options="permissive")
+        return ds.dataset(table).to_table(filter=expression, use_threads=True).to_pylist()
+
+class PolarsEngine(ColumnarEngine):
+    """Requête Polars lazy (prédicats poussés, exécution multi-cœur) sur les tables Arrow sans copie."""
+    name = "polars"
+
+    def _convert(self, table, stations) -> tuple:
+        import polars as pl
+        return pl.from_arrow(table), stations
+
+    @staticmethod
+    def _rows(frame) -> int:
+        return frame.height
+
+    def _filter(self, frames, origins, destinations, start, end) -> List[Dict]:
+        import polars as pl
+        predicate = pl.any_horizontal([pl.col("_minute").is_between(low, high) for low, high in minute_windows(start, end)])
+        if origins is not None:
+            predicate &= pl.col("origine").cast(pl.String).is_in(origins)
+        if destinations is not None:
+            predicate &= pl.col("destination").cast(pl.String).is_in(destinations)
+        lazy = pl.concat([f.lazy() for f in frames if f.height], how="diagonal_relaxed")
+        return lazy.filter(predicate).collect().to_dicts()
+
+class CompactEngine:
+    """Recherche directe sur le fichier compact partagé et mappé en mémoire : aucune table par worker."""
+    name = "compact"
+
+    def search(self, queries: List[DayQuery]) -> List[List[Dict]]:
+        from tgvmax_engine.shared import shared_dataset
+        shared = shared_dataset()
+        if shared is None:
+            # Rien de publié (démarrage, partage désactivé) : données propres au processus
+            return get_engine("pandas").search(queries)
+        with stage("filter"):
+            return [shared.snapshot.trips(q.date, q.origin, q.destination, *q.minutes()) for q in queries]
+
+_ENGINE_CLASSES = {"pandas": PandasEngine, "arrow": ArrowEngine, "polars": PolarsEngine, "compact": CompactEngine}
+_engines: Dict[str, object] = {}
+_engines_lock = threading.Lock()
+
+def _available(name: str) -> bool:
+    module = {"arrow": "pyarrow", "polars": "polars"}.get(name)
+    if module is None:
+        return name in _ENGINE_CLASSES
+    try:
+        __import__(module)
+        return name != "polars" or _available("arrow")
+    except ImportError:
+        return False
+
+def get_engine(name: Optional[str] = None):
+    """Moteur `name` (QUERY_ENGINE par défaut) ; pandas si le moteur demandé n'est pas installé."""
+    name = (name or QUERY_ENGINE).lower()
+    with _engines_lock:
+        if name not in _engines:
+            if not _available(name):
+                logger.warning("Moteur de requête %r indisponible, utilisation de pandas", name)
+                _engines[name] = _engines.get("pandas") or PandasEngine()
+            else:
+                _engines[name] = _ENGINE_CLASSES[name]()
+        return _engines[name]
@@ -0,0 +1,120 @@
+"""Export en flux des trajets d'une période (CSV ou Parquet), à mémoire constante.
+
+Les journées sont lues une à une depuis les résultats mémoïsés par (date, gares)
+(tgvmax_engine.memo), dont les minutes de départ et les durées sont déjà des colonnes
+entières. Chaque journée donne un ou plusieurs lots de colonnes (au plus EXPORT_ROW_GROUP_SIZE
+lignes), encodés et émis aussitôt. En CSV, chaque lot devient un morceau de texte. En Parquet,
+chaque lot devient un row group, et les octets écrits sont rendus au fil de l'eau. Quelle que
+soit la taille de l'export, seuls une journée et le lot en cours sont en mémoire.
+"""
+import csv
+import io
+from datetime import date as Date, time, timedelta
+from typing import Dict, Iterator, List, Optional
+from tgvmax_engine.compact import NO_TIME, minute_windows
+from tgvmax_engine.config import EXPORT_ROW_GROUP_SIZE
+from tgvmax_engine.engines import DayQuery
+from tgvmax_engine.metrics import stage
+from tgvmax_engine.pool import run_results
+
+# Schéma fixe : l'en-tête CSV et le schéma Parquet sont connus avant la première journée
+EXPORT_COLUMNS = (
+    "date", "train_no", "origine", "origine_iata", "destination", "destination_iata",
+    "heure_depart", "heure_arrivee", "duree_minutes", "axe", "entity", "od_happy_card",
+)
+EXPORT_FORMATS = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+
+def _text(value) -> Optional[str]:
+    # NaN (champ absent d'un DataFrame) et None : valeur manquante
+    return None if value is None or value != value else str(value)
+
+def export_batches(start_date: Date, days: int, origin: Optional[str] = None, destination: Optional[str] = None,
+                   start: Optional[time] = None, end: Optional[time] = None,
+                   max_duration: Optional[int] = None) -> Iterator[Dict[str, list]]:
+    """Lots de colonnes (EXPORT_COLUMNS) des trajets de `days` jours, journée par journée."""
+    for i in range(days):
+        query = DayQuery(start_date + timedelta(days=i), origin, destination, start, end)
+        # Une journée à la fois (pool de processus s'il est activé, mémoïsée ensuite)
+        day = run_results([query])[0]
+        positions = list(day.positions(minute_windows(*query.minutes()), max_duration))
+        for lo in range(0, len(positions), EXPORT_ROW_GROUP_SIZE):
+            chunk = positions[lo:lo + EXPORT_ROW_GROUP_SIZE]
+            trips = [day.trips[p] for p in chunk]
+            batch = {name: [_text(trip.get(name)) for trip in trips] for name in EXPORT_COLUMNS if name != "duree_minutes"}
+            batch["duree_minutes"] = [None if day.durations[p] == NO_TIME else day.durations[p] for p in chunk]
+            yield batch
+
+def frame_batches(df) -> Iterator[Dict[str, list]]:
+    """Lots de colonnes (EXPORT_COLUMNS) d'un DataFrame de trajets déjà chargé (durée en minutes dans duree_minutes)."""
+    for lo in range(0, len(df), EXPORT_ROW_GROUP_SIZE):
+        chunk = df.iloc[lo:lo + EXPORT_ROW_GROUP_SIZE]
+        batch = {name: [_text(v) for v in chunk[name]] if name in chunk else [None] * len(chunk)
+                 for name in EXPORT_COLUMNS if name != "duree_minutes"}
+        # Entiers nullables (UInt16) : pd.NA pour une durée inconnue
+        batch["duree_minutes"] = [m if isinstance(m, int) else None for m in chunk["duree_minutes"].tolist()]
+        yield batch
+
+def stream_csv(batches: Iterator[Dict[str, list]]) -> Iterator[bytes]:
+    """En-tête puis un morceau de CSV (UTF-8) par lot."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        with stage("export_encode"):
+            writer.writerows(zip(*(batch[name] for name in EXPORT_COLUMNS)))
+            chunk = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        yield chunk
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+class _Drain(io.RawIOBase):
+    """Fichier en écriture seule dont les octets sont repris au fur et à mesure (drain)."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+def stream_parquet(batches: Iterator[Dict[str, list]]) -> Iterator[bytes]:
+    """Fichier Parquet émis row group par row group (nécessite pyarrow)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([
+        (name, pa.uint16() if name == "duree_minutes" else pa.string()) for name in EXPORT_COLUMNS
+    ])
+    sink = _Drain()
+    # Gares et dates très répétées : encodage par dictionnaire (défaut de pyarrow)
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in batches:
+            with stage("export_encode"):
+                writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+def export_frame(fmt: str, df) -> Iterator[bytes]:
+    """Octets de l'export `fmt` des trajets du DataFrame `df`, sans nouvelle recherche."""
+    batches = frame_batches(df)
+    return stream_parquet(batches) if fmt == "parquet" else stream_csv(batches)
+
+def export_trips(fmt: str, start_date: Date, days: int, origin: Optional[str] = None,
+                 destination: Optional[str] = None, start: Optional[time] = None, end: Optional[time] = None,
+                 max_duration: Optional[int] = None) -> Iterator[bytes]:
+    """Octets de l'export `fmt` (csv ou parquet), produits au fil des journées."""
+    batches = export_batches(start_date, days, origin, destination, start, end, max_duration)
+    return stream_parquet(batches) if fmt == "parquet" else stream_csv(batches)
@@ -0,0 +1,66 @@
+from datetime import time
+from typing import Dict, List, Optional
+import pandas as pd
+from tgvmax_engine.index import station_mask
+
+def minutes_of_day(series: pd.Series) -> pd.Series:
+    """Convertit des heures 'HH:MM' en minutes depuis minuit (NaN si invalide)."""
+    hours = pd.to_numeric(series.str[:2], errors="coerce")
+    minutes = pd.to_numeric(series.str[3:5], errors="coerce")
+    return hours * 60 + minutes
+
+def filter_stations(df: pd.DataFrame, origin: Optional[str] = None, destination: Optional[str] = None) -> pd.DataFrame:
+    """Filtre les trains par gare de départ et/ou d'arrivée (recherche partielle, insensible à la casse)."""
+    if df.empty:
+        return df
+    if origin:
+        df = df[station_mask(df['origine'], origin)]
+    if destination:
+        df = df[station_mask(df['destination'], destination)]
+    return df
+
+def filter_trains_by_time(df: pd.DataFrame, start: time, end: time) -> pd.DataFrame:
+    """Filtre les trains selon un créneau horaire (un créneau 22:00-02:00 passe minuit)."""
+    if df.empty:
+        return df
+    departures = minutes_of_day(df["heure_depart"].astype(str))
+    after_start = departures >= start.hour * 60 + start.minute
+    before_end = departures <= end.hour * 60 + end.minute
+    mask = (after_start & before_end) if start <= end else (after_start | before_end)
+    return df[mask]
+
+def format_single_trips(df: pd.DataFrame) -> List[Dict]:
+    """Formate les résultats pour l'affichage ou l'API."""
+    return df.to_dict(orient="records")
+
+def trips_frame(trips: List[Dict]) -> pd.DataFrame:
+    """DataFrame des trajets avec leur durée au format '2h15', pour l'affichage."""
+    df = pd.DataFrame(trips)
+    if df.empty:
+        return df
+    departures = minutes_of_day(df["heure_depart"].astype(str))
+    arrivals = minutes_of_day(df["heure_arrivee"].astype(str))
+    # Les trains arrivant après minuit ont une heure d'arrivée inférieure au départ
+    durations = (arrivals - departures) % (24 * 60)
+    df["duree"] = [
+        f"{int(m) // 60}h{int(m) % 60:02d}" if pd.notna(m) else "-" for m in durations
+    ]
+    return df
+
+def calculate_duration(row) -> str:
+    """Calcule la durée d'un trajet."""
+    try:
+        dep = pd.to_datetime(row["heure_depart"])
+        arr = pd.to_datetime(row["heure_arrivee"])
+        duration = arr - dep
+        return str(duration)
+    except Exception:
+        return "-"
+
+def handle_error(func):
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            return {"error": str(e)}
+    return wrapper
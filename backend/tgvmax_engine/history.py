@@ -0,0 +1,290 @@
+"""Historique des disponibilités : ce que l'API SNCF annonçait pour chaque date de voyage, au fil du temps.
+
+Chaque nouvelle version des données est comparée à l'état précédent de chaque date de voyage ;
+seules les différences sont ajoutées, compressées, dans un journal partitionné :
+
+    HISTORY_DIR/travel=2025-07-01/fetch=2025-06-20.jsonl.gz   membres gzip ajoutés à la suite
+    HISTORY_DIR/travel=2025-07-01/index.jsonl                  [instant, partition, position, type]
+
+Chaque partition de récupération commence par un point de reprise (état complet), suivi de
+différences et d'un nouveau point de reprise toutes les HISTORY_CHECKPOINT_EVERY observations.
+« État au temps T » part du dernier point de reprise indexé avant T et ne rejoue que les
+différences suivantes ; la rétention supprime des partitions entières.
+"""
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from bisect import bisect_right
+from datetime import date as Date, datetime, timedelta
+from time import time as timestamp
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from tgvmax_engine.config import HISTORY_CHECKPOINT_EVERY, HISTORY_DIR, HISTORY_RETENTION_DAYS
+from tgvmax_engine.logs import get_logger
+from tgvmax_engine.metrics import stage
+
+try:
+    import fcntl
+except ImportError:  # Windows : écritures sérialisées au sein du processus seulement
+    fcntl = None
+
+logger = get_logger("tgvmax.history")
+
+CHECKPOINT, DIFF = "c", "d"
+PRUNE_INTERVAL = 3600  # secondes entre deux passages de la rétention
+
+class IndexEntry(NamedTuple):
+    """Observation indexée : instant, partition de récupération, position du membre gzip, type."""
+    at: float
+    partition: str
+    offset: int
+    kind: str
+
+State = Dict[str, Dict]  # clé du train -> enregistrement SNCF
+
+_lock = threading.Lock()
+# État courant par date de voyage : (nombre d'entrées d'index couvertes, état)
+_states: Dict[str, Tuple[int, State]] = {}
+_last_prune = 0.0
+
+def _train_key(record: Dict) -> str:
+    return "|".join(str(record.get(k) or "") for k in ("train_no", "heure_depart", "origine", "destination"))
+
+def _travel_dir(travel: str) -> str:
+    return os.path.join(HISTORY_DIR, f"travel={travel}")
+
+def _read_index(travel: str) -> List[IndexEntry]:
+    path = os.path.join(_travel_dir(travel), "index.jsonl")
+    entries = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(IndexEntry(*json.loads(line)))
+                except (ValueError, TypeError):
+                    break  # ligne incomplète (écriture interrompue) : fin de l'index
+    except FileNotFoundError:
+        pass
+    return entries
+
+def _read_member(travel: str, entry: IndexEntry) -> Dict:
+    """Observation stockée à la position indexée (un membre gzip d'une ligne JSON)."""
+    with open(os.path.join(_travel_dir(travel), entry.partition), "rb") as f:
+        f.seek(entry.offset)
+        with gzip.GzipFile(fileobj=f) as member:
+            return json.loads(member.readline())
+
+def _append(travel: str, partition: str, at: float, kind: str, payload: Dict) -> IndexEntry:
+    directory = _travel_dir(travel)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, partition), "ab") as f:
+        offset = f.tell()
+        f.write(gzip.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n"))
+    entry = IndexEntry(at, partition, offset, kind)
+    # Index écrit après les données : une entrée indexée est toujours lisible
+    with open(os.path.join(directory, "index.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(list(entry)) + "\n")
+    return entry
+
+def _apply(state: State, observation: Dict) -> State:
+    if "trains" in observation:
+        return dict(observation["trains"])
+    state = dict(state)
+    for key in observation.get("removed", []):
+        state.pop(key, None)
+    state.update(observation.get("added", {}))
+    return state
+
+def _state_at(travel: str, entries: List[IndexEntry], position: int) -> State:
+    """État après l'observation `position` : dernier point de reprise, puis différences suivantes."""
+    if position < 0:
+        return {}
+    start = position
+    while start > 0 and entries[start].kind != CHECKPOINT:
+        start -= 1
+    state: State = {}
+    for entry in entries[start:position + 1]:
+        state = _apply(state, _read_member(travel, entry))
+    return state
+
+def _current_state(travel: str, entries: List[IndexEntry]) -> State:
+    cached = _states.get(travel)
+    if cached is not None and cached[0] == len(entries):
+        return cached[1]
+    # Un autre processus a écrit depuis (ou premier accès) : reconstruction depuis l'index
+    state = _state_at(travel, entries, len(entries) - 1)
+    _states[travel] = (len(entries), state)
+    return state
+
+class _FileLock:
+    """Verrou exclusif partagé entre processus (API, Streamlit) sur le répertoire d'historique."""
+
+    def __enter__(self):
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        self._fd = os.open(os.path.join(HISTORY_DIR, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+
+def _known_travel_dates() -> List[str]:
+    try:
+        return [name[len("travel="):] for name in os.listdir(HISTORY_DIR) if name.startswith("travel=")]
+    except FileNotFoundError:
+        return []
+
+def record_observation(records: List[Dict], fetched_at: float) -> int:
+    """Ajoute à l'historique les différences entre `records` et l'état connu de chaque date de voyage.
+
+    Retourne le nombre de dates de voyage modifiées. Les dates passées absentes de la réponse
+    ne sont pas marquées comme disparues.
+    """
+    if not HISTORY_DIR:
+        return 0
+    by_travel: Dict[str, State] = {}
+    for record in records:
+        if record.get("date"):
+            by_travel.setdefault(record["date"], {})[_train_key(record)] = record
+    fetch_day = datetime.fromtimestamp(fetched_at).date()
+    partition = f"fetch={fetch_day.isoformat()}.jsonl.gz"
+    changed = 0
+    with stage("history_append"), _lock, _FileLock():
+        travels = set(by_travel) | {t for t in _known_travel_dates() if t >= fetch_day.isoformat()}
+        for travel in sorted(travels):
+            entries = _read_index(travel)
+            previous = _current_state(travel, entries)
+            current = by_travel.get(travel, {})
+            added = {k: r for k, r in current.items() if previous.get(k) != r}
+            removed = [k for k in previous if k not in current]
+            if not added and not removed:
+                continue
+            since_checkpoint = next((i for i, e in enumerate(reversed(entries)) if e.kind == CHECKPOINT), len(entries))
+            if not entries or entries[-1].partition != partition or since_checkpoint >= HISTORY_CHECKPOINT_EVERY:
+                # Point de reprise : chaque partition se lit (et se supprime) indépendamment des autres
+                _append(travel, partition, fetched_at, CHECKPOINT, {"at": fetched_at, "trains": current})
+            else:
+                _append(travel, partition, fetched_at, DIFF, {"at": fetched_at, "added": added, "removed": removed})
+            _states[travel] = (len(entries) + 1, current)
+            changed += 1
+    if timestamp() - _last_prune > PRUNE_INTERVAL:
+        prune()
+    return changed
+
+# Versions en attente d'écriture, dans l'ordre de récupération : (records, fetched_at)
+_pending: "queue.Queue[Tuple[List[Dict], float]]" = queue.Queue()
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+def _write_loop() -> None:
+    while True:
+        records, fetched_at = _pending.get()
+        try:
+            record_observation(records, fetched_at)
+        except (OSError, ValueError) as e:
+            logger.warning("Historique des disponibilités non mis à jour : %s", e)
+        except Exception:
+            logger.exception("Historique des disponibilités non mis à jour")
+        finally:
+            _pending.task_done()
+
+def record_history(records: List[Dict], fetched_at: float) -> None:
+    """Confie une nouvelle version au thread d'écriture de l'historique.
+
+    La récupération des données n'attend ni le calcul des différences, ni le disque, ni le
+    verrou partagé avec les autres processus ; les erreurs d'écriture sont journalisées.
+    """
+    global _writer
+    if not HISTORY_DIR:
+        return
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_write_loop, name="tgvmax-history-writer", daemon=True)
+            _writer.start()
+    _pending.put((records, fetched_at))
+
+def flush() -> None:
+    """Attend que les versions confiées à record_history soient écrites (tests, arrêt du processus)."""
+    _pending.join()
+
+atexit.register(flush)
+
+def prune(today: Optional[Date] = None) -> int:
+    """Supprime les partitions plus anciennes que HISTORY_RETENTION_DAYS ; retourne le nombre de fichiers supprimés."""
+    global _last_prune
+    if not HISTORY_DIR:
+        return 0
+    _last_prune = timestamp()
+    limit = ((today or datetime.now().date()) - timedelta(days=HISTORY_RETENTION_DAYS)).isoformat()
+    removed = 0
+    with _lock, _FileLock():
+        for travel in _known_travel_dates():
+            directory = _travel_dir(travel)
+            if travel < limit:
+                removed += sum(1 for name in os.listdir(directory) if name.startswith("fetch="))
+                shutil.rmtree(directory, ignore_errors=True)
+                _states.pop(travel, None)
+                continue
+            expired = {name for name in os.listdir(directory) if name.startswith("fetch=") and name[6:16] < limit}
+            if not expired:
+                continue
+            kept = [e for e in _read_index(travel) if e.partition not in expired]
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(list(e)) + "\n" for e in kept)
+            os.replace(tmp, os.path.join(directory, "index.jsonl"))
+            for name in expired:
+                os.remove(os.path.join(directory, name))
+            removed += len(expired)
+            _states.pop(travel, None)
+    return removed
+
+def _matches(record: Dict, origin: Optional[str], destination: Optional[str]) -> bool:
+    return ((not origin or origin.upper() in (record.get("origine") or "").upper())
+            and (not destination or destination.upper() in (record.get("destination") or "").upper()))
+
+def _sorted_trips(trains: Iterator[Dict]) -> List[Dict]:
+    return sorted(trains, key=lambda r: (r.get("heure_depart") or "", r.get("train_no") or ""))
+
+def availability_as_of(travel: Date, as_of: float, origin: Optional[str] = None,
+                       destination: Optional[str] = None) -> List[Dict]:
+    """Trains annoncés pour la date de voyage `travel` à l'instant `as_of` (horodatage), filtrés par gares."""
+    entries = _read_index(travel.isoformat())
+    position = bisect_right([e.at for e in entries], as_of) - 1
+    state = _state_at(travel.isoformat(), entries, position)
+    return _sorted_trips(r for r in state.values() if _matches(r, origin, destination))
+
+def availability_changes(travel: Date, origin: Optional[str] = None, destination: Optional[str] = None,
+                         since: Optional[float] = None, until: Optional[float] = None) -> List[Dict]:
+    """Apparitions, disparitions et modifications de trains pour `travel`, entre `since` et `until`.
+
+    Chaque changement : {"observed_at", "change" (appeared / vanished / changed), "train"}.
+    """
+    key = travel.isoformat()
+    entries = _read_index(key)
+    times = [e.at for e in entries]
+    # La première observation conservée sert d'état initial : elle ne compte pas comme apparition
+    first = max(1, bisect_right(times, since) if since is not None else 0)
+    last = bisect_right(times, until) if until is not None else len(entries)
+    state = _state_at(key, entries, first - 1)
+    changes = []
+    for entry in entries[first:last]:
+        new_state = _apply(state, _read_member(key, entry))
+        observed = datetime.fromtimestamp(entry.at).isoformat(timespec="seconds")
+        for train_key in sorted(set(state) | set(new_state)):
+            before, after = state.get(train_key), new_state.get(train_key)
+            if before == after:
+                continue
+            change = "appeared" if before is None else "vanished" if after is None else "changed"
+            train = after or before
+            if _matches(train, origin, destination):
+                changes.append({"observed_at": observed, "change": change, "train": train})
+        state = new_state
+    return changes
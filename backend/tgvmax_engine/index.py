@@ -0,0 +1,21 @@
+import pandas as pd
+
+STATION_COLUMNS = ("origine", "destination")
+
+def index_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Indexe les colonnes de gares : dictionnaire de gares (catégories) et codes entiers par train."""
+    for column in STATION_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+def station_mask(series: pd.Series, query: str) -> pd.Series:
+    """Trains dont la gare correspond à `query` (même sémantique que str.contains sur le nom en majuscules).
+
+    Sur une colonne indexée, la recherche porte sur le dictionnaire des gares et non sur chaque train.
+    """
+    pattern = query.upper()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        return series.isin(categories[categories.str.contains(pattern, na=False)])
+    return series.str.contains(pattern, na=False)
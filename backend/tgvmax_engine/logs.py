@@ -0,0 +1,28 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+from tgvmax_engine.config import LOG_LEVEL
+
+_listener = None
+
+def get_logger(name: str = "tgvmax") -> logging.Logger:
+    """Logger de l'application, configuré au premier appel."""
+    setup_logging()
+    return logging.getLogger(name)
+
+def setup_logging() -> None:
+    """Journalisation asynchrone : les handlers écrivent depuis un thread dédié, hors du chemin des requêtes."""
+    global _listener
+    if _listener is not None:
+        return
+    root = logging.getLogger("tgvmax")
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    records = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    atexit.register(_listener.stop)
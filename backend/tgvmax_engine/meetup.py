@@ -0,0 +1,97 @@
+"""Point de rencontre : destinations atteignables le même jour depuis plusieurs villes.
+
+Pour chaque date, les trajets de chaque origine viennent des journées mémoïsées par
+(date, gare) (tgvmax_engine.memo) : les destinations communes sont l'intersection des
+ensembles de destinations de chaque origine. Pour chacune, le meilleur rendez-vous est
+cherché par une jointure vectorielle sur les heures d'arrivée triées : pour chaque heure
+candidate, chaque origine prend sa dernière arrivée au plus tard à cette heure
+(searchsorted), et l'écart entre la première et la dernière arrivée est minimisé.
+Les retours sont les trains de la destination vers chaque origine partant après le rendez-vous ;
+les destinations d'où chacun peut rentrer sont classées en premier.
+"""
+from datetime import date as Date, timedelta
+from typing import Dict, List, Optional
+import numpy as np
+from tgvmax_engine.compact import minute_windows
+from tgvmax_engine.engines import DayQuery
+from tgvmax_engine.memo import DayResult, Windows
+from tgvmax_engine.pool import run_results
+from tgvmax_engine.roundtrip import MINUTES_PER_DAY, _Leg
+
+def _clock(minutes: int) -> str:
+    minutes %= MINUTES_PER_DAY
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def _best_meeting(arrivals: List[np.ndarray]):
+    """(écart, heure du rendez-vous, indice choisi par origine) minimisant l'écart des arrivées triées."""
+    candidates = np.unique(np.concatenate(arrivals))
+    earliest = candidates.copy()
+    chosen = []
+    for times in arrivals:
+        # Dernière arrivée de cette origine au plus tard à l'heure candidate
+        index = np.searchsorted(times, candidates, "right") - 1
+        chosen.append(index)
+        earliest = np.minimum(earliest, np.where(index >= 0, times[np.maximum(index, 0)], -1))
+    spread = np.where(earliest >= 0, candidates - earliest, np.iinfo(np.int64).max)
+    best = int(np.argmin(spread))
+    return int(spread[best]), int(candidates[best]), [int(index[best]) for index in chosen]
+
+def _meetups_on(origins: List[str], outbound: List[DayResult], inbound: List[DayResult], windows: Windows,
+                max_duration: Optional[int], stay_days: int, returns: int, limit: int) -> List[Dict]:
+    legs = [_Leg(day, windows, max_duration, 0, "destination") for day in outbound]
+    common = set.intersection(*(set(leg.stations) for leg in legs)) - {""}
+    backs = [_Leg(day, minute_windows(0, MINUTES_PER_DAY - 1), max_duration, stay_days, "origine") for day in inbound]
+    meetups = []
+    for destination in common:
+        # Par origine : trajets vers la destination triés par (arrivée, départ)
+        rows = []
+        for leg in legs:
+            index = np.flatnonzero(leg.stations == destination)
+            rows.append(index[np.lexsort((leg.departures[index], leg.arrivals[index]))])
+        spread, meeting, chosen = _best_meeting([leg.arrivals[index] for leg, index in zip(legs, rows)])
+        arrivals, options = {}, {}
+        for origin, leg, index, k, day, back, back_day in zip(origins, legs, rows, chosen, outbound, backs, inbound):
+            arrivals[origin] = dict(day.trips[leg.positions[index[k]]])
+            possible = np.flatnonzero((back.stations == destination) & (back.departures >= meeting))
+            possible = possible[np.argsort(back.departures[possible], kind="stable")]
+            options[origin] = {
+                "count": len(possible),
+                "last_departure": _clock(int(back.departures[possible[-1]])) if len(possible) else None,
+                # Les derniers retours possibles : le plus de temps passé ensemble
+                "trips": [dict(back_day.trips[back.positions[i]]) for i in possible[-returns:]] if returns else [],
+            }
+        stranded = any(not option["count"] for option in options.values())
+        meetups.append((stranded, spread, meeting, destination, {
+            "destination": destination,
+            "meeting_time": _clock(meeting),
+            "spread_minutes": spread,
+            "arrivals": arrivals,
+            "returns": options,
+        }))
+    # Retour possible pour tous d'abord, puis écart le plus faible, puis rendez-vous le plus tôt
+    meetups.sort(key=lambda m: m[:4])
+    return [m[4] for m in meetups[:limit]]
+
+def find_meetups(origins: List[str], dates: List[Date], start=None, end=None, max_duration: Optional[int] = None,
+                 stay_days: int = 0, returns: int = 3, limit: int = 10) -> List[Dict]:
+    """Rendez-vous possibles pour chaque date : destinations atteignables depuis toutes les `origins`.
+
+    `start` / `end` : créneau de départ des allers ; les retours partent `stay_days` jours après
+    (le même jour par défaut, après l'heure du rendez-vous). Par date : {date, count, meetups},
+    chaque rendez-vous donnant l'écart entre les arrivées, le train de chaque origine et ses retours.
+    """
+    batch = []
+    for day in dates:
+        batch.extend(DayQuery(day, origin, None, start, end) for origin in origins)
+        batch.extend(DayQuery(day + timedelta(days=stay_days), None, origin) for origin in origins)
+    # Toutes les journées (allers et retours) calculées en un lot : les absentes du cache seulement
+    days = run_results(batch)
+    width = len(origins)
+    response = []
+    for n, day in enumerate(dates):
+        outbound = days[2 * n * width:(2 * n + 1) * width]
+        inbound = days[(2 * n + 1) * width:(2 * n + 2) * width]
+        meetups = _meetups_on(origins, outbound, inbound, minute_windows(*batch[2 * n * width].minutes()),
+                              max_duration, stay_days, returns, limit)
+        response.append({"date": day.isoformat(), "count": len(meetups), "meetups": meetups})
+    return response
@@ -0,0 +1,161 @@
+"""Résultats partiels mémoïsés par (date, gares), assemblés à chaque requête.
+
+Une recherche est découpée en journées ; chaque journée est calculée sans créneau horaire
+et gardée par (date, version des données, origine, destination). Le créneau est appliqué
+ensuite sur les minutes précalculées : deux plages de dates qui se chevauchent, ou un
+aller simple et l'aller d'un aller-retour le même jour, ne calculent que les journées nouvelles.
+La durée maximale et le tri (top-k par tas) portent aussi sur des colonnes entières précalculées :
+seuls les trajets de la page demandée sont copiés.
+"""
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from tgvmax_engine.compact import NO_TIME, _minutes, minute_windows
+from tgvmax_engine.config import RESULT_CACHE_SIZE
+from tgvmax_engine.engines import DayQuery
+from tgvmax_engine.metrics import RESULT_CACHE_REQUESTS
+
+Windows = List[Tuple[int, int]]
+
+# Tris disponibles (préfixe "-" : ordre décroissant)
+SORT_KEYS = ("depart", "duree", "destination")
+
+def _duration(trip: Dict, departure: int) -> int:
+    """Durée en minutes (les arrivées après minuit passent au lendemain), NO_TIME si inconnue."""
+    arrival = _minutes(trip.get("heure_arrivee"))
+    if departure == NO_TIME or arrival == NO_TIME:
+        return NO_TIME
+    return (arrival - departure) % (24 * 60)
+
+class DayResult(NamedTuple):
+    """Trajets d'une journée pour un couple de gares, sans créneau horaire, dans l'ordre de l'API."""
+    minutes: array  # minute de départ de chaque trajet
+    sorted_minutes: array  # mêmes minutes triées : comptage par dichotomie
+    durations: array  # durée de chaque trajet, en minutes
+    trips: List[Dict]
+
+    @classmethod
+    def build(cls, trips: List[Dict]) -> "DayResult":
+        minutes = array("H", (_minutes(t.get("heure_depart")) for t in trips))
+        durations = array("H", (_duration(t, m) for t, m in zip(trips, minutes)))
+        return cls(minutes, array("H", sorted(minutes)), durations, trips)
+
+    def count(self, windows: Windows) -> int:
+        """Nombre de trajets dans le créneau, sans les parcourir."""
+        return sum(bisect_right(self.sorted_minutes, high) - bisect_left(self.sorted_minutes, low) for low, high in windows)
+
+    def select(self, windows: Windows) -> Iterator[Dict]:
+        """Trajets du créneau, dans l'ordre de l'API (non copiés)."""
+        for minute, trip in zip(self.minutes, self.trips):
+            if any(low <= minute <= high for low, high in windows):
+                yield trip
+
+    def positions(self, windows: Windows, max_duration: Optional[int] = None) -> Iterator[int]:
+        """Positions des trajets du créneau et d'au plus `max_duration` minutes, sur les seules colonnes entières."""
+        durations = self.durations
+        for position, minute in enumerate(self.minutes):
+            if any(low <= minute <= high for low, high in windows) and (max_duration is None or durations[position] <= max_duration):
+                yield position
+
+# (date, version, origine, destination) -> trajets de la journée
+_results: "OrderedDict[Tuple[str, str, Optional[str], Optional[str]], DayResult]" = OrderedDict()
+_results_lock = threading.Lock()
+
+def _station(value: Optional[str]) -> Optional[str]:
+    return value.upper() if value else None
+
+def _key(query: DayQuery) -> Tuple[str, str, Optional[str], Optional[str]]:
+    from tgvmax_engine.store import get_dataset_info
+    version = get_dataset_info(query.date).version
+    return query.date.isoformat(), version, _station(query.origin), _station(query.destination)
+
+def cached_results(queries: List[DayQuery], compute: Callable[[List[DayQuery]], List[List[Dict]]]) -> List[DayResult]:
+    """Journée mémoïsée de chaque requête ; seules les journées absentes du cache sont calculées, en un lot, par `compute`."""
+    keys = [_key(query) for query in queries]
+    entries: Dict[tuple, DayResult] = {}
+    missing: "OrderedDict[tuple, DayQuery]" = OrderedDict()
+    with _results_lock:
+        for key, query in zip(keys, queries):
+            entry = _results.get(key)
+            if entry is not None:
+                _results.move_to_end(key)
+                entries[key] = entry
+            elif key not in missing:
+                missing[key] = DayQuery(query.date, query.origin, query.destination)
+    RESULT_CACHE_REQUESTS.inc("hit", amount=len(queries) - len(missing))
+    if missing:
+        RESULT_CACHE_REQUESTS.inc("miss", amount=len(missing))
+        computed = compute(list(missing.values()))
+        with _results_lock:
+            for key, trips in zip(missing, computed):
+                entries[key] = _results[key] = DayResult.build(trips)
+            while len(_results) > RESULT_CACHE_SIZE:
+                _results.popitem(last=False)
+    return [entries[key] for key in keys]
+
+def cached_search(queries: List[DayQuery], compute: Callable[[List[DayQuery]], List[List[Dict]]]) -> List[List[Dict]]:
+    """Trajets de chaque requête, assemblés depuis les journées mémoïsées."""
+    results = cached_results(queries, compute)
+    # Copies : les appelants peuvent modifier les trajets renvoyés
+    return [[dict(t) for t in day.select(minute_windows(*q.minutes()))] for q, day in zip(queries, results)]
+
+def _sort_keys(sort: str, ordinal: int, day: DayResult, index: int, positions: Iterator[int]) -> Iterator[tuple]:
+    """Clés de tri (critère, date, minute, requête, position) ; la fin du tuple départage les ex æquo."""
+    minutes, durations, trips = day.minutes, day.durations, day.trips
+    for p in positions:
+        if sort == "duree":
+            yield durations[p], ordinal, minutes[p], index, p
+        elif sort == "destination":
+            yield trips[p].get("destination") or "", ordinal, minutes[p], index, p
+        else:
+            yield ordinal, minutes[p], index, p
+
+def cached_page(queries: List[DayQuery], compute: Callable[[List[DayQuery]], List[List[Dict]]],
+                offset: int = 0, limit: Optional[int] = None, max_duration: Optional[int] = None,
+                sort: Optional[str] = None, top: Optional[int] = None) -> Tuple[int, List[Tuple[int, Dict]]]:
+    """(total, [(indice de la requête, trajet)]) pour la page [offset, offset + limit) des requêtes mises bout à bout.
+
+    Sans tri, les trajets gardent l'ordre des requêtes puis de l'API ; `sort` (SORT_KEYS, "-" pour
+    décroissant) les ordonne globalement et `top` ne garde que les premiers. Le total vient des
+    comptages sur les colonnes entières : seuls les trajets de la page sont copiés.
+    """
+    results = cached_results(queries, compute)
+    windows = [minute_windows(*q.minutes()) for q in queries]
+    if max_duration is None:
+        counts = [day.count(w) for day, w in zip(results, windows)]
+    else:
+        counts = [sum(1 for _ in day.positions(w, max_duration)) for day, w in zip(results, windows)]
+    total = sum(counts) if top is None else min(sum(counts), top)
+    end = total if limit is None else min(offset + limit, total)
+    if offset >= end:
+        return total, []
+    if sort is None:
+        rows: List[Tuple[int, int]] = []
+        skip = offset
+        for i, (day, w, count) in enumerate(zip(results, windows, counts)):
+            if skip >= count:
+                # Journée entièrement avant la page : sautée sans la parcourir
+                skip -= count
+                continue
+            rows.extend((i, p) for p in islice(day.positions(w, max_duration), skip, skip + end - offset - len(rows)))
+            skip = 0
+            if len(rows) >= end - offset:
+                break
+    else:
+        descending, key = sort.startswith("-"), sort.lstrip("-")
+        candidates = (k for i, (q, day, w) in enumerate(zip(queries, results, windows))
+                      for k in _sort_keys(key, q.date.toordinal(), day, i, day.positions(w, max_duration)))
+        # Tas borné aux `end` premiers : tri partiel, en O(n log end)
+        best = heapq.nlargest(end, candidates) if descending else heapq.nsmallest(end, candidates)
+        rows = [k[-2:] for k in best[offset:end]]
+    # Copies : les appelants peuvent modifier les trajets renvoyés
+    return total, [(i, dict(results[i].trips[p])) for i, p in rows]
+
+def clear() -> None:
+    """Vide le cache des résultats."""
+    with _results_lock:
+        _results.clear()
@@ -0,0 +1,107 @@
+import contextvars
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, values)) + "}"
+
+class Counter:
+    """Compteur Prometheus avec labels."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+class Histogram:
+    """Histogramme Prometheus avec labels (buckets cumulés à l'export)."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names, self.buckets = name, help, labels, buckets
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            counts, total = self._values.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0])
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[labels][1] = total + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    bucket_labels = _labels(self.label_names + ("le",), labels + (le,))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+REGISTRY: List = []
+
+STAGE_DURATION = Histogram("tgvmax_stage_duration_seconds", "Durée des étapes de traitement", ("stage",))
+REQUEST_DURATION = Histogram("tgvmax_http_request_duration_seconds", "Durée des requêtes HTTP", ("handler", "status"))
+CACHE_REQUESTS = Counter("tgvmax_cache_requests_total", "Accès au cache des données SNCF", ("result",))
+UPSTREAM_REQUESTS = Counter("tgvmax_upstream_requests_total", "Requêtes vers l'API SNCF", ("status",))
+UPSTREAM_ERRORS = Counter("tgvmax_upstream_errors_total", "Erreurs de l'API SNCF", ("kind",))
+RESULT_CACHE_REQUESTS = Counter("tgvmax_result_cache_requests_total", "Journées servies par le cache des résultats", ("result",))
+ADMISSION_REQUESTS = Counter("tgvmax_admission_requests_total", "Décisions du contrôle d'admission de l'API", ("outcome",))
+POOL_TASKS = Counter("tgvmax_pool_tasks_total", "Recherches journalières confiées au pool de processus", ("outcome",))
+
+# Durées des étapes de la requête en cours (partagées avec le threadpool via le contexte)
+_spans: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("tgvmax_spans", default=None)
+
+def track_spans() -> Tuple[contextvars.Token, Dict[str, float]]:
+    """Commence à collecter les durées d'étapes pour le contexte courant."""
+    spans: Dict[str, float] = {}
+    return _spans.set(spans), spans
+
+def untrack_spans(token: contextvars.Token) -> None:
+    _spans.reset(token)
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Mesure la durée d'une étape (fetch, décodage, DataFrame, filtre, sérialisation)."""
+    began = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - began
+        STAGE_DURATION.observe(elapsed, name)
+        spans = _spans.get()
+        if spans is not None:
+            spans[name] = spans.get(name, 0.0) + elapsed
+
+def render_prometheus() -> str:
+    """Exporte toutes les métriques au format texte Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
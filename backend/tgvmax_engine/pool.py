@@ -0,0 +1,221 @@
+"""Pool de processus pour les recherches lourdes (plusieurs jours, aller-retour).
+
+Chaque journée est publiée une fois par version des données dans un segment de mémoire
+partagée, au format compact (tgvmax_engine.compact) : les workers s'y attachent sans copie
+ni pickling de DataFrame. Les segments sont construits et encodés par un seul thread de
+publication, hors des requêtes : quand une version des données arrive, les autres journées en
+cours d'usage sont republiées d'avance. Une recherche est découpée en tâches journalières ;
+passé le délai du job, les tâches encore en file sont annulées et `SearchTimeout` est levée.
+"""
+import atexit
+import contextvars
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date as Date
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+from tgvmax_engine.compact import CompactSnapshot, encode_snapshot
+from tgvmax_engine.config import FRAME_CACHE_SIZE, POOL_JOB_TIMEOUT, POOL_WORKERS
+from tgvmax_engine.engines import DayQuery, get_engine
+from tgvmax_engine.logs import get_logger
+from tgvmax_engine.memo import DayResult, cached_page, cached_results, cached_search
+from tgvmax_engine.metrics import POOL_TASKS, stage
+
+logger = get_logger("tgvmax.pool")
+
+class SearchTimeout(Exception):
+    """La recherche a dépassé POOL_JOB_TIMEOUT ; les journées non traitées ont été annulées."""
+
+# Segments de mémoire partagée publiés, par (date, version des données)
+_segments: "OrderedDict[Tuple[str, str], SharedMemory]" = OrderedDict()
+_segments_lock = threading.Lock()
+# Publications en cours ou en file, par (date, version des données)
+_publications: Dict[Tuple[str, str], Future] = {}
+_publish_queue: "queue.Queue[Optional[Tuple[Date, Tuple[str, str], Future, contextvars.Context]]]" = queue.Queue()
+_publisher: Optional[threading.Thread] = None
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _inline(query: DayQuery) -> List[Dict]:
+    """Recherche dans le processus courant (pool désactivé ou segment indisponible)."""
+    return get_engine().search([query])[0]
+
+def _attach(name: str) -> SharedMemory:
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 : le resource tracker est celui du parent, qui libère le segment
+        return SharedMemory(name=name)
+
+def _search_segment(name: str, size: int, query: DayQuery) -> List[Dict]:
+    """Tâche exécutée dans un worker : recherche sur le segment partagé d'une journée."""
+    shm = _attach(name)
+    snapshot = CompactSnapshot(shm.buf[:size])
+    try:
+        return snapshot.trips(query.date, query.origin, query.destination, *query.minutes())
+    finally:
+        snapshot.close()
+        shm.close()
+
+def _segment(day: Date) -> Future:
+    """Segment partagé de la journée (name, size), confié au thread de publication s'il n'existe pas encore.
+
+    Une publication est commune à toutes les requêtes qui attendent la même journée.
+    """
+    from tgvmax_engine.store import get_dataset_info
+    global _publisher
+    key = (day.isoformat(), get_dataset_info(day).version)
+    with _segments_lock:
+        shm = _segments.get(key)
+        if shm is not None:
+            _segments.move_to_end(key)
+            published = Future()
+            published.set_result((shm.name, shm.size))
+            return published
+        publication = _publications.get(key)
+        if publication is None:
+            publication = _publications[key] = Future()
+            # Contexte de la requête : même fraîcheur exigée pour construire la journée
+            _publish_queue.put((day, key, publication, contextvars.copy_context()))
+            if _publisher is None or not _publisher.is_alive():
+                _publisher = threading.Thread(target=_publish_loop, name="tgvmax-pool-publisher", daemon=True)
+                _publisher.start()
+    return publication
+
+def _publish_loop() -> None:
+    while True:
+        item = _publish_queue.get()
+        if item is None:
+            return
+        day, key, publication, context = item
+        try:
+            publication.set_result(context.run(_publish, day, key))
+        except Exception as e:
+            publication.set_exception(e)
+        finally:
+            with _segments_lock:
+                _publications.pop(key, None)
+        try:
+            context.run(_republish, key)
+        except Exception as e:
+            logger.warning("Republication anticipée interrompue : %s", e)
+
+def _publish(day: Date, key: Tuple[str, str]) -> Tuple[str, int]:
+    """Encode la journée dans un nouveau segment partagé (thread de publication)."""
+    from tgvmax_engine.filters import format_single_trips
+    from tgvmax_engine.store import get_day_frame
+    trains_df = get_day_frame(day)
+    with stage("pool_publish"):
+        _, content = encode_snapshot(format_single_trips(trains_df) if not trains_df.empty else [])
+        shm = SharedMemory(create=True, size=len(content))
+        shm.buf[:len(content)] = content
+    with _segments_lock:
+        previous = _segments.pop(key, None)
+        _segments[key] = shm
+        evicted = [previous] if previous is not None else []
+        while len(_segments) > FRAME_CACHE_SIZE:
+            evicted.append(_segments.popitem(last=False)[1])
+    for old in evicted:
+        old.close()
+        old.unlink()
+    return shm.name, shm.size
+
+def _republish(key: Tuple[str, str]) -> None:
+    """Nouvelle version publiée : les autres journées encore en cache sont republiées d'avance."""
+    with _segments_lock:
+        current = {day for day, version in _segments if version == key[1]}
+        days = {day for day, _ in _segments} - current - {day for day, _ in _publications}
+    for day in sorted(days):
+        _segment(Date.fromisoformat(day))
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn : workers légers (ni pandas ni client SNCF), sûrs dans un serveur multithread
+            _executor = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=get_context("spawn"))
+            logger.info("Pool de recherche démarré (%d processus)", POOL_WORKERS)
+        return _executor
+
+def _reset_executor() -> None:
+    """Abandonne un pool cassé (worker tué) ; le suivant est recréé à la demande."""
+    global _executor
+    with _executor_lock:
+        broken, _executor = _executor, None
+    if broken is not None:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+def run_searches(queries: List[DayQuery], timeout: Optional[float] = None) -> List[List[Dict]]:
+    """Exécute des recherches journalières, dans le pool si POOL_WORKERS > 0, et renvoie leurs trajets dans l'ordre.
+
+    Les journées déjà calculées (tgvmax_engine.memo) ne sont pas recherchées de nouveau.
+    """
+    return cached_search(queries, _compute(timeout))
+
+def run_page(queries: List[DayQuery], offset: int = 0, limit: Optional[int] = None, max_duration: Optional[int] = None,
+             sort: Optional[str] = None, top: Optional[int] = None,
+             timeout: Optional[float] = None) -> Tuple[int, List[Tuple[int, Dict]]]:
+    """Comme run_searches, mais seulement la page [offset, offset + limit) des trajets (voir memo.cached_page)."""
+    return cached_page(queries, _compute(timeout), offset, limit, max_duration, sort, top)
+
+def run_results(queries: List[DayQuery], timeout: Optional[float] = None) -> List[DayResult]:
+    """Journées mémoïsées des requêtes (sans créneau), les absentes étant calculées comme par run_searches."""
+    return cached_results(queries, _compute(timeout))
+
+def _compute(timeout: Optional[float]):
+    """Calcul des journées absentes du cache : sur place, ou dans le pool si POOL_WORKERS > 0."""
+    if POOL_WORKERS <= 0:
+        return get_engine().search
+    return lambda missing: _run_pool(missing, timeout)
+
+def _run_pool(queries: List[DayQuery], timeout: Optional[float]) -> List[List[Dict]]:
+    timeout = POOL_JOB_TIMEOUT if timeout is None else timeout
+    deadline = monotonic() + timeout
+    executor = _get_executor()
+    # Toutes les journées sont confiées au thread de publication d'un coup : les workers
+    # cherchent dans les premières pendant que les suivantes sont encodées
+    publications = [_segment(query.date) for query in queries]
+    futures = []
+    results = []
+    with stage("pool_wait"):
+        try:
+            for query, publication in zip(queries, publications):
+                name, size = publication.result(timeout=max(0.0, deadline - monotonic()))
+                futures.append(executor.submit(_search_segment, name, size, query))
+            for query, future in zip(queries, futures):
+                try:
+                    results.append(future.result(timeout=max(0.0, deadline - monotonic())))
+                    POOL_TASKS.inc("ok")
+                except FileNotFoundError:
+                    # Segment évincé entre la publication et l'exécution
+                    POOL_TASKS.inc("inline")
+                    results.append(_inline(query))
+                except BrokenProcessPool:
+                    logger.warning("Worker du pool de recherche arrêté, journée %s traitée sur place", query.date)
+                    _reset_executor()
+                    POOL_TASKS.inc("inline")
+                    results.append(_inline(query))
+        except FutureTimeout:
+            cancelled = sum(f.cancel() for f in futures)
+            POOL_TASKS.inc("cancelled", amount=cancelled)
+            POOL_TASKS.inc("timeout")
+            raise SearchTimeout(f"Recherche interrompue après {timeout:g} s ({cancelled} journée(s) annulée(s))")
+    return results
+
+@atexit.register
+def shutdown() -> None:
+    """Arrête le pool et libère les segments partagés."""
+    _reset_executor()
+    if _publisher is not None and _publisher.is_alive():
+        _publish_queue.put(None)
+        _publisher.join()
+    with _segments_lock:
+        for shm in _segments.values():
+            shm.close()
+            shm.unlink()
+        _segments.clear()
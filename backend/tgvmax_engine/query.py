@@ -0,0 +1,17 @@
+from datetime import date as Date, datetime, time
+from typing import Dict, List, Optional, Union
+from tgvmax_engine.engines import DayQuery, get_engine
+from tgvmax_engine.memo import cached_page
+
+def find_trains(date: Union[str, Date], origin: Optional[str] = None, destination: Optional[str] = None,
+                start: Optional[time] = None, end: Optional[time] = None, max_duration: Optional[int] = None,
+                sort: Optional[str] = None, top: Optional[int] = None) -> List[Dict]:
+    """Trains TGV Max d'une date (YYYY-MM-DD ou date), filtrés par gares, créneau et durée maximale (minutes).
+
+    `sort` : "depart", "duree" ou "destination" ("-" devant pour l'ordre décroissant) ; `top` garde les premiers.
+    """
+    if isinstance(date, str):
+        date = datetime.strptime(date, "%Y-%m-%d").date()
+    _, rows = cached_page([DayQuery(date, origin, destination, start, end)], get_engine().search,
+                          max_duration=max_duration, sort=sort, top=top)
+    return [trip for _, trip in rows]
@@ -0,0 +1,129 @@
+"""Aller-retours appariés : pour chaque destination, les meilleurs couples (aller, retour).
+
+Les deux jambes viennent des journées mémoïsées (tgvmax_engine.memo), dont les minutes de
+départ et les durées sont déjà des colonnes entières. Pour chaque destination, les retours sont
+triés par heure de départ et chaque aller y trouve par dichotomie (searchsorted) le premier
+retour qui part au moins `min_stay` minutes après son arrivée : ses retours possibles forment
+la fin de la liste à partir de ce point (l'heure d'arrivée maximale `latest_return` est déjà
+appliquée aux retours).
+
+Score d'un couple : temps passé sur place moins temps passé dans le train, en minutes. Il se
+décompose en (départ du retour - durée du retour) - (arrivée de l'aller + durée de l'aller) :
+les meilleurs couples d'un aller sont les meilleurs retours de sa fin de liste, calculés une
+fois pour toutes les fins de liste. Seuls `per_destination` candidats par aller sont notés, en
+mémoire O((allers + retours) × per_destination), et seuls les meilleurs sont copiés.
+"""
+from bisect import insort
+from typing import Dict, List, Optional
+import numpy as np
+from tgvmax_engine.compact import NO_TIME
+from tgvmax_engine.memo import DayResult, Windows
+
+MINUTES_PER_DAY = 24 * 60
+
+class _Leg:
+    """Trajets retenus d'une jambe : positions dans la journée, horaires absolus (minutes depuis le jour de l'aller), gare."""
+
+    def __init__(self, day: DayResult, windows: Windows, max_duration: Optional[int], day_offset: int, station: str):
+        positions = np.fromiter(day.positions(windows, max_duration), dtype=np.int64)
+        minutes = np.frombuffer(day.minutes, dtype=np.uint16).astype(np.int64)[positions]
+        durations = np.frombuffer(day.durations, dtype=np.uint16).astype(np.int64)[positions]
+        self.positions = positions
+        self.departures = minutes + day_offset * MINUTES_PER_DAY
+        self.durations = durations
+        self.arrivals = self.departures + durations
+        self.stations = np.array([day.trips[p].get(station) or "" for p in positions], dtype=object)
+        self.keep((minutes != NO_TIME) & (durations != NO_TIME))
+
+    def keep(self, mask: np.ndarray) -> None:
+        for name in ("positions", "departures", "durations", "arrivals", "stations"):
+            setattr(self, name, getattr(self, name)[mask])
+
+def _duration_label(minutes: int) -> str:
+    return f"{minutes // 60}h{minutes % 60:02d}"
+
+def _suffix_best(values: np.ndarray, k: int) -> np.ndarray:
+    """Pour chaque début s (0 à len(values)), indices des k plus grandes valeurs de values[s:], ex æquo
+    par indice croissant ; -1 complète les fins de liste trop courtes."""
+    best = np.full((len(values) + 1, k), -1, dtype=np.int64)
+    current: List[tuple] = []
+    for s, value in zip(range(len(values) - 1, -1, -1), values[::-1].tolist()):
+        insort(current, (-value, s))
+        del current[k:]
+        best[s, :len(current)] = [j for _, j in current]
+    return best
+
+def pair_round_trips(outbound: DayResult, inbound: DayResult, outbound_windows: Windows, inbound_windows: Windows,
+                     days_between: int, min_stay: int = 0, latest_return: Optional[int] = None,
+                     max_duration: Optional[int] = None, per_destination: int = 5) -> List[Dict]:
+    """Itinéraires aller-retour groupés par destination, du meilleur score au moins bon.
+
+    `inbound` contient les retours (de n'importe quelle gare) vers l'origine ; un retour n'est
+    apparié qu'aux allers arrivés dans sa gare de départ. `latest_return` : heure d'arrivée
+    maximale du retour (minutes depuis minuit, le jour du retour). Chaque groupe :
+    {destination, count, aller, retour, itineraries}, où chaque itinéraire désigne un aller et
+    un retour par leur indice dans les listes `aller` et `retour` du groupe.
+    """
+    out = _Leg(outbound, outbound_windows, max_duration, 0, "destination")
+    back = _Leg(inbound, inbound_windows, max_duration, days_between, "origine")
+    if latest_return is not None:
+        back.keep(back.arrivals <= days_between * MINUTES_PER_DAY + latest_return)
+    # Allers par (destination, arrivée) et retours par (gare de départ, départ) : une plage contiguë par gare
+    out_order = np.lexsort((out.arrivals, out.stations))
+    back_order = np.lexsort((back.departures, back.stations))
+    back_stations = back.stations[back_order]
+    groups = []
+    for station, start, count in zip(*np.unique(out.stations[out_order], return_index=True, return_counts=True)):
+        if not station:
+            continue
+        a = out_order[start:start + count]
+        lo, hi = np.searchsorted(back_stations, station, "left"), np.searchsorted(back_stations, station, "right")
+        r = back_order[lo:hi]
+        if not len(r):
+            continue
+        # Fusion : premier retour possible de chaque aller ; ses retours sont r[first:]
+        departures = back.departures[r]
+        first = np.searchsorted(departures, out.arrivals[a] + min_stay, "left")
+        pairs = int((len(r) - first).sum())
+        if not pairs:
+            continue
+        # Candidats : les per_destination meilleurs retours de la fin de liste de chaque aller
+        cand_j = _suffix_best(departures - back.durations[r], per_destination)[first]
+        cand_i = np.repeat(np.arange(len(a)), per_destination).reshape(cand_j.shape)
+        cand_i, cand_j = cand_i[cand_j >= 0], cand_j[cand_j >= 0]
+        stay = departures[cand_j] - out.arrivals[a][cand_i]
+        travel = out.durations[a][cand_i] + back.durations[r][cand_j]
+        scores = stay - travel
+        # Meilleur score d'abord, puis aller et retour les plus tôt
+        best = np.lexsort((cand_j, cand_i, -scores))[:per_destination]
+        aller: List[Dict] = []
+        retour: List[Dict] = []
+        indexes: Dict[tuple, int] = {}
+        itineraries = []
+        for c in best:
+            i, j = cand_i[c], cand_j[c]
+            keys = []
+            for leg, rows, position, trips in (("aller", aller, out.positions[a[i]], outbound.trips),
+                                               ("retour", retour, back.positions[r[j]], inbound.trips)):
+                if (leg, position) not in indexes:
+                    indexes[(leg, position)] = len(rows)
+                    # Copies : les appelants peuvent modifier les trajets renvoyés
+                    rows.append(dict(trips[position]))
+                keys.append(indexes[(leg, position)])
+            itineraries.append({
+                "aller": keys[0],
+                "retour": keys[1],
+                "sejour": _duration_label(int(stay[c])),
+                "sejour_minutes": int(stay[c]),
+                "trajet_minutes": int(travel[c]),
+                "score": int(scores[c]),
+            })
+        groups.append({
+            "destination": station,
+            "count": pairs,
+            "aller": aller,
+            "retour": retour,
+            "itineraries": itineraries,
+        })
+    groups.sort(key=lambda g: (-g["itineraries"][0]["score"], g["destination"]))
+    return groups
@@ -0,0 +1,196 @@
+"""Jeu de données partagé entre les workers uvicorn/gunicorn d'une même machine.
+
+Un seul processus, le rafraîchisseur, interroge l'API SNCF : il est élu par un verrou fcntl
+non bloquant sur SHARED_DATASET_PATH.lock, et un autre worker prend le relais s'il meurt.
+Chaque nouvelle version est publiée au format compact (tgvmax_engine.compact) par renommage
+atomique de SHARED_DATASET_PATH ; une revalidation sans changement met seulement à jour la
+date de modification du fichier, qui sert de date de récupération.
+
+Les workers mappent le fichier en lecture seule : ses pages sont celles du cache du noyau,
+communes à tous les processus. La mémoire privée d'un worker ne grandit pas avec le nombre de
+workers, et l'API SNCF n'est appelée qu'une fois par rafraîchissement quel que soit ce nombre.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date as Date
+from time import monotonic, time as timestamp
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from tgvmax_engine.compact import NO_TIME, CompactSnapshot, build_snapshot
+from tgvmax_engine.config import (
+    CACHE_TTL, SHARED_CHECK_INTERVAL, SHARED_DATASET_PATH, SHARED_ELECTION_INTERVAL,
+)
+from tgvmax_engine.logs import get_logger
+from tgvmax_engine.metrics import stage
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas d'élection, chaque processus garde ses propres données
+    fcntl = None
+
+logger = get_logger("tgvmax.shared")
+
+class SharedDataset(NamedTuple):
+    """Version publiée : instantané mappé et date de la dernière récupération réussie."""
+    snapshot: CompactSnapshot
+    fetched_at: float
+
+    @property
+    def version(self) -> str:
+        return self.snapshot.version
+
+    @property
+    def stale(self) -> bool:
+        # Rafraîchisseur absent ou API SNCF indisponible depuis plus d'un cycle
+        return timestamp() - self.fetched_at > 2 * CACHE_TTL
+
+    def records(self, day: Date) -> List[Dict]:
+        """Enregistrements SNCF de la date, dans l'ordre de l'API."""
+        return self.snapshot.trips(day, None, None, 0, NO_TIME)
+
+_lock = threading.Lock()
+_current: Optional[SharedDataset] = None
+_identity: Optional[Tuple[int, int]] = None  # (périphérique, inode) du fichier mappé
+_checked_at = float("-inf")
+
+def shared_dataset() -> Optional[SharedDataset]:
+    """Dernière version publiée (None si le partage est désactivé ou rien n'est encore publié).
+
+    Le fichier est réexaminé au plus toutes les SHARED_CHECK_INTERVAL secondes ; une nouvelle
+    version est mappée à la place de l'ancienne, libérée quand plus aucune requête ne la lit.
+    """
+    global _current, _identity, _checked_at
+    if not SHARED_DATASET_PATH or fcntl is None:
+        return None
+    with _lock:
+        if monotonic() - _checked_at < SHARED_CHECK_INTERVAL:
+            return _current
+        _checked_at = monotonic()
+        try:
+            stat = os.stat(SHARED_DATASET_PATH)
+            if (stat.st_dev, stat.st_ino) != _identity:
+                _current = SharedDataset(CompactSnapshot.open(SHARED_DATASET_PATH), stat.st_mtime)
+                _identity = (stat.st_dev, stat.st_ino)
+                logger.info("Jeu de données partagé %s attaché", _current.version)
+            elif stat.st_mtime != _current.fetched_at:
+                _current = _current._replace(fetched_at=stat.st_mtime)
+        except FileNotFoundError:
+            _current, _identity = None, None
+        except (OSError, ValueError) as e:
+            logger.warning("Jeu de données partagé illisible (%s) : %s", SHARED_DATASET_PATH, e)
+        return _current
+
+_published_version: Optional[str] = None
+
+@contextmanager
+def _publishing() -> Iterator[None]:
+    """Verrou bloquant des publications (rafraîchisseur et refresh_shared) : une seule à la fois sur la machine."""
+    fd = os.open(f"{SHARED_DATASET_PATH}.publish.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+def publish() -> bool:
+    """Récupère les données SNCF (cache et revalidation du store) et publie la version si elle a changé.
+
+    Appelé par le rafraîchisseur élu, ou par refresh_shared ; retourne True si un nouveau fichier a été publié.
+    """
+    with _publishing():
+        return _publish()
+
+def _publish() -> bool:
+    global _published_version
+    from tgvmax_engine.store import _day_params, _fetch_records
+    entry = _fetch_records(_day_params(Date.today()))
+    if entry["stale"]:
+        return False
+    mapped = _current.version if _current is not None else None
+    if entry["version"] in (_published_version, mapped) and os.path.exists(SHARED_DATASET_PATH):
+        os.utime(SHARED_DATASET_PATH, (entry["fetched_at"], entry["fetched_at"]))
+        return False
+    with stage("shared_publish"):
+        header = build_snapshot(entry["records"], SHARED_DATASET_PATH)
+    os.utime(SHARED_DATASET_PATH, (entry["fetched_at"], entry["fetched_at"]))
+    _published_version = entry["version"]
+    logger.info("Jeu de données partagé publié : %d trajets (version %s)", header["rows"], header["version"])
+    return True
+
+def _recheck() -> Optional[SharedDataset]:
+    global _checked_at
+    with _lock:
+        _checked_at = float("-inf")
+    return shared_dataset()
+
+def refresh_shared(oldest: float) -> Optional[SharedDataset]:
+    """Revalide et republie sans attendre le rafraîchisseur (requête exigeant des données récupérées après `oldest`).
+
+    Les demandes simultanées, de tous les workers, attendent la même publication : chacune
+    relit d'abord le fichier, et ne revalide que s'il est encore trop ancien. La fraîcheur
+    exigée par l'appelant (store.freshness) s'applique à la récupération.
+    """
+    try:
+        with _publishing():
+            current = _recheck()
+            if current is not None and current.fetched_at >= oldest:
+                return current
+            _publish()
+    except Exception as e:
+        logger.warning("Republication du jeu de données partagé échouée : %s", e)
+    return _recheck()
+
+def _try_lead() -> Optional[int]:
+    """Descripteur du verrou d'élection si ce processus devient le rafraîchisseur, None sinon."""
+    directory = os.path.dirname(os.path.abspath(SHARED_DATASET_PATH))
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(f"{SHARED_DATASET_PATH}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+def _refresh_loop() -> None:
+    leader = None
+    while not _stopping.is_set():
+        refreshed = False
+        try:
+            if leader is None:
+                leader = _try_lead()
+                if leader is not None:
+                    logger.info("Processus %d élu rafraîchisseur du jeu de données partagé", os.getpid())
+            if leader is not None:
+                publish()
+                refreshed = True
+        except Exception as e:
+            logger.warning("Rafraîchissement du jeu de données partagé échoué : %s", e)
+        # Le rafraîchisseur suit la cadence du cache ; les autres retentent l'élection
+        _stopping.wait(CACHE_TTL if refreshed else SHARED_ELECTION_INTERVAL)
+    if leader is not None:
+        # Verrou rendu : un autre worker est élu sans attendre la fin de ce processus
+        os.close(leader)
+
+_refresher: Optional[threading.Thread] = None
+_stopping = threading.Event()
+
+def start_refresher() -> None:
+    """Lance l'élection du rafraîchisseur dans ce processus (une fois, après le fork des workers)."""
+    global _refresher
+    if not SHARED_DATASET_PATH or fcntl is None:
+        return
+    with _lock:
+        if _refresher is None or not _refresher.is_alive():
+            _stopping.clear()
+            _refresher = threading.Thread(target=_refresh_loop, name="tgvmax-shared-refresher", daemon=True)
+            _refresher.start()
+
+def stop_refresher(timeout: Optional[float] = None) -> None:
+    """Arrête le rafraîchisseur de ce processus (arrêt du worker) et rend le verrou d'élection."""
+    global _refresher
+    with _lock:
+        refresher, _refresher = _refresher, None
+    if refresher is not None:
+        _stopping.set()
+        refresher.join(timeout)
@@ -0,0 +1,290 @@
+import contextvars
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from time import time as timestamp
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+import pandas as pd
+from tgvmax_engine.config import SNCF_API_URL, API_LIMIT, CACHE_TTL, MIN_STALENESS, SNAPSHOT_DIR, FRAME_CACHE_SIZE
+from tgvmax_engine.history import record_history
+from tgvmax_engine.index import index_frame
+from tgvmax_engine.logs import get_logger
+from tgvmax_engine.metrics import stage, CACHE_REQUESTS
+from tgvmax_engine.shared import refresh_shared, shared_dataset
+from tgvmax_engine.upstream import UpstreamUnavailable, get_client
+
+try:
+    import fcntl
+except ImportError:  # Windows : récupérations regroupées dans le processus seulement
+    fcntl = None
+
+logger = get_logger("tgvmax.store")
+
+class DatasetInfo(NamedTuple):
+    """Version, date de récupération et provenance des données SNCF utilisées pour une date.
+
+    `source` : memory (cache du processus), snapshot (instantané disque), upstream (API SNCF,
+    récupération ou revalidation), shared (jeu de données partagé) ou stale (API indisponible).
+    """
+    version: str
+    fetched_at: float
+    stale: bool = False
+    source: str = "memory"
+
+# Date de récupération la plus ancienne acceptée pour la requête en cours (None : CACHE_TTL)
+_oldest_accepted: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("tgvmax_oldest_accepted", default=None)
+
+@contextmanager
+def freshness(max_staleness: Optional[float]) -> Iterator[None]:
+    """Fraîcheur exigée par les lectures du bloc, en secondes (None : CACHE_TTL).
+
+    Le planificateur de _fetch_records choisit la source la moins chère qui la respecte : cache
+    du processus, instantané disque, puis API SNCF. L'âge est compté depuis l'entrée dans le bloc :
+    des données récupérées pendant le bloc le satisfont jusqu'à sa fin. Une valeur supérieure à
+    CACHE_TTL sert les données locales sans appel SNCF ; une valeur inférieure à MIN_STALENESS
+    (0 : données en direct) est ramenée à MIN_STALENESS.
+    """
+    if max_staleness is not None:
+        max_staleness = max(max_staleness, MIN_STALENESS)
+    token = _oldest_accepted.set(None if max_staleness is None else timestamp() - max_staleness)
+    try:
+        yield
+    finally:
+        _oldest_accepted.reset(token)
+
+def oldest_accepted() -> float:
+    """Date de récupération (timestamp) la plus ancienne acceptée dans le contexte courant."""
+    oldest = _oldest_accepted.get()
+    return timestamp() - CACHE_TTL if oldest is None else oldest
+
+# Cache des réponses SNCF, indexé par les paramètres de la requête
+_upstream_cache: Dict[tuple, dict] = {}
+_upstream_lock = threading.Lock()
+
+# Enregistrements répartis par date, par requête SNCF : (version, {date: enregistrements})
+_records_by_date: Dict[tuple, Tuple[str, Dict[str, List[Dict]]]] = {}
+
+# Journées déjà construites en DataFrame, par (requête, version, date)
+_frames: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+_frames_lock = threading.Lock()
+
+def _day_params(date: datetime.date) -> dict:
+    """Paramètres de la requête SNCF pour une date donnée."""
+    return {
+        "limit": API_LIMIT
+    }
+
+def _content_version(records: List[Dict]) -> str:
+    """Empreinte du contenu d'une réponse SNCF."""
+    payload = json.dumps(records, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+def _snapshot_path(key: tuple) -> Optional[str]:
+    if not SNAPSHOT_DIR:
+        return None
+    name = hashlib.sha1(repr((SNCF_API_URL, key)).encode("utf-8")).hexdigest()[:20]
+    return os.path.join(SNAPSHOT_DIR, f"{name}.json")
+
+def _read_snapshot(key: tuple) -> Optional[dict]:
+    """Lit l'instantané disque écrit par un autre processus (API ou Streamlit)."""
+    path = _snapshot_path(key)
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return dict(entry, stale=False)
+
+def _write_snapshot(key: tuple, entry: dict) -> None:
+    """Écrit l'instantané de manière atomique pour les autres processus."""
+    path = _snapshot_path(key)
+    if path is None:
+        return
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in entry.items() if k != "stale"}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning("Instantané non écrit (%s) : %s", path, e)
+
+# Verrous des récupérations en cours, par requête SNCF
+_fetch_locks: Dict[tuple, threading.Lock] = {}
+
+@contextmanager
+def _single_flight(key: tuple) -> Iterator[None]:
+    """Une seule récupération SNCF à la fois pour `key` : entre threads (verrou), puis entre
+    processus (flock à côté de l'instantané disque)."""
+    with _upstream_lock:
+        lock = _fetch_locks.setdefault(key, threading.Lock())
+    with lock:
+        path = _snapshot_path(key)
+        fd = None
+        if path is not None and fcntl is not None:
+            try:
+                os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+                fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except OSError as e:
+                logger.warning("Verrou de récupération indisponible (%s) : %s", path, e)
+        try:
+            yield
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+def _fetch_records(params: dict) -> dict:
+    """Récupère les enregistrements SNCF en cache, revalidés par requête conditionnelle.
+
+    Source la moins chère assez fraîche (oldest_accepted) : cache mémoire, instantané
+    disque partagé entre processus, puis API SNCF (l'entrée retournée indique sa `source`).
+    Si l'API SNCF est indisponible, les dernières données connues sont servies marquées `stale`.
+    """
+    key = tuple(sorted(params.items()))
+    oldest = oldest_accepted()
+    with _upstream_lock:
+        entry = _upstream_cache.get(key)
+    if entry and entry["fetched_at"] > oldest:
+        CACHE_REQUESTS.inc("hit")
+        return dict(entry, source="memory")
+
+    # Requêtes simultanées (threads et workers) : une seule récupération, les autres la réutilisent
+    with _single_flight(key):
+        with _upstream_lock:
+            entry = _upstream_cache.get(key)
+        if entry and entry["fetched_at"] > oldest:
+            CACHE_REQUESTS.inc("hit")
+            return dict(entry, source="memory")
+
+        snapshot = _read_snapshot(key)
+        if snapshot and (entry is None or snapshot["fetched_at"] > entry["fetched_at"]):
+            entry = snapshot
+            with _upstream_lock:
+                _upstream_cache[key] = entry
+            if entry["fetched_at"] > oldest:
+                CACHE_REQUESTS.inc("snapshot")
+                return dict(entry, source="snapshot")
+
+        headers = {}
+        if entry:
+            # L'API SNCF renvoie 304 si le jeu de données n'a pas changé depuis
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = get_client().get(params, headers)
+        except UpstreamUnavailable as e:
+            if entry is None:
+                raise
+            logger.info("Données SNCF périmées servies : %s", e)
+            CACHE_REQUESTS.inc("stale")
+            return dict(entry, stale=True, source="stale")
+        response.raise_for_status()
+        if response.status_code == 304 and entry:
+            CACHE_REQUESTS.inc("revalidated")
+            entry = dict(entry, fetched_at=timestamp(), stale=False)
+        else:
+            CACHE_REQUESTS.inc("miss")
+            with stage("json_decode"):
+                records = response.json().get("results", [])
+            previous, entry = entry, {
+                "records": records,
+                "version": _content_version(records),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": timestamp(),
+                "stale": False,
+            }
+            if previous is None or previous["version"] != entry["version"]:
+                # Nouvelle version : confiée au thread d'écriture de l'historique (différences, disque)
+                record_history(records, entry["fetched_at"])
+        with _upstream_lock:
+            _upstream_cache[key] = entry
+        _write_snapshot(key, entry)
+        return dict(entry, source="upstream")
+
+def get_dataset_info(date: datetime.date) -> DatasetInfo:
+    """Retourne la version des données SNCF pour une date (sans construire de DataFrame).
+
+    Avec une fraîcheur exigée (freshness) plus stricte que l'âge du jeu de données partagé,
+    celui-ci est republié tout de suite au lieu d'attendre le rafraîchisseur.
+    """
+    shared = shared_dataset()
+    if shared is not None and _oldest_accepted.get() is not None and shared.fetched_at < oldest_accepted():
+        shared = refresh_shared(oldest_accepted())
+    if shared is not None:
+        return DatasetInfo(shared.version, shared.fetched_at, shared.stale, "shared")
+    entry = _fetch_records(_day_params(date))
+    return DatasetInfo(entry["version"], entry["fetched_at"], entry["stale"], entry["source"])
+
+def get_day_records(date: datetime.date) -> Tuple[str, List[Dict]]:
+    """Version des données et enregistrements SNCF bruts d'une date (sans DataFrame)."""
+    shared = shared_dataset()
+    if shared is not None:
+        return shared.version, shared.records(date)
+    params = _day_params(date)
+    entry = _fetch_records(params)
+    key = tuple(sorted(params.items()))
+    with _upstream_lock:
+        indexed = _records_by_date.get(key)
+    if indexed is None or indexed[0] != entry["version"]:
+        # Répartition par date en une seule passe, partagée par toutes les dates de la réponse
+        by_date: Dict[str, List[Dict]] = {}
+        for record in entry["records"]:
+            by_date.setdefault(record.get("date"), []).append(record)
+        indexed = (entry["version"], by_date)
+        with _upstream_lock:
+            _records_by_date[key] = indexed
+    return entry["version"], indexed[1].get(date.strftime('%Y-%m-%d'), [])
+
+def get_day_frame(date: datetime.date) -> pd.DataFrame:
+    """Trains TGV Max d'une date, construits une fois par version des données.
+
+    Le DataFrame retourné est partagé entre les appels : il ne doit pas être modifié.
+    """
+    params = _day_params(date)
+    shared = shared_dataset()
+    if shared is None:
+        entry = _fetch_records(params)
+        version, records = entry["version"], entry["records"]
+    else:
+        version, records = shared.version, None
+    target_date = date.strftime('%Y-%m-%d')
+    frame_key = (tuple(sorted(params.items())), version, target_date)
+    with _frames_lock:
+        df = _frames.get(frame_key)
+        if df is not None:
+            _frames.move_to_end(frame_key)
+            return df
+
+    if records is None:
+        # Jeu de données partagé : seule la journée est lue depuis le fichier mappé
+        records = shared.records(date)
+    with stage("dataframe_build"):
+        df = pd.DataFrame(records)
+        # Filtrage côté moteur car l'API SNCF ne filtre pas correctement
+        if not df.empty:
+            df = index_frame(df[df['date'] == target_date].reset_index(drop=True))
+            logger.debug("Date demandée: %s, trains filtrés: %d sur %d reçus", target_date, len(df), len(records))
+    with _frames_lock:
+        _frames[frame_key] = df
+        while len(_frames) > FRAME_CACHE_SIZE:
+            _frames.popitem(last=False)
+    return df
+
+def clear_cache() -> None:
+    """Vide les caches mémoire (l'instantané disque est conservé)."""
+    with _upstream_lock:
+        _upstream_cache.clear()
+        _records_by_date.clear()
+    with _frames_lock:
+        _frames.clear()
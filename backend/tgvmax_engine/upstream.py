@@ -0,0 +1,207 @@
+import os
+import random
+import struct
+import threading
+from time import monotonic, sleep, time as timestamp
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from tgvmax_engine.config import (
+    SNCF_API_URL, UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT, UPSTREAM_DEADLINE,
+    UPSTREAM_RETRIES, UPSTREAM_BACKOFF_BASE, UPSTREAM_BACKOFF_MAX, UPSTREAM_BREAKER_THRESHOLD,
+    UPSTREAM_BREAKER_RESET, UPSTREAM_RATE, UPSTREAM_BURST, UPSTREAM_BUCKET_PATH,
+)
+from tgvmax_engine.logs import get_logger
+from tgvmax_engine.metrics import stage, UPSTREAM_REQUESTS, UPSTREAM_ERRORS
+
+try:
+    import fcntl
+except ImportError:  # Windows : le quota n'est partagé qu'au sein du processus
+    fcntl = None
+
+logger = get_logger("tgvmax.upstream")
+
+class UpstreamUnavailable(Exception):
+    """L'API SNCF est indisponible (disjoncteur ouvert, quota épuisé ou reprises échouées)."""
+
+    def __init__(self, message: str, retry_after: float = UPSTREAM_BREAKER_RESET):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Seau à jetons partagé entre les workers via un fichier verrouillé (flock)."""
+
+    _STATE = struct.Struct("<dd")  # jetons disponibles, dernier remplissage
+
+    def __init__(self, rate: float, burst: float, path: Optional[str] = UPSTREAM_BUCKET_PATH):
+        self.rate = rate
+        self.burst = burst
+        self.path = path if fcntl is not None else None
+        self._lock = threading.Lock()
+        self._local_state = (burst, timestamp())
+        self._fd = None
+        self._pid = None
+
+    def _file(self) -> int:
+        # Un descripteur par processus : flock est lié au descripteur, hérité tel quel au fork
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def _take(self) -> float:
+        """Consomme un jeton si possible ; sinon retourne l'attente nécessaire (secondes)."""
+        with self._lock:
+            if self.path is None:
+                tokens, updated = self._local_state
+                tokens, wait = self._refill(tokens, updated)
+                self._local_state = (tokens, timestamp())
+                return wait
+            fd = self._file()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                raw = os.pread(fd, self._STATE.size, 0)
+                tokens, updated = self._STATE.unpack(raw) if len(raw) == self._STATE.size else (self.burst, timestamp())
+                tokens, wait = self._refill(tokens, updated)
+                os.pwrite(fd, self._STATE.pack(tokens, timestamp()), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            return wait
+
+    def _refill(self, tokens: float, updated: float):
+        tokens = min(self.burst, tokens + max(0.0, timestamp() - updated) * self.rate)
+        if tokens >= 1:
+            return tokens - 1, 0.0
+        return tokens, (1 - tokens) / self.rate
+
+    def acquire(self, timeout: float) -> bool:
+        """Attend un jeton au plus `timeout` secondes."""
+        deadline = monotonic() + timeout
+        while True:
+            wait = self._take()
+            if wait == 0:
+                return True
+            if monotonic() + wait > deadline:
+                return False
+            sleep(wait)
+
+class CircuitBreaker:
+    """Disjoncteur : coupe les appels après N échecs consécutifs, puis laisse passer un essai."""
+
+    def __init__(self, threshold: int = UPSTREAM_BREAKER_THRESHOLD, reset_timeout: float = UPSTREAM_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(1.0, self.reset_timeout - (monotonic() - self.opened_at))
+
+    def release_trial(self) -> None:
+        """Essai interrompu sans verdict (quota épuisé, erreur inattendue) : un autre essai pourra passer."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    logger.warning("Disjoncteur SNCF ouvert après %d échecs", self.failures)
+                self.opened_at = monotonic()
+
+class UpstreamClient:
+    """Client de l'API SNCF : délais bornés, reprises avec backoff, disjoncteur et quota partagé."""
+
+    def __init__(self, url: str = SNCF_API_URL):
+        self.url = url
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=32))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=32))
+        self.breaker = CircuitBreaker()
+        self.bucket = TokenBucket(UPSTREAM_RATE, UPSTREAM_BURST)
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # Backoff exponentiel à gigue complète, ou Retry-After si l'API l'indique
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+
+    def get(self, params: dict, headers: Optional[dict] = None) -> requests.Response:
+        """GET sur l'API SNCF ; lève UpstreamUnavailable si la réponse n'arrive pas dans le budget."""
+        if not self.breaker.allow():
+            raise UpstreamUnavailable("API SNCF indisponible (disjoncteur ouvert)", self.breaker.retry_after())
+        deadline = monotonic() + UPSTREAM_DEADLINE
+        error = "aucune tentative"
+        try:
+            for attempt in range(UPSTREAM_RETRIES + 1):
+                remaining = deadline - monotonic()
+                if remaining <= 0 or not self.bucket.acquire(timeout=remaining):
+                    error = "quota SNCF épuisé" if remaining > 0 else error
+                    break
+                retry_after = None
+                try:
+                    with stage("upstream_fetch"):
+                        response = self.session.get(
+                            self.url, params=params, headers=headers,
+                            timeout=(UPSTREAM_CONNECT_TIMEOUT, max(0.1, min(UPSTREAM_READ_TIMEOUT, deadline - monotonic()))),
+                        )
+                except requests.RequestException as e:
+                    UPSTREAM_ERRORS.inc(type(e).__name__)
+                    error = str(e)
+                else:
+                    UPSTREAM_REQUESTS.inc(str(response.status_code))
+                    if response.status_code != 429 and response.status_code < 500:
+                        self.breaker.record_success()
+                        return response
+                    UPSTREAM_ERRORS.inc(f"http_{response.status_code}")
+                    error = f"HTTP {response.status_code}"
+                    header = response.headers.get("Retry-After", "")
+                    retry_after = float(header) if header.isdigit() else None
+                self.breaker.record_failure()
+                if attempt == UPSTREAM_RETRIES or not self.breaker.allow():
+                    break
+                pause = self._backoff(attempt, retry_after)
+                if monotonic() + pause >= deadline:
+                    break
+                sleep(pause)
+        finally:
+            # Sans effet si l'essai a abouti à un succès ou un échec enregistré
+            self.breaker.release_trial()
+        raise UpstreamUnavailable(f"API SNCF indisponible ({error})", self.breaker.retry_after() or UPSTREAM_BACKOFF_MAX)
+
+_client: Optional[UpstreamClient] = None
+
+def get_client() -> UpstreamClient:
+    """Client SNCF du processus."""
+    global _client
+    if _client is None:
+        _client = UpstreamClient()
+    return _client
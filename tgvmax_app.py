@@ -1,24 +1,25 @@
+import contextvars
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta, time
-import requests
-from typing import List, Dict, Union
+from typing import List, Union
 from enum import Enum
-import folium
-from folium import plugins
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
-from streamlit_folium import folium_static
-import json
+
+# Moteur de données partagé avec l'API FastAPI (backend/tgvmax_engine) : même cache et même instantané disque
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
 from config import (
     MIN_DATE, MAX_DATE, DEFAULT_START_TIME, DEFAULT_END_TIME,
-    DEFAULT_ORIGIN, MAX_RANGE_DAYS, DEFAULT_RANGE_DAYS
+    DEFAULT_ORIGIN, MAX_RANGE_DAYS, DEFAULT_RANGE_DAYS, RANGE_PREFETCH_WORKERS, CACHE_TTL
 )
-from utils import (
-    get_tgvmax_trains, filter_trains_by_time, format_single_trips,
-    calculate_duration, handle_error
+from tgvmax_engine import (
+    find_trains, filter_trains_by_time, trips_frame, minutes_of_day,
+    calculate_duration, handle_error, availability_calendar, next_departures, freshness, get_dataset_info,
+    EXPORT_FORMATS, export_frame
 )
-import re
 
 # Configuration de la page
 st.set_page_config(
@@ -37,273 +38,93 @@ class SearchMode(str, Enum):
     ROUND_TRIP = "Aller-retour"
     DATE_RANGE = "Plage de dates"
 
-# Configuration des styles CSS personnalisés
-st.markdown("""
-    <style>
-    /* Styles globaux */
-    .stApp {
-        background-color: #ffffff;
-        font-family: -apple-system, BlinkMacSystemFont, sans-serif;
-    }
-    
-    /* En-tête */
-    .main-header {
-        font-family: -apple-system, BlinkMacSystemFont, sans-serif;
-        font-weight: 800;
-        color: #1d1d1f;
-        font-size: 52px;
-        text-align: center;
-        margin-bottom: 0;
-        padding: 2rem 0 0.5rem;
-        background: linear-gradient(45deg, #0071e3, #42a1ec);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        animation: fadeIn 1s ease-in;
-    }
-    
-    .sub-header {
-        font-family: -apple-system, BlinkMacSystemFont, sans-serif;
-        color: #86868b;
-        font-size: 24px;
-        text-align: center;
-        margin-bottom: 2rem;
-        font-weight: 400;
-        animation: slideUp 0.8s ease-out;
-    }
-    
-    /* Sidebar */
-    .css-1d391kg {
-        background-color: #f5f5f7;
-        border-right: none;
-        box-shadow: 2px 0 10px rgba(0, 0, 0, 0.05);
-    }
-    
-    /* Boutons */
-    .stButton>button {
-        background: linear-gradient(45deg, #0071e3, #42a1ec);
-        color: white;
-        border: none;
-        border-radius: 980px;
-        padding: 12px 24px;
-        font-size: 16px;
-        font-weight: 500;
-        transition: all 0.3s ease;
-        box-shadow: 0 2px 8px rgba(0, 113, 227, 0.2);
-    }
-    
-    .stButton>button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 12px rgba(0, 113, 227, 0.3);
-    }
-    
-    /* Cards */
-    .trip-card {
-        background-color: #fff;
-        border-radius: 18px;
-        padding: 1.5rem;
-        margin-bottom: 1rem;
-        box-shadow: 0 4px 20px rgba(0, 0, 0, 0.06);
-        border: 1px solid #e5e5e5;
-        transition: all 0.3s ease;
-        animation: slideUp 0.5s ease-out;
-    }
-    
-    .trip-card:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 24px rgba(0, 0, 0, 0.08);
-    }
-    
-    /* Signature */
-    .signature {
-        position: fixed;
-        right: 1rem;
-        bottom: 1rem;
-        padding: 0.75rem 1.5rem;
-        background: rgba(255, 255, 255, 0.95);
-        border-radius: 980px;
-        font-size: 0.9rem;
-        font-weight: 500;
-        color: #1d1d1f;
-        backdrop-filter: blur(10px);
-        -webkit-backdrop-filter: blur(10px);
-        border: 1px solid #e5e5e5;
-        z-index: 1000;
-        box-shadow: 0 2px 12px rgba(0, 0, 0, 0.08);
-        transition: all 0.3s ease;
-    }
-    
-    .signature:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 16px rgba(0, 0, 0, 0.12);
-    }
-    
-    /* Info boxes */
-    .info-box {
-        background: linear-gradient(45deg, #f5f5f7, #ffffff);
-        border-radius: 14px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        border: 1px solid #e5e5e5;
-        box-shadow: 0 2px 12px rgba(0, 0, 0, 0.04);
-        animation: fadeIn 0.5s ease-out;
-    }
-    
-    /* DataFrames */
-    .dataframe {
-        border: none !important;
-        border-radius: 12px !important;
-        overflow: hidden !important;
-        box-shadow: 0 2px 12px rgba(0, 0, 0, 0.04) !important;
-    }
-    
-    .dataframe th {
-        background: linear-gradient(45deg, #f5f5f7, #ffffff) !important;
-        color: #1d1d1f !important;
-        font-weight: 600 !important;
-        padding: 12px !important;
-    }
-    
-    .dataframe td {
-        font-size: 0.9rem !important;
-        padding: 12px !important;
-        transition: all 0.2s ease;
-    }
-    
-    .dataframe tr:hover td {
-        background-color: #f8f8f8 !important;
-    }
-    
-    /* Radio buttons */
-    .st-cc {
-        border-radius: 980px !important;
-        padding: 2px !important;
-        background: #f5f5f7 !important;
-    }
-    
-    /* Expander */
-    .streamlit-expanderHeader {
-        border-radius: 12px !important;
-        background: linear-gradient(45deg, #f5f5f7, #ffffff) !important;
-        border: 1px solid #e5e5e5 !important;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.04) !important;
-    }
-    
-    /* Small text */
-    .small-text {
-        font-size: 0.9rem;
-        color: #86868b;
-        line-height: 1.5;
-    }
-    
-    /* Tabs */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-        padding: 4px;
-        background: #f5f5f7;
-        border-radius: 12px;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        border-radius: 12px;
-        padding: 8px 16px;
-        background-color: transparent;
-        transition: all 0.3s ease;
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background: linear-gradient(45deg, #0071e3, #42a1ec);
-        color: #1d1d1f;
-        box-shadow: 0 2px 8px rgba(0, 113, 227, 0.2);
-    }
-
-    /* Destinations disponibles */
-    .destinations-chip {
-        display: inline-block;
-        background: linear-gradient(45deg, #f5f5f7, #ffffff);
-        border-radius: 980px;
-        padding: 6px 14px;
-        margin: 4px;
-        font-size: 0.9rem;
-        color: #1d1d1f;
-        border: 1px solid #e5e5e5;
-        transition: all 0.3s ease;
-    }
-
-    .destinations-chip:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.08);
-    }
-
-    .destinations-container {
-        background: linear-gradient(45deg, #ffffff, #f8f8f8);
-        border-radius: 14px;
-        padding: 1rem;
-        margin: 0.5rem 0;
-        border: 1px solid #e5e5e5;
-        font-size: 0.9rem;
-        box-shadow: 0 2px 12px rgba(0, 0, 0, 0.04);
-    }
-
-    .destinations-title {
-        color: #1d1d1f;
-        font-size: 1rem;
-        margin-bottom: 0.75rem;
-        font-weight: 600;
-    }
-
-    /* Animations */
-    @keyframes fadeIn {
-        from { opacity: 0; }
-        to { opacity: 1; }
-    }
-
-    @keyframes slideUp {
-        from {
-            opacity: 0;
-            transform: translateY(20px);
-        }
-        to {
-            opacity: 1;
-            transform: translateY(0);
-        }
-    }
-
-    /* Loading spinner */
-    .stSpinner > div {
-        border: 3px solid #f5f5f7;
-        border-top: 3px solid #0071e3;
-        border-radius: 50%;
-        width: 24px;
-        height: 24px;
-        animation: spin 1s linear infinite;
-    }
-
-    @keyframes spin {
-        0% { transform: rotate(0deg); }
-        100% { transform: rotate(360deg); }
-    }
-
-    /* Progress bar */
-    .stProgress > div > div {
-        background: linear-gradient(45deg, #0071e3, #42a1ec);
-    }
-
-    @media (max-width: 600px) {
-      .main-header { font-size: 24px !important; }
-      .sub-header { font-size: 14px !important; }
-      .trip-card { padding: 0.5rem !important; }
-      .stButton>button { font-size: 13px !important; padding: 8px 8px !important; }
-      .dataframe th, .dataframe td { font-size: 0.7rem !important; padding: 4px !important; }
-      .stTabs [data-baseweb="tab-list"] { flex-direction: column !important; }
-      .info-box { padding: 0.5rem !important; font-size: 0.8rem !important; }
-      .destinations-chip { font-size: 0.6rem !important; padding: 3px 6px !important; }
-    }
-    </style>
-    
+# Critères de tri des paramètres avancés -> tri du moteur (tgvmax_engine.SORT_KEYS)
+SORT_OPTIONS = {"Heure de départ": "depart", "Durée": "duree", "Destination": "destination"}
+
+# Fraîcheur des données -> âge maximal accepté (secondes, None : CACHE_TTL du moteur)
+FRESHNESS_OPTIONS = {
+    "Standard": None,
+    "Navigation (données locales, jusqu'à 24 h)": 24 * 3600,
+    "Réservation (données en direct)": 0,
+}
+
+# Critère de tri -> colonnes des résultats compacts ; date et heure de départ départagent les ex æquo, comme le moteur
+SORT_COLUMNS = {
+    "depart": ["date", "minute_depart"],
+    "duree": ["duree_minutes", "date", "minute_depart"],
+    "destination": ["destination", "date", "minute_depart"],
+}
+
+# Colonnes très répétées, gardées en catégories dans les résultats en session
+CATEGORY_COLUMNS = ("date", "origine", "origine_iata", "destination", "destination_iata", "axe", "entity", "od_happy_card")
+
+# Nombre de recherches gardées en session (les plus récentes)
+MAX_STORED_SEARCHES = 5
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+@st.cache_resource
+def load_page_style() -> str:
+    """Lit la feuille de style une seule fois par processus (et non à chaque rerun)."""
+    with open(os.path.join(STATIC_DIR, "tgvmax.css"), encoding="utf-8") as f:
+        css = f.read()
+    return f"""<style>{css}</style>
     <div class="signature">
         Développé par Baptiste Cuchet 🚀
-    </div>
-    """, unsafe_allow_html=True)
+    </div>"""
+
+def compact_frame(trips: List[dict]) -> pd.DataFrame:
+    """DataFrame compact des trajets : gares et dates en catégories, départ et durée en minutes entières.
+
+    Les colonnes entières (minute_depart, duree_minutes) servent aux affinages locaux (refine_trips).
+    """
+    df = trips_frame(trips)
+    if df.empty:
+        return df
+    departures = minutes_of_day(df["heure_depart"].astype(str))
+    arrivals = minutes_of_day(df["heure_arrivee"].astype(str))
+    df["minute_depart"] = departures.astype("UInt16")
+    df["duree_minutes"] = ((arrivals - departures) % (24 * 60)).astype("UInt16")
+    for column in CATEGORY_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype("category")
+    return df.reset_index(drop=True)
+
+def refine_trips(df: pd.DataFrame, orders: dict, max_duration: int = None, sort: str = None,
+                 destinations: List[str] = None) -> pd.DataFrame:
+    """Applique localement durée maximale (minutes), destinations et tri (SORT_OPTIONS, "-" pour décroissant).
+
+    L'ordre de chaque critère est calculé une fois puis gardé dans `orders` : les affinages
+    suivants ne coûtent qu'un masque sur les colonnes entières.
+    """
+    if df.empty:
+        return df
+    keep = np.ones(len(df), dtype=bool)
+    if max_duration is not None:
+        # Durée inconnue : exclue, comme par le moteur
+        keep &= df["duree_minutes"].le(max_duration).fillna(False).to_numpy(dtype=bool)
+    if destinations:
+        keep &= df["destination"].isin(destinations).to_numpy(dtype=bool)
+    if not sort:
+        return df[keep]
+    key = sort.lstrip("-")
+    if key not in orders:
+        orders[key] = df.sort_values(SORT_COLUMNS[key], kind="stable", na_position="last").index.to_numpy()
+    # Décroissant : ordre croissant inversé, ex æquo compris (comme heapq.nlargest dans le moteur)
+    order = orders[key][::-1] if sort.startswith("-") else orders[key]
+    return df.iloc[order[keep[order]]]
+
+def render_day(date_str: str, day_trips: pd.DataFrame):
+    """Affiche les trajets d'une journée (mode plage de dates)."""
+    with st.expander(f"🗓️ {date_str} ({len(day_trips)} trajet{'s' if len(day_trips) > 1 else ''})", expanded=False):
+        for _, trip in day_trips.iterrows():
+            st.markdown(
+                f"""<div class="trip-card">
+                    <p><strong>{trip['heure_depart']} → {trip['heure_arrivee']}</strong> ({trip['duree']})</p>
+                    <p class="small-text">Date : {date_str}</p>
+                </div>""",
+                unsafe_allow_html=True
+            )
 
 @handle_error
 @handle_error
@@ -319,72 +140,49 @@ def find_trips(mode: SearchMode,
                date_range_days: int = DEFAULT_RANGE_DAYS) -> Union[pd.DataFrame, dict, List[dict]]:
     """
     Trouve les trajets disponibles en TGV Max selon le mode choisi.
+
+    Durée maximale, tri et destinations ne sont pas appliqués ici : refine_trips les applique
+    ensuite aux résultats gardés en session.
     """
     if mode == SearchMode.DATE_RANGE:
-        all_trains = []
-        with st.spinner(f'Recherche des trains sur {date_range_days} jours...'):
-            progress_bar = st.progress(0)
-            for i in range(date_range_days):
-                current_date = depart_date + timedelta(days=i)
-                trains = get_tgvmax_trains(
-                    current_date.strftime("%Y-%m-%d"),
-                    origin=origin_city,
-                    destination=destination_city
-                )
-                all_trains.extend(trains)
-                progress_bar.progress((i + 1) / date_range_days)
-            progress_bar.empty()
-        df = format_single_trips(all_trains)
-        if not df.empty:
-            # S'assurer que la colonne 'date' est bien de type datetime pour le tri
-            df['date_dt'] = pd.to_datetime(df['date'], errors='coerce')
-            df = df.sort_values(by=["date_dt", "heure_depart"]).reset_index(drop=True)
-            df['date'] = df['date_dt'].dt.strftime('%d/%m/%Y')
-            del df['date_dt']
-        if not df.empty and depart_start and depart_end:
-            df = filter_trains_by_time(df, depart_start, depart_end, is_round_trip=False)
-        # Affichage groupé par date
-        if mode == SearchMode.DATE_RANGE and not df.empty:
-            for date_str in df['date'].unique():
-                day_trips = df[df['date'] == date_str]
-                with st.expander(f"🗓️ {date_str}", expanded=False):
-                    for _, trip in day_trips.iterrows():
-                        st.markdown(
-                            f"""<div class="trip-card">
-                                <p><strong>{trip['heure_depart']} → {trip['heure_arrivee']}</strong> ({trip['duree']})</p>
-                                <p class="small-text">Date : {trip['date']}</p>
-                            </div>""",
-                            unsafe_allow_html=True
-                        )
-            return pd.DataFrame()
-        return df
+        dates = [depart_date + timedelta(days=i) for i in range(date_range_days)]
+        progress_bar = st.progress(0, text=f"Recherche des trains sur {date_range_days} jours...")
+        trips = []
+        # Journées récupérées en parallèle (cache partagé du moteur), affichées dans l'ordre
+        # chronologique dès que leurs trains arrivent
+        with ThreadPoolExecutor(max_workers=min(RANGE_PREFETCH_WORKERS, len(dates))) as executor:
+            # Chaque tâche reçoit une copie du contexte : la fraîcheur exigée s'applique aussi dans les threads
+            futures = [
+                executor.submit(contextvars.copy_context().run, find_trains, current_date, origin_city,
+                                destination_city, depart_start, depart_end)
+                for current_date in dates
+            ]
+            for i, (current_date, future) in enumerate(zip(dates, futures)):
+                day = future.result()
+                day_trips = trips_frame(day)
+                progress_bar.progress((i + 1) / len(dates), text=f"Recherche des trains sur {date_range_days} jours...")
+                if day_trips.empty:
+                    continue
+                trips.extend(day)
+                render_day(current_date.strftime('%d/%m/%Y'), day_trips)
+        progress_bar.empty()
+        # Journées affichées au fil de l'eau ; tous les trajets, compacts, pour les affinages locaux
+        return compact_frame(trips)
 
-    
     elif mode == SearchMode.SINGLE:
         with st.spinner('Recherche des trains...'):
-            trains = get_tgvmax_trains(
+            # Créneau appliqué par le moteur, avant la construction du DataFrame
+            trains = find_trains(
                 depart_date.strftime("%Y-%m-%d"),
-                origin=origin_city
+                origin=origin_city,
+                start=depart_start,
+                end=depart_end
             )
-            
-        if trains:
-            with st.expander("🎯 Voir les destinations disponibles", expanded=False):
-                st.markdown(
-                    f"""<div class="destinations-container">
-                        <div class="destinations-title">Destinations disponibles :</div>
-                        {''.join(f'<span class="destinations-chip">{dest}</span>' for dest in sorted(set(t['destination'] for t in trains)))}
-                    </div>""",
-                    unsafe_allow_html=True
-                )
-            
-        df = format_single_trips(trains)
-        if not df.empty and depart_start and depart_end:
-            return filter_trains_by_time(df, depart_start, depart_end, is_round_trip=False)
-        return df
+        return compact_frame(trains)
     
     else:  # mode == SearchMode.ROUND_TRIP
         with st.spinner('Recherche des trains aller...'):
-            outbound_trains = get_tgvmax_trains(
+            outbound_trains = find_trains(
                 depart_date.strftime("%Y-%m-%d"),
                 origin=origin_city
             )
@@ -394,7 +192,7 @@ def find_trips(mode: SearchMode,
         for dest in destinations_aller:
             try:
                 with st.spinner(f'Recherche des trains retour pour {dest}...'):
-                    inbound_trains = get_tgvmax_trains(
+                    inbound_trains = find_trains(
                         return_date.strftime("%Y-%m-%d"),
                         origin=dest,
                         destination=origin_city
@@ -402,13 +200,13 @@ def find_trips(mode: SearchMode,
             except Exception as e:
                 # On ignore l'erreur API pour cette destination
                 inbound_trains = []
-            df_aller = format_single_trips([t for t in outbound_trains if t['destination'] == dest])
-            df_retour = format_single_trips(inbound_trains)
+            df_aller = compact_frame([t for t in outbound_trains if t['destination'] == dest])
+            df_retour = compact_frame(inbound_trains)
             # Filtrage horaire
             if not df_aller.empty and depart_start and depart_end:
-                df_aller = filter_trains_by_time(df_aller, depart_start, depart_end, is_round_trip=False)
+                df_aller = filter_trains_by_time(df_aller, depart_start, depart_end).reset_index(drop=True)
             if not df_retour.empty and return_start and return_end:
-                df_retour = filter_trains_by_time(df_retour, return_start, return_end, is_round_trip=False)
+                df_retour = filter_trains_by_time(df_retour, return_start, return_end).reset_index(drop=True)
             if not df_aller.empty and not df_retour.empty:
                 all_results.append({"destination": dest, "aller": df_aller, "retour": df_retour})
         return all_results
@@ -423,7 +221,7 @@ def find_latest_train_date():
     while current_date >= MIN_DATE:
         try:
             # On teste avec Paris qui a toujours des trains
-            trains = get_tgvmax_trains(
+            trains = find_trains(
                 current_date.strftime("%Y-%m-%d"),
                 origin="PARIS"
             )
@@ -441,6 +239,51 @@ def init_session_state():
         st.session_state.favorites = []
     if 'theme' not in st.session_state:
         st.session_state.theme = 'light'
+    # Résultats des recherches par requête normalisée (search_key), et clé de la recherche affichée
+    if 'searches' not in st.session_state:
+        st.session_state.searches = {}
+    if 'active_search' not in st.session_state:
+        st.session_state.active_search = None
+
+def search_key(mode: SearchMode, depart_date: datetime.date, return_date: datetime.date = None,
+               origin_city: str = None, destination_city: str = None, depart_start: time = None,
+               depart_end: time = None, return_start: time = None, return_end: time = None,
+               date_range_days: int = DEFAULT_RANGE_DAYS) -> tuple:
+    """Requête normalisée : tout ce qui change les trajets récupérés, sans les affinages locaux."""
+    return (
+        mode.value, depart_date, return_date if mode == SearchMode.ROUND_TRIP else None,
+        (origin_city or "").strip().upper(), (destination_city or "").strip().upper(),
+        depart_start, depart_end, return_start, return_end,
+        date_range_days if mode == SearchMode.DATE_RANGE else 1,
+    )
+
+def run_search(query: dict, max_staleness: int = None):
+    """Recherche `query` (arguments de find_trips), sauf si ses résultats en session sont assez frais."""
+    key = search_key(**query)
+    searches = st.session_state.searches
+    entry = searches.get(key)
+    limit = CACHE_TTL if max_staleness is None else max_staleness
+    if entry is None or datetime.now().timestamp() - entry["fetched_at"] > limit:
+        # Journées affichées au fil de la recherche, remplacées ensuite par les résultats affinés
+        progress = st.empty()
+        with freshness(max_staleness):
+            with progress.container():
+                result = find_trips(**query)
+            dataset = handle_error(get_dataset_info)(query["depart_date"])
+        progress.empty()
+        if isinstance(result, dict):
+            st.session_state.active_search = None
+            st.error(f"Erreur lors de la recherche : {result['error']}")
+            return
+        now = datetime.now().timestamp()
+        entry = {"query": query, "result": result, "orders": {}, "exports": {}, "fetched_at": now, "stale": False}
+        if not isinstance(dataset, dict):
+            entry.update(fetched_at=min(dataset.fetched_at, now), stale=dataset.stale)
+    searches.pop(key, None)
+    searches[key] = entry
+    while len(searches) > MAX_STORED_SEARCHES:
+        searches.pop(next(iter(searches)))
+    st.session_state.active_search = key
 
 def toggle_theme():
     """Bascule entre le mode clair et sombre."""
@@ -450,6 +293,8 @@ def toggle_theme():
 @st.cache_data
 def get_city_coordinates(city: str) -> tuple:
     """Récupère les coordonnées d'une ville."""
+    from geopy.geocoders import Nominatim
+    from geopy.exc import GeocoderTimedOut
     try:
         geolocator = Nominatim(user_agent="tgvmax_finder")
         location = geolocator.geocode(f"{city}, France")
@@ -459,8 +304,12 @@ def get_city_coordinates(city: str) -> tuple:
         pass
     return None
 
-def create_route_map(df: pd.DataFrame, search_mode: SearchMode) -> folium.Map:
+def create_route_map(df: pd.DataFrame, search_mode: SearchMode) -> "folium.Map":
     """Crée une carte avec les trajets."""
+    # Import à la demande : folium n'est chargé que si une carte est affichée
+    import folium
+    from folium import plugins
+
     # Centrer la carte sur la France
     france_center = [46.603354, 1.888334]
     m = folium.Map(location=france_center, zoom_start=6)
@@ -567,18 +416,72 @@ def calculate_average_duration(durations: pd.Series) -> str:
     avg_minutes = sum(minutes_list) / len(minutes_list)
     return format_minutes_to_duration(int(avg_minutes))
 
-def test_june_dates():
-    """Fonction temporaire pour tester les dates de juin."""
-    june_dates = []
-    for day in range(1, 31):
-        date = datetime(2024, 6, day).date()
-        try:
-            trains = get_tgvmax_trains(date.strftime("%Y-%m-%d"), origin="PARIS")
-            if trains:
-                june_dates.append(date)
-        except:
-            continue
-    return june_dates
+def render_availability_calendar(origin: str, destination: str = None):
+    """Affiche le nombre de trains par jour sur tout l'horizon de réservation (carte de chaleur)."""
+    import altair as alt
+    start = datetime.now().date()
+    days = availability_calendar(origin, destination, start, start + (MAX_DATE - MIN_DATE))
+    cal = pd.DataFrame(days)
+    dates = pd.to_datetime(cal["date"])
+    cal["jour"] = dates.dt.dayofweek.map(dict(enumerate(["Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim"])))
+    cal["semaine"] = (dates - pd.to_timedelta(dates.dt.dayofweek, unit="D")).dt.strftime("%d/%m")
+    cal["premier"] = cal["earliest"].fillna("-")
+    cal["dernier"] = cal["latest"].fillna("-")
+    route = f"{origin} → {destination}" if destination else f"depuis {origin}"
+    st.markdown(f"### 📅 Disponibilités {route}")
+    chart = alt.Chart(cal).mark_rect(cornerRadius=3).encode(
+        x=alt.X("jour:O", sort=["Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim"], title=None),
+        y=alt.Y("semaine:O", sort=None, title="Semaine du"),
+        color=alt.Color("count:Q", title="Trains", scale=alt.Scale(scheme="blues")),
+        tooltip=[alt.Tooltip("date:N", title="Date"), alt.Tooltip("count:Q", title="Trains"),
+                 alt.Tooltip("premier:N", title="Premier départ"), alt.Tooltip("dernier:N", title="Dernier départ")],
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+def render_departure_board(origin: str, after: datetime, limit: int, destination: str = None):
+    """Affiche les `limit` prochains départs après `after`, en continuant sur les jours suivants."""
+    departures = next_departures(origin, after, limit=limit, destination=destination,
+                                 until=datetime.now().date() + (MAX_DATE - MIN_DATE))
+    st.markdown(f"### 🚉 Prochains départs depuis {origin} après le {after.strftime('%d/%m à %H:%M')}")
+    if not departures:
+        st.info("Aucun départ TGV Max disponible sur l'horizon de réservation.")
+        return
+    board = trips_frame(departures)
+    board["Date"] = pd.to_datetime(board["date"]).dt.strftime("%d/%m")
+    st.dataframe(
+        board[["Date", "heure_depart", "origine", "destination", "heure_arrivee", "duree", "train_no"]].rename(columns={
+            "heure_depart": "Départ", "origine": "Gare", "destination": "Destination",
+            "heure_arrivee": "Arrivée", "duree": "Durée", "train_no": "Train"
+        }),
+        hide_index=True, use_container_width=True
+    )
+
+def render_export_buttons(df: pd.DataFrame, depart_date: datetime.date, days: int, refinement: tuple, exports: dict):
+    """Boutons de téléchargement des trajets affichés : mêmes colonnes que /api/export.
+
+    Les fichiers sont produits depuis les résultats gardés en session, sans appel au moteur ni à
+    l'API SNCF ; `exports` garde ceux du dernier affinage (`refinement`) pour les reruns suivants.
+    """
+    if exports.get("refinement") != refinement:
+        exports.clear()
+        exports["refinement"] = refinement
+    formats = ["csv"]
+    try:
+        import pyarrow  # noqa: F401
+        formats.append("parquet")
+    except ImportError:
+        pass
+    for column, fmt in zip(st.columns(len(formats)), formats):
+        if fmt not in exports:
+            exports[fmt] = b"".join(export_frame(fmt, df))
+        with column:
+            st.download_button(
+                f"⬇️ Télécharger ({fmt.upper()})",
+                data=exports[fmt],
+                file_name=f"tgvmax_{depart_date}_{depart_date + timedelta(days=days - 1)}.{fmt}",
+                mime=EXPORT_FORMATS[fmt],
+                use_container_width=True
+            )
 
 def convert_duration_to_timedelta(duration_str: str) -> pd.Timedelta:
     """Convertit une chaîne de durée (ex: '2h15') en Timedelta."""
@@ -591,6 +494,7 @@ def convert_duration_to_timedelta(duration_str: str) -> pd.Timedelta:
 
 def main():
     init_session_state()
+    st.markdown(load_page_style(), unsafe_allow_html=True)
     
     # En-tête stylisé
     st.markdown('<h1 class="main-header">TGV Max Finder</h1>', unsafe_allow_html=True)
@@ -598,11 +502,6 @@ def main():
     # Calcul simple de la date limite (aujourd'hui + 30 jours)
     latest_date = datetime.now().date() + timedelta(days=30)
     
-    # Test temporaire des dates de juin
-    june_dates = test_june_dates()
-    if june_dates:
-        st.sidebar.write("Dates trouvées en juin:", june_dates)
-    
     # Affichage de la date limite en haut de page
     st.markdown(
         f"""
@@ -737,7 +636,7 @@ def main():
             # Tri des résultats
             sort_by = st.selectbox(
                 "Trier par",
-                options=["Heure de départ", "Durée", "Destination"],
+                options=list(SORT_OPTIONS),
                 help="Choisir le critère de tri des résultats"
             )
             
@@ -747,25 +646,82 @@ def main():
                 options=["Croissant", "Décroissant"],
                 horizontal=True
             )
+
+            # Fraîcheur : données locales pour explorer, API SNCF en direct avant de réserver
+            freshness_choice = st.selectbox(
+                "Fraîcheur des données",
+                options=list(FRESHNESS_OPTIONS),
+                help="Navigation : aucun appel à l'API SNCF tant que les données locales ont moins de 24 h. "
+                     "Réservation : données revalidées auprès de l'API SNCF."
+            )
+
+            # Carte des trajets (charge folium/geopy uniquement si demandée)
+            show_map = st.toggle("🗺️ Afficher la carte des trajets", value=False)
+
+            # Tableau des départs
+            board_size = st.slider("Nombre de prochains départs", min_value=5, max_value=50, value=10)
         
         search_button = st.button("Rechercher les trains", type="primary", use_container_width=True)
+        calendar_button = st.button("📅 Calendrier des disponibilités", use_container_width=True,
+                                    help="Nombre de trains par jour jusqu'à la fin de l'horizon de réservation")
+        departures_button = st.button("🚉 Prochains départs", use_container_width=True,
+                                      help="Les prochains trains après la date et l'heure de début, jours suivants compris")
+
+    if calendar_button and origin_city:
+        with st.spinner("Calcul du calendrier..."):
+            render_availability_calendar(origin_city, destination_city)
 
-    # Affichage des résultats
+    if departures_button and origin_city:
+        with st.spinner("Recherche des prochains départs..."):
+            render_departure_board(origin_city, datetime.combine(depart_date, depart_start), board_size, destination_city)
+
+    # Recherche : résultats gardés en session, sans nouvel appel tant qu'ils sont assez frais
     if search_button:
-        result = find_trips(
-            mode=search_mode,
-            depart_date=depart_date,
-            return_date=return_date,
-            origin_city=origin_city,
-            destination_city=destination_city,
-            depart_start=depart_start,
-            depart_end=depart_end,
-            return_start=return_start,
-            return_end=return_end,
-            date_range_days=date_range_days
+        run_search(
+            dict(mode=search_mode, depart_date=depart_date, return_date=return_date, origin_city=origin_city,
+                 destination_city=destination_city, depart_start=depart_start, depart_end=depart_end,
+                 return_start=return_start, return_end=return_end, date_range_days=date_range_days),
+            FRESHNESS_OPTIONS[freshness_choice]
         )
+
+    # Affichage de la dernière recherche : durée, tri et destinations affinés localement,
+    # un changement de widget ne relance ni find_trips ni l'API SNCF
+    entry = st.session_state.searches.get(st.session_state.active_search)
+    if entry is not None:
+        query, result = entry["query"], entry["result"]
+        search_mode = query["mode"]
+        sort = ("" if sort_order == "Croissant" else "-") + SORT_OPTIONS[sort_by]
+        age_minutes = int((datetime.now().timestamp() - entry["fetched_at"]) // 60)
+        st.caption(f"Données SNCF récupérées il y a {age_minutes} min" + (" (API SNCF indisponible)" if entry["stale"] else ""))
+
+        if search_mode == SearchMode.ROUND_TRIP:
+            available = [res["destination"] for res in result]
+        else:
+            available = sorted(result["destination"].unique()) if not result.empty else []
+        destinations = st.multiselect(
+            "🎯 Destinations",
+            options=available,
+            placeholder="Toutes les destinations",
+            # Une sélection par recherche : les options changent avec les résultats
+            key=f"destinations_{st.session_state.active_search}"
+        ) if len(available) > 1 else []
+
+        if search_mode != SearchMode.ROUND_TRIP:
+            df = refine_trips(result, entry["orders"], max_duration * 60, sort, destinations)
+            render_export_buttons(df, query["depart_date"],
+                                  query["date_range_days"] if search_mode == SearchMode.DATE_RANGE else 1,
+                                  (max_duration, sort, tuple(destinations)), entry["exports"])
         if search_mode == SearchMode.ROUND_TRIP:
-            all_results = result
+            all_results = []
+            for res in result:
+                dest = res["destination"]
+                if destinations and dest not in destinations:
+                    continue
+                orders = entry["orders"].setdefault(dest, ({}, {}))
+                df_aller = refine_trips(res["aller"], orders[0], max_duration * 60, sort)
+                df_retour = refine_trips(res["retour"], orders[1], max_duration * 60, sort)
+                if not df_aller.empty and not df_retour.empty:
+                    all_results.append({"destination": dest, "aller": df_aller, "retour": df_retour})
             if not all_results:
                 st.error("Aucun aller-retour disponible pour ces dates.")
             else:
@@ -796,39 +752,26 @@ def main():
                                 </div>""",
                                 unsafe_allow_html=True
                             )
+        elif search_mode == SearchMode.DATE_RANGE:
+            if not result.empty and df.empty:
+                st.info("Aucun trajet ne correspond aux filtres.")
+            elif not df.empty:
+                days = list(df.groupby("date", observed=True))
+                for day, day_trips in (days[::-1] if sort == "-depart" else days):
+                    render_day(datetime.strptime(str(day), "%Y-%m-%d").strftime('%d/%m/%Y'), day_trips)
         else:
-            df = result
+            if not result.empty:
+                with st.expander("🎯 Voir les destinations disponibles", expanded=False):
+                    st.markdown(
+                        f"""<div class="destinations-container">
+                            <div class="destinations-title">Destinations disponibles :</div>
+                            {''.join(f'<span class="destinations-chip">{dest}</span>' for dest in available)}
+                        </div>""",
+                        unsafe_allow_html=True
+                    )
+                if df.empty:
+                    st.info("Aucun trajet ne correspond aux filtres.")
             if not df.empty:
-                # Appliquer les filtres avancés
-                if search_mode == SearchMode.ROUND_TRIP:
-                    # Conversion des durées en timedelta
-                    df['Duree_Timedelta'] = df['duree'].apply(convert_duration_to_timedelta)
-                    
-                    # Filtre par durée
-                    df = df[df['Duree_Timedelta'] <= pd.Timedelta(hours=max_duration)]
-                    
-                    # Tri des résultats
-                    if sort_by == "Heure de départ":
-                        df = df.sort_values('heure_depart', ascending=(sort_order == "Croissant"))
-                    elif sort_by == "Durée":
-                        df = df.sort_values('Duree_Timedelta', ascending=(sort_order == "Croissant"))
-                    else:  # Destination
-                        df = df.sort_values('destination', ascending=(sort_order == "Croissant"))
-                else:
-                    # Conversion des durées en timedelta
-                    df['Duree_Timedelta'] = df['duree'].apply(convert_duration_to_timedelta)
-                    
-                    # Filtre par durée
-                    df = df[df['Duree_Timedelta'] <= pd.Timedelta(hours=max_duration)]
-                    
-                    # Tri des résultats
-                    if sort_by == "Heure de départ":
-                        df = df.sort_values('heure_depart', ascending=(sort_order == "Croissant"))
-                    elif sort_by == "Durée":
-                        df = df.sort_values('Duree_Timedelta', ascending=(sort_order == "Croissant"))
-                    else:  # Destination
-                        df = df.sort_values('destination', ascending=(sort_order == "Croissant"))
-                
                 st.markdown(
                     f'<div style="text-align: center; padding: 2rem;"><h2 style="color: #1d1d1f; font-size: 32px;">✨ {len(df)} trajet{"s" if len(df) > 1 else ""} trouvé{"s" if len(df) > 1 else ""} !</h2></div>',
                     unsafe_allow_html=True
@@ -894,7 +837,10 @@ def main():
                                 'date': 'Date',
                                 'heure_depart': 'Heure départ',
                                 'heure_arrivee': 'Heure arrivée',
-                                'duree': 'Durée'
+                                'duree': 'Durée',
+                                # Colonnes entières des affinages locaux
+                                'minute_depart': None,
+                                'duree_minutes': None
                             }
                         )
                 
@@ -929,7 +875,7 @@ def main():
                         if search_mode == SearchMode.ROUND_TRIP:
                             trips_per_dest = df.groupby('Aller_Destination').size()
                         else:
-                            trips_per_dest = df.groupby('destination').size() if not df.empty else pd.Series()
+                            trips_per_dest = df.groupby('destination', observed=True).size() if not df.empty else pd.Series()
                         
                         if not trips_per_dest.empty:
                             most_frequent_dest = trips_per_dest.idxmax()
@@ -944,6 +890,11 @@ def main():
                             else:
                                 hour_dist = pd.to_datetime(df['heure_depart']).dt.hour.value_counts().sort_index()
                             st.bar_chart(hour_dist)
+
+                if show_map:
+                    from streamlit_folium import folium_static
+                    with st.spinner("Chargement de la carte..."):
+                        folium_static(create_route_map(df, search_mode))
             else:
                 # Trouver la date la plus éloignée disponible dans l'API
                 future_date = MAX_DATE